@@ -0,0 +1,48 @@
+import argparse
+
+import behaviours  # noqa: F401  Registers the behaviours
+from runner import BEHAVIOURS, BehaviourRunner
+
+HELP = 'Type a behaviour and optionally a duration in s (e.g. "buzz_hunt 60"), "list", or "quit". ' \
+       'Ctrl + C stops the running behaviour.'
+
+
+def prompt(runner):
+    print(HELP)
+    while True:
+        try:
+            line = input('behaviour> ').split()
+        except (EOFError, KeyboardInterrupt):
+            print()
+            return
+        if not line:
+            continue
+        if line[0] in ('quit', 'exit', 'q'):
+            return
+        if line[0] == 'list' or line[0] not in BEHAVIOURS:
+            for name, cls in BEHAVIOURS.items():
+                print(f'  {name:<22} {cls.__doc__.strip().splitlines()[0]}')
+            continue
+        try:
+            runner.run(line[0], float(line[1]) if len(line) > 1 else None)
+        except ValueError as e:
+            print(e)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Keeps the links to the drones open and switches between behaviours without reconnecting.')
+    parser.add_argument('uris', nargs='+', help='The drones, in the order the behaviours use them')
+    parser.add_argument('--run', nargs='+', choices=BEHAVIOURS, help='Run these behaviours one after the other '
+                                                                     'instead of asking')
+    parser.add_argument('--duration', type=float, default=None, help='Stop each behaviour of --run after this many s')
+    args = parser.parse_args()
+
+    with BehaviourRunner(args.uris) as runner:
+        print(runner.startup)
+        if args.run:
+            for name in args.run:
+                runner.run(name, args.duration)
+        else:
+            prompt(runner)
+    print(runner)
@@ -0,0 +1,144 @@
+import numpy as np
+from cflib.positioning.motion_commander import MotionCommander
+
+from runner import Behaviour, behaviour
+
+
+def enable_motors(scf):
+    # The powers sent by the first ticks are queued after it, so there is no need to wait
+    scf.cf.param.set_value('motorPowerSet.enable', '1')
+
+
+@behaviour('hover_simulation')
+class HoverSimulation(Behaviour):
+    '''hover_simulation.py: the motors level the drone until it is turned upside down.'''
+    script = 'Hover_simulation/hover_simulation.py'
+    motors = True
+
+    def setup(self):
+        hover = self.module
+        self.rate = hover.LOOP_RATE
+        self.loop_count = 0
+        hover.roll[:] = [0]
+        hover.pitch[:] = [0]
+        hover.start_position_printing(self.scfs[0])
+        enable_motors(self.scfs[0])
+
+    def tick(self):
+        hover = self.module
+        if abs(hover.roll[-1]) >= 170:
+            return False
+        hover.power_distribution(self.scfs[0], self.loop_count)
+        self.loop_count += 1
+        return True
+
+
+@behaviour('buzz_hunt')
+class BuzzHunt(Behaviour):
+    '''buzz_hunt.py: a new random target every run, over once it is found.'''
+    script = 'Buzz_Hunt/buzz_hunt.py'
+    motors = True
+
+    def setup(self):
+        buzz = self.module
+        self.rate = buzz.LOOP_RATE
+        for values in (buzz.x1, buzz.y1, buzz.z1):
+            values[:] = [0]
+        buzz.new_target()
+        buzz.start_position_printing(self.scfs[0])
+        enable_motors(self.scfs[0])
+
+    def tick(self):
+        return not self.module.hunt_step(self.scfs[0])
+
+
+class Vibration(Behaviour):
+    '''
+    The batched mode of the vibration scripts on all the drones: the ring
+    buffers are allocated for the connected drones and one coordinator
+    tick computes and sends all the powers. `windows` maps the ring
+    buffers of the script to the shape of one sample.
+    '''
+    drones = None
+    motors = True
+    windows = {}
+
+    def setup(self):
+        vibe = self.module
+        self.rate = vibe.vibration_rate
+        vibe.execute = True
+        vibe.uris = [scf._link_uri for scf in self.scfs]
+        for name, shape in self.windows.items():
+            setattr(vibe, name, np.zeros((len(self.scfs), vibe.samples, *shape)))
+        vibe.drone_states.clear()
+        # Filled as the drones start, so teardown() only closes the ones that did
+        self.states = []
+        for scf in self.scfs:
+            vibe.start_logging(scf)
+            self.states.append(vibe.drone_states[scf._link_uri])
+            enable_motors(scf)
+        self.rows = np.arange(len(self.states))
+
+    def tick(self):
+        self.module.coordinator_tick(self.states, self.rows)
+        return True
+
+    def teardown(self):
+        for state in self.states:
+            state.motor.close()
+            print(state.motor)
+            if state.log is not None:
+                state.log.close()
+
+
+@behaviour('vibe_to_acceleration')
+class VibeToAcceleration(Vibration):
+    '''vibe_to_acceleration.py: every drone vibrates with its acceleration, until switched.'''
+    script = 'Vibrate_to_Acceleration/vibe_to_acceleration.py'
+    windows = {'acc_windows': ()}
+
+
+@behaviour('vibe_to_ang_vel')
+class VibeToAngVel(Vibration):
+    '''vibe_to_ang_vel.py: every drone vibrates with its angular speed, until switched.'''
+    script = 'Vibrate_to_Rotation/vibe_to_ang_vel.py'
+    windows = {'time_windows': (), 'quaternion_windows': (4,), 'gyro_windows': (3,)}
+
+
+@behaviour('fist_flight')
+class FistFlight(Behaviour):
+    '''
+    fist_flight.py: the first drone is the sensor in the hand, the second
+    one flies the gestures, over once it has landed.
+    '''
+    script = 'Fist_flight/fist_flight.py'
+    drones = 2
+
+    def setup(self):
+        fist = self.module
+        sensor, drone = self.scfs
+        for values in (fist.acc_x, fist.acc_y, fist.acc_z, fist.acc_t, fist.z, fist.detections):
+            values[:] = []
+        fist.detector = fist.GestureDetector(threshold=fist.acc_threshold)
+        self.mc = MotionCommander(drone)
+        self.executor = fist.CommandExecutor(self.mc, lambda: fist.z[-1],
+                                             on_idle=lambda: sensor.cf.param.set_value('sound.effect', '7'))
+        self.rate = 1 / self.executor.period
+        drone.cf.platform.send_arming_request(True)
+        fist.start_acceleration_printing(sensor)
+        fist.start_position_printing(drone)
+        fist.executor = self.executor
+        print('Flight!')
+        sensor.cf.param.set_value('sound.effect', '7')
+
+    def tick(self):
+        return self.executor.step()
+
+    def teardown(self):
+        fist = self.module
+        fist.executor = None
+        if self.mc._is_flying:
+            self.mc.land()
+        self.scfs[1].cf.platform.send_arming_request(False)
+        self.executor.report()
+        fist.save_session(fist.SESSION_FILE, fist.acc_t, fist.acc_x, fist.acc_y, fist.acc_z, fist.detections)
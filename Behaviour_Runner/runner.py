@@ -0,0 +1,172 @@
+import os
+import sys
+import time
+
+import cflib.crtp
+from cflib.crazyflie import Crazyflie
+from cflib.crazyflie.syncCrazyflie import SyncCrazyflie
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.loop_rate import FixedRate  # noqa: E402
+from common.scripts import load_script  # noqa: E402
+from common.shutdown import MotorShutdown  # noqa: E402
+from common.startup import PhaseTimer  # noqa: E402
+
+# name -> Behaviour subclass
+BEHAVIOURS = {}
+
+
+def behaviour(name):
+    def register(cls):
+        cls.name = name
+        BEHAVIOURS[name] = cls
+        return cls
+    return register
+
+
+class Behaviour:
+    '''
+    A behaviour the runner can start on links that are already open:
+    - setup() starts its log configs and sets its parameters,
+    - tick() is called at `rate` Hz and returns False when the behaviour is over,
+    - teardown() undoes the state of the behaviour itself.
+
+    The runner deletes the log configs added during setup() and, with
+    `motors = True`, stops the motors after teardown(). `drones` is the
+    number of links the behaviour uses, the first ones given to the runner,
+    or None for all of them. `script` is the path of the script the
+    behaviour runs, from the root of the repository, imported once and
+    shared by every run as `module`.
+    '''
+    name = ''
+    script = None
+    rate = 50
+    drones = 1
+    motors = False
+    _module = None
+
+    def __init__(self, scfs):
+        self.scfs = scfs
+
+    @classmethod
+    def load(cls):
+        if cls.script is not None and cls._module is None:
+            cls._module = load_script(cls.script)
+        return cls._module
+
+    @property
+    def module(self):
+        return self.load()
+
+    def setup(self):
+        pass
+
+    def tick(self):
+        return False
+
+    def teardown(self):
+        pass
+
+
+class BehaviourRunner:
+    '''
+    Keeps the links to the drones open and runs behaviours on them one
+    after the other, so switching between them doesn't reconnect or
+    download the TOCs and parameters again:
+
+        with BehaviourRunner(uris) as runner:
+            runner.run('hover_simulation')
+            runner.run('buzz_hunt')
+
+    open() connects, downloads the parameters and imports the scripts of
+    all the registered behaviours once. Each run() reports how long the
+    setup and the teardown of the behaviour took, which is the time to
+    switch.
+    '''
+
+    def __init__(self, uris, rw_cache='./cache'):
+        self.uris = list(uris)
+        self.rw_cache = rw_cache
+        self.scfs = []
+        self.startup = PhaseTimer()
+        self.runs = []
+
+    def open(self):
+        cflib.crtp.init_drivers()
+        self.scfs = [SyncCrazyflie(uri, cf=Crazyflie(rw_cache=self.rw_cache)) for uri in self.uris]
+        self.startup.run('links', lambda: [scf.open_link() for scf in self.scfs])
+        self.startup.run('parameters', lambda: [scf.wait_for_params() for scf in self.scfs])
+        self.startup.run('scripts', lambda: [cls.load() for cls in BEHAVIOURS.values()])
+
+    def close(self):
+        for scf in self.scfs:
+            scf.close_link()
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def run(self, name, duration=None):
+        '''
+        Runs a behaviour until its tick() returns False, for at most
+        `duration` seconds, or until Ctrl + C, and returns its summary.
+        '''
+        cls = BEHAVIOURS[name]
+        drones = cls.drones if cls.drones is not None else len(self.scfs)
+        if drones > len(self.scfs):
+            raise ValueError(f'{name} needs {drones} drones, {len(self.scfs)} connected')
+        scfs = self.scfs[:drones]
+        log_blocks = [len(scf.cf.log.log_blocks) for scf in scfs]
+
+        summary = {'behaviour': name, 'setup': None, 'ticks': 0, 'rate': 0.0, 'ended': 'done'}
+        behaviour = cls(scfs)
+        loop_rate = None
+        start = time.perf_counter()
+        try:
+            behaviour.setup()
+            summary['setup'] = time.perf_counter() - start
+            loop_rate = FixedRate(behaviour.rate, name)
+            while behaviour.tick():
+                if duration is not None and time.perf_counter() - start > duration:
+                    summary['ended'] = 'time'
+                    break
+                loop_rate.sleep()
+        except KeyboardInterrupt:
+            summary['ended'] = 'Ctrl + C'
+        finally:
+            teardown = time.perf_counter()
+            try:
+                behaviour.teardown()
+            finally:
+                self._clean_up(scfs, log_blocks, behaviour.motors, summary)
+            summary['teardown'] = time.perf_counter() - teardown
+        if loop_rate is not None:
+            summary.update(ticks=len(loop_rate.ticks), rate=loop_rate.summary()['rate'])
+        self.runs.append(summary)
+        print(self.format(summary))
+        return summary
+
+    def _clean_up(self, scfs, log_blocks, motors, summary):
+        '''Deletes the log configs the behaviour added and stops its motors.'''
+        for scf, count in zip(scfs, log_blocks):
+            for log_conf in scf.cf.log.log_blocks[count:]:
+                log_conf.delete()
+            # So they don't pile up in cflib over many switches
+            del scf.cf.log.log_blocks[count:]
+        if motors:
+            shutdown = MotorShutdown(scfs)
+            shutdown.run()
+            summary['silent'] = shutdown.silent
+
+    @staticmethod
+    def format(summary):
+        setup = f'{1000 * summary["setup"]:.1f} ms' if summary['setup'] is not None else 'failed'
+        return (f'{summary["behaviour"]}: setup {setup}, {summary["ticks"]} ticks at {summary["rate"]:.1f} Hz, '
+                f'teardown {1000 * summary["teardown"]:.1f} ms ({summary["ended"]})')
+
+    def __str__(self):
+        lines = [str(self.startup)] + [self.format(summary) for summary in self.runs]
+        return '\n'.join(lines)
@@ -0,0 +1,202 @@
+import contextlib
+import math
+import time
+from collections import deque
+from types import SimpleNamespace
+
+import numpy as np
+from cflib.crazyflie.log import CHAN_SETTINGS, CMD_START_LOGGING, CMD_STOP_LOGGING
+
+PHYSICS_STEP = 0.001  # s
+MAX_THRUST = 0.15  # N, of one motor at full power (65535)
+ARM = 0.0325  # m, from the centre to a motor along the x and the y axis
+INERTIA = 1.66e-5  # kg m^2, about the x and the y axis
+MOTOR_TAU = 0.02  # s, time constant of a motor reaching its new power
+HAND_STIFFNESS = 5.9e-3  # Nm/rad, the hand holding the drone pulls it towards the tilt the user wants
+HAND_DAMPING = 3.1e-4  # Nms/rad
+HAND_RATE = 180.0  # deg/s, how fast the user tilts the drone
+PARAM_TIME = 0.002  # s of radio per parameter write, they are sent one after the other
+LOG_NOISE = 0.1  # deg
+
+# How each motor [m1, m2, m3, m4] turns the drone: m1 front right, m2 back right, m3 back left, m4 front left.
+# A positive roll is the right side down and a positive pitch (stateEstimate.pitch) is the nose up, so the
+# thrust of the right motors lowers the roll and the thrust of the front motors raises the pitch.
+ROLL_ARM = np.array([-1.0, -1.0, 1.0, 1.0]) * ARM
+PITCH_ARM = np.array([1.0, -1.0, -1.0, 1.0]) * ARM
+
+
+class TimeLimit(Exception):
+    '''The script is still running at the time limit of the simulation.'''
+
+
+class SimulatedAttitude:
+    '''
+    Stand-in for a handheld Crazyflie, for hover_simulation.py without
+    hardware. The script runs unchanged on `scf`: its motorPowerSet writes
+    reach the motors after the radio time of the writes queued before them,
+    and its log config gets stateEstimate.roll and stateEstimate.pitch.
+
+    The drone is held in a hand that pulls it, like a spring, towards the
+    tilt the user wants (`tilts`, a list of (time, roll, pitch) in s and
+    deg), while the thrust of the motors turns it back. The script never
+    sees real time: `clock` replaces the time module of the script and of
+    FixedRate, and every sleep() runs the simulation up to the time the
+    script wakes up. The CPU time of the script between two sleeps is added
+    to the simulated time, so the loop rate and lateness it measures are
+    the ones its own work allows, however fast the simulation runs. With
+    `speed`, the simulation is paced at that many times real time. A sleep
+    past `time_limit` s raises TimeLimit, for a script that never ends.
+    '''
+
+    def __init__(self, tilts, speed=None, time_limit=None, seed=0):
+        self.tilts = sorted(tilts)
+        self.speed = speed
+        self.time_limit = time_limit
+        self.rng = np.random.default_rng(seed)
+        self.now = 0.0
+        self.angles = np.zeros(2)  # roll, pitch [rad]
+        self.rates = np.zeros(2)
+        self.hand = np.zeros(2)  # Where the hand holds the drone [rad]
+        self.commands = np.zeros(4)  # Motor powers received
+        self.powers = np.zeros(4)  # Motor powers reached
+        self.enabled = False
+        self.blocks = {}
+        self.uplink = deque()  # (arrival time, sent time, name, value)
+        self.link_free = 0.0
+        self.param_latency = []
+        self.history = []  # (time, roll, pitch, target roll, target pitch) every PHYSICS_STEP, in deg
+        self.cpu_time = 0.0
+        self._work_start = time.process_time()
+        self._wall_start = None
+
+        self.clock = SimpleNamespace(perf_counter=self._clock, monotonic=self._clock, time=self._clock,
+                                     sleep=self._sleep)
+        self.cf = SimpleNamespace(link_uri='sim://attitude', link=self,
+                                  log=SimpleNamespace(add_config=self._add_config),
+                                  param=SimpleNamespace(set_value=self._set_param), send_packet=self._send_packet)
+        self.scf = SimpleNamespace(cf=self.cf, _link_uri=self.cf.link_uri)
+
+    # Host side
+
+    def _add_config(self, log_conf):
+        log_conf.cf = self.cf
+        log_conf.id = len(self.blocks)
+        log_conf._added = True
+        log_conf.valid = True
+        self.blocks[log_conf.id] = SimpleNamespace(conf=log_conf, period=None, next_time=None)
+
+    def _send_packet(self, pk, expected_reply=(), **kwargs):
+        if pk.channel == CHAN_SETTINGS and pk.data[0] in (CMD_START_LOGGING, CMD_STOP_LOGGING):
+            block = self.blocks[pk.data[1]]
+            if pk.data[0] == CMD_START_LOGGING:
+                block.period = pk.data[2] / 100
+                block.next_time = self._clock() + block.period
+            else:
+                block.period = None
+
+    def _set_param(self, name, value):
+        sent = self._clock()
+        self.link_free = max(self.link_free, sent) + PARAM_TIME
+        self.uplink.append((self.link_free, sent, name, float(value)))
+
+    # Clock of the script
+
+    def _clock(self):
+        '''Simulated time, with the CPU time the script spent since it last slept.'''
+        return self.now + time.process_time() - self._work_start
+
+    def _sleep(self, duration):
+        if self.time_limit is not None and self.now > self.time_limit:
+            raise TimeLimit(f'Still running after {self.time_limit} s')
+        work = time.process_time() - self._work_start
+        self.cpu_time += work
+        self.run_until(self.now + work + max(duration, 0.0))
+        self._work_start = time.process_time()
+
+    # Firmware side
+
+    def target(self, t):
+        '''The roll and pitch the user wants at time t [deg].'''
+        roll = pitch = 0.0
+        for start, tilt_roll, tilt_pitch in self.tilts:
+            if start <= t:
+                roll, pitch = tilt_roll, tilt_pitch
+        return np.array([roll, pitch])
+
+    def run_until(self, end):
+        if self.speed is not None and self._wall_start is None:
+            self._wall_start = time.perf_counter() - self.now / self.speed
+        while end - self.now > 1e-9:
+            self.step(min(PHYSICS_STEP, end - self.now))
+        if self.speed is not None:
+            ahead = self.now / self.speed - (time.perf_counter() - self._wall_start)
+            if ahead > 0:
+                time.sleep(ahead)
+
+    def step(self, dt=PHYSICS_STEP):
+        t = self.now + dt
+        while self.uplink and self.uplink[0][0] <= t:
+            arrival, sent, name, value = self.uplink.popleft()
+            self.param_latency.append(arrival - sent)
+            if name == 'motorPowerSet.enable':
+                self.enabled = value != 0
+            elif name.startswith('motorPowerSet.m'):
+                self.commands[int(name[-1]) - 1] = value
+
+        commands = self.commands if self.enabled else np.zeros(4)
+        self.powers += (commands - self.powers) * dt / MOTOR_TAU
+        thrust = MAX_THRUST * (np.clip(self.powers, 0, 65535) / 65535) ** 2
+
+        target = np.radians(self.target(t))
+        move = np.radians(HAND_RATE) * dt
+        self.hand += np.clip(target - self.hand, -move, move)
+        torque = (np.array([ROLL_ARM @ thrust, PITCH_ARM @ thrust])
+                  + HAND_STIFFNESS * (self.hand - self.angles) - HAND_DAMPING * self.rates)
+        self.rates += torque / INERTIA * dt
+        self.angles += self.rates * dt
+        self.now = t
+        roll, pitch = np.degrees(self.angles)
+        self.history.append((t, roll, pitch, *np.degrees(self.hand)))
+
+        for block in self.blocks.values():
+            if block.period is not None and block.next_time <= t:
+                block.next_time += block.period
+                sample = {'stateEstimate.roll': roll + self.rng.normal(0, LOG_NOISE),
+                          'stateEstimate.pitch': pitch + self.rng.normal(0, LOG_NOISE)}
+                data = {variable.name: sample[variable.name] for variable in block.conf.variables}
+                block.conf.data_received_cb.call(int(t * 1000), data, block.conf)
+
+    def settling(self, window=0.5):
+        '''
+        For every tilt held long enough: the tilt the user wants, the mean
+        tilt over the last `window` s before the next one, and its
+        peak-to-peak, all in deg.
+        '''
+        history = np.array(self.history)
+        segments = []
+        for (start, roll, pitch), (end, _, _) in zip(self.tilts, self.tilts[1:]):
+            held = history[(history[:, 0] > end - window) & (history[:, 0] <= end)]
+            if end - start < 2 * window or len(held) == 0:
+                continue
+            segments.append({'target': (roll, pitch), 'mean': tuple(held[:, 1:3].mean(axis=0)),
+                             'peak_to_peak': tuple(np.ptp(held[:, 1:3], axis=0))})
+        return segments
+
+
+@contextlib.contextmanager
+def simulated_time(clock, *modules):
+    '''Replaces the time module of `modules` by `clock` inside the with block.'''
+    saved = [module.time for module in modules]
+    for module in modules:
+        module.time = clock
+    try:
+        yield clock
+    finally:
+        for module, original in zip(modules, saved):
+            module.time = original
+
+
+def level_ratio(segment):
+    '''How much of the tilt the user wants is left with the motors: below 1 the motors level the drone.'''
+    target = np.hypot(*segment['target'])
+    return math.hypot(*segment['mean']) / target if target else None
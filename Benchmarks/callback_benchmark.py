@@ -0,0 +1,113 @@
+import math
+import os
+import sys
+import timeit
+from types import SimpleNamespace
+
+from scripts import load_script
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.time_sync import SnapshotSync  # noqa: E402
+
+NUMBER = 100000
+URI = 'radio://0/30/2M/e7e7e7e7e7'
+POSITION = {'stateEstimate.x': 0.1, 'stateEstimate.y': 0.2, 'stateEstimate.z': 0.3, 'stateEstimate.yaw': 4.0}
+ACCELERATION = {'stateEstimate.ax': 0.1, 'stateEstimate.ay': 0.2, 'stateEstimate.az': 0.3}
+QUATERNION = {'stateEstimate.qw': 1.0, 'stateEstimate.qx': 0.0, 'stateEstimate.qy': 0.0, 'stateEstimate.qz': 0.0}
+
+# The callbacks as they were with URI string dispatch, kept as the baseline.
+Follower = 'radio://0/80/2M/E7E7E7E7E7'
+Leader = 'radio://0/80/2M/E7E7E7E7E8'
+x1, y1, z1, yaw1 = [0], [0], [0], [0]
+x2, y2, z2, yaw2 = [0], [0], [0], [0]
+acc_3d_dict = {}
+quat_data_dict = {}
+samples = 4
+
+
+def old_position_callback(uri, data):
+    if uri == Follower:
+        x1.append(data['stateEstimate.x'])
+        y1.append(data['stateEstimate.y'])
+        z1.append(data['stateEstimate.z'])
+        yaw1.append(data['stateEstimate.yaw'])
+    elif uri == Leader:
+        x2.append(data['stateEstimate.x'])
+        y2.append(data['stateEstimate.y'])
+        z2.append(data['stateEstimate.z'])
+        yaw2.append(data['stateEstimate.yaw'])
+    return math.sqrt(pow((x1[-1]-x2[-1]), 2)+pow((y1[-1]-y2[-1]), 2))
+
+
+old_sync = SnapshotSync([Follower, Leader])
+
+
+def old_synced_position_callback(uri, timestamp, data):
+    '''The URI dispatch with the time sync the scripts do since, for a like for like comparison.'''
+    old_position_callback(uri, data)
+    old_sync.add(uri, timestamp, (data['stateEstimate.x'], data['stateEstimate.y']))
+
+
+def old_acceleration_callback(timestamp, data, logconf):
+    acc_x = data['stateEstimate.ax']
+    acc_y = data['stateEstimate.ay']
+    acc_z = data['stateEstimate.az']
+    uri = logconf.name.split(' ')[-1]
+    acc_3d = (math.sqrt(acc_x**2 + acc_y**2 + acc_z**2))
+    if uri not in acc_3d_dict:
+        acc_3d_dict[uri] = []
+    acc_3d_dict[uri].append(acc_3d)
+    if len(acc_3d_dict[uri]) > samples:
+        acc_3d_dict[uri].pop(0)
+
+
+def old_attitude_callback(timestamp, data, logconf):
+    quat = [data['stateEstimate.qw'], data['stateEstimate.qx'],
+            data['stateEstimate.qy'], data['stateEstimate.qz']]
+    uri = logconf.name.split(' ')[-1]
+    if uri not in quat_data_dict:
+        quat_data_dict[uri] = []
+    quat_data_dict[uri].append({
+        'timestamp': timestamp / 1000.0,
+        'quaternion': quat
+    })
+    if len(quat_data_dict[uri]) > samples:
+        quat_data_dict[uri].pop(0)
+
+
+def per_call(statement):
+    '''Best of 5 runs, in microseconds per call.'''
+    return 1e6 * min(timeit.repeat(statement, number=NUMBER, repeat=5)) / NUMBER
+
+
+def report(name, before, after):
+    print(f'{name:<24} before {before:6.3f} us   after {after:6.3f} us   ({before / after:.1f}x)')
+
+
+if __name__ == '__main__':
+    leader_follower = load_script('Leader-Follower_Drone-Drone/Leader-Follower_Drone-Drone.py')
+    vibe_acc = load_script('Vibrate_to_Acceleration/vibe_to_acceleration.py')
+    vibe_rot = load_script('Vibrate_to_Rotation/vibe_to_ang_vel.py')
+    logconf = SimpleNamespace(name='Acceleration for ' + URI)
+
+    # The position callback also maps every sample onto the host clock (SnapshotSync), which the URI
+    # dispatch didn't: it is compared without it, then with it on both sides
+    sync = leader_follower.sync
+    leader_follower.sync = SimpleNamespace(add=lambda uri, timestamp, values: None)
+    report('position_callback',
+           per_call(lambda: old_position_callback(Leader, POSITION)),
+           per_call(lambda: leader_follower.position_callback(leader_follower.leader, 0, POSITION)))
+    leader_follower.sync = sync
+    report('  with the time sync',
+           per_call(lambda: old_synced_position_callback(Leader, 0, POSITION)),
+           per_call(lambda: leader_follower.position_callback(leader_follower.leader, 0, POSITION)))
+
+    acc_state = vibe_acc.DroneState(URI)
+    report('acceleration_callback',
+           per_call(lambda: old_acceleration_callback(0, ACCELERATION, logconf)),
+           per_call(lambda: vibe_acc.acceleration_callback(acc_state, ACCELERATION)))
+
+    rot_state = vibe_rot.DroneState(URI)
+    report('attitude_callback',
+           per_call(lambda: old_attitude_callback(0, QUATERNION, logconf)),
+           per_call(lambda: vibe_rot.attitude_callback(rot_state, 0, QUATERNION)))
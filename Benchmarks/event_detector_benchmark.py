@@ -0,0 +1,132 @@
+import argparse
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.event_detector import free_fall_detector, throw_detector  # noqa: E402
+
+MIN_DURATIONS = [0, 0.01, 0.02, 0.03, 0.05]  # s
+LOG_PERIODS = [0.01, 0.1]  # s
+G = 9.81
+
+
+def synthetic_drop(rng, period=0.001):
+    '''
+    The Crazyflie is held for a few seconds, with bumps that briefly pull
+    the accelerometer close to 0 G, and is then dropped.
+    '''
+    hold = rng.uniform(2, 4)
+    timestamps = np.arange(0, hold + 0.5, period)
+    acc_z = 1 + rng.normal(0, 0.05, len(timestamps))
+    for start in rng.uniform(0, hold - 0.1, 3):
+        bump = (timestamps >= start) & (timestamps < start + rng.uniform(0.003, 0.015))
+        acc_z[bump] = rng.uniform(-0.2, 0.1)
+    falling = timestamps >= hold
+    acc_z[falling] = rng.normal(0, 0.03, np.count_nonzero(falling))
+    return timestamps, {'acc.z': acc_z}, hold
+
+
+def synthetic_throw(rng, period=0.001):
+    '''
+    The Crazyflie is held, thrown upwards and detected at the top of its
+    flight, when it is in free fall and not going up anymore.
+    '''
+    hold = rng.uniform(2, 4)
+    push = 0.15
+    v0 = rng.uniform(1.5, 3)
+    apex = hold + push + (v0 - 0.05) / G
+    timestamps = np.arange(0, apex + 0.5, period)
+    acc_z = 1 + rng.normal(0, 0.05, len(timestamps))
+    vel_z = rng.normal(0, 0.02, len(timestamps))
+    for start in rng.uniform(0, hold - 0.1, 3):
+        bump = (timestamps >= start) & (timestamps < start + rng.uniform(0.003, 0.015))
+        acc_z[bump] = rng.uniform(-0.2, 0.1)
+    pushing = (timestamps >= hold) & (timestamps < hold + push)
+    acc_z[pushing] += v0 / (G * push)
+    vel_z[pushing] += v0 * (timestamps[pushing] - hold) / push
+    flying = timestamps >= hold + push
+    acc_z[flying] = rng.normal(0, 0.03, np.count_nonzero(flying))
+    vel_z[flying] += v0 - G * (timestamps[flying] - hold - push)
+    return timestamps, {'acc.z': acc_z, 'stateEstimate.vz': vel_z}, apex
+
+
+def event_time(timestamps, signals):
+    '''
+    Reference time of a recorded session: the start of the longest run
+    where all the signals are clearly past their thresholds.
+    '''
+    inside = signals['acc.z'] < 0.3
+    if 'stateEstimate.vz' in signals:
+        inside &= signals['stateEstimate.vz'] < 0.15
+    best_start, best_length, start = 0, 0, None
+    for i, value in enumerate(np.append(inside, False)):
+        if value and start is None:
+            start = i
+        elif not value and start is not None:
+            if i - start > best_length:
+                best_start, best_length = start, i - start
+            start = None
+    return timestamps[best_start]
+
+
+def replay(timestamps, signals, detector, log_period):
+    step = max(1, int(round(log_period / np.median(np.diff(timestamps)))))
+    names = list(signals)
+    for i in range(0, len(timestamps), step):
+        if detector.update(timestamps[i], {name: signals[name][i] for name in names}):
+            return detector.fire_time
+    return None
+
+
+def benchmark(name, sessions, make_detector):
+    print(f'\n{name}: {len(sessions)} sessions')
+    print(f'{"log period":>10} {"min duration":>13} {"latency mean":>13} {"latency p95":>12} '
+          f'{"false positives":>16} {"missed":>7}')
+    for log_period in LOG_PERIODS:
+        for min_duration in MIN_DURATIONS:
+            latencies = []
+            false_positives = 0
+            missed = 0
+            for timestamps, signals, reference in sessions:
+                fire_time = replay(timestamps, signals, make_detector(min_duration), log_period)
+                if fire_time is None:
+                    missed += 1
+                elif fire_time < reference:
+                    false_positives += 1
+                else:
+                    latencies.append(fire_time - reference)
+            if latencies:
+                mean = f'{1000*np.mean(latencies):10.1f} ms'
+                p95 = f'{1000*np.percentile(latencies, 95):9.1f} ms'
+            else:
+                mean = p95 = '-'
+            print(f'{1000*log_period:7.0f} ms {1000*min_duration:10.0f} ms {mean:>13} {p95:>12} '
+                  f'{false_positives/len(sessions):15.1%} {missed:>7}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Detection latency vs. false positives of the takeoff detectors.')
+    parser.add_argument('sessions', nargs='*', help='.npz sessions recorded by drop_to_takeoff.py or throw_to_takeoff.py')
+    parser.add_argument('--trials', type=int, default=200, help='Synthetic sessions when no recording is given')
+    args = parser.parse_args()
+
+    if args.sessions:
+        drops = []
+        throws = []
+        for file_name in args.sessions:
+            data = np.load(file_name)
+            signals = {name: data[name] for name in data.files if name != 'timestamps'}
+            session = (data['timestamps'], signals, event_time(data['timestamps'], signals))
+            (throws if 'stateEstimate.vz' in signals else drops).append(session)
+    else:
+        print('No session given, using synthetic drops and throws.')
+        rng = np.random.default_rng(0)
+        drops = [synthetic_drop(rng) for _ in range(args.trials)]
+        throws = [synthetic_throw(rng) for _ in range(args.trials)]
+
+    if drops:
+        benchmark('Drops', drops, free_fall_detector)
+    if throws:
+        benchmark('Throws', throws, throw_detector)
@@ -0,0 +1,230 @@
+import argparse
+import itertools
+import time
+
+import numpy as np
+
+from scripts import load_script
+
+STEP = 0.005  # Simulation step, the control loop of leader_follower() at CONTROL_RATE [s]
+DELAY = 0.02  # From a position sample to the follower reacting to the command computed from it [s]
+NOISE = 0.002  # Position noise of the Lighthouse estimate [m]
+TAU = 0.1  # Time constant of the follower reaching its commanded velocity [s]
+REVERSAL_SPEED = 0.05  # Radial commands slower than this don't count as a reversal [m/s]
+OSCILLATION_WEIGHT = 0.02  # Score: m of tracking error worth one reversal per second
+
+SCRIPTS = {'drone': 'Leader-Follower_Drone-Drone/Leader-Follower_Drone-Drone.py',
+           'human': 'Leader-Follower_Human-Drone/Leader-Follower_Human-Drone.py'}
+
+
+def batch_formation_velocity(fx, fy, lx, ly, r_min, r_max, max_velocity):
+    '''
+    formation_velocity() of the Leader-Follower scripts (pos_to_vel() with
+    its sign) for arrays of followers, each with its own r_min, r_max and
+    MAX_VELOCITY. A follower on top of the leader gets no velocity.
+    '''
+    dx, dy = lx - fx, ly - fy
+    d = np.hypot(dx, dy)
+    magn = np.where(d <= r_min, max_velocity * (1 - d / r_min),
+                    np.where(d <= r_max, 0.0,
+                             np.where(d <= r_min + r_max, max_velocity * (d - r_max) / r_min, max_velocity)))
+    # Too close: back away
+    magn = np.where(d < r_min, -magn, magn)
+    scale = np.divide(magn, d, out=np.zeros_like(d), where=d > 0)
+    return scale * dx, scale * dy
+
+
+def check_control_law(lf, rng, trials=2000):
+    '''Largest difference between batch_formation_velocity() and formation_velocity() of the script.'''
+    saved = lf.r_min, lf.r_max, lf.MAX_VELOCITY
+    worst = 0.0
+    try:
+        for _ in range(trials):
+            lf.r_min = rng.uniform(0.3, 1.2)
+            lf.r_max = lf.r_min + rng.uniform(0.0, 0.8)
+            lf.MAX_VELOCITY = rng.uniform(0.2, 3.0)
+            fx, fy, lx, ly = rng.uniform(-2, 2, 4)
+            d = np.hypot(fx - lx, fy - ly)
+            expected = lf.formation_velocity(fx, fy, lx, ly, d)
+            got = batch_formation_velocity(*np.array([[fx], [fy], [lx], [ly]]), lf.r_min, lf.r_max, lf.MAX_VELOCITY)
+            worst = max(worst, abs(got[0][0] - expected[0]), abs(got[1][0] - expected[1]))
+    finally:
+        lf.r_min, lf.r_max, lf.MAX_VELOCITY = saved
+    return worst
+
+
+def scripted_leader(t, velocity):
+    '''
+    The sequence of the leader in Leader-Follower_Drone-Drone.py, starting at
+    (0, 0), for an array of leader velocities (DEFAULT_VELOCITY).
+    '''
+    if t < 3:
+        return velocity * t, np.zeros_like(velocity)
+    if t < 6:
+        return velocity * (6 - t), np.zeros_like(velocity)
+    # Circle to the right with a radius of 0.9 m, starting forward
+    angle = velocity * (t - 6) / 0.9
+    return 0.9 * np.sin(angle), -0.9 * (1 - np.cos(angle))
+
+
+def load_track(file_name):
+    '''
+    A leader track saved by Leader-Follower_Human-Drone.py (TRACK_FILE):
+    times in s from the first sample and the x-y positions.
+    '''
+    track = np.load(file_name)
+    t = track['t'] - track['t'][0]
+    return t, track['x'], track['y']
+
+
+def track_leader(track):
+    '''Leader path interpolated from a recorded track, the same for every setting.'''
+    t_track, x_track, y_track = track
+
+    def leader(t, velocity):
+        x, y = np.interp(t, t_track, x_track), np.interp(t, t_track, y_track)
+        return np.full_like(velocity, x), np.full_like(velocity, y)
+    return leader
+
+
+def simulate(leader, duration, r_min, r_max, max_velocity, velocity, band, seed=0):
+    '''
+    Flies one follower per setting (r_min, r_max, max_velocity and the leader
+    velocity are arrays of the same length) against the leader, all in one
+    NumPy pass per control step. The followers react to positions DELAY old
+    and reach their commanded velocity with a time constant TAU.
+
+    Returns per setting the rms and max distance outside `band` (the
+    formation the settings are tuned for), the fraction of the time outside
+    it, and the reversals per second of the command along the line to the
+    leader.
+    '''
+    rng = np.random.default_rng(seed)
+    n = len(r_min)
+    steps = int(duration / STEP)
+    lag = max(1, round(DELAY / STEP))
+
+    lx, ly = leader(0.0, velocity)
+    fx, fy = lx - (band[0] + band[1]) / 2, ly.copy()
+    vx, vy = np.zeros(n), np.zeros(n)
+    # The positions the control law sees, DELAY old
+    history = [(fx.copy(), fy.copy(), lx.copy(), ly.copy())] * lag
+
+    error_sum, error_max, outside = np.zeros(n), np.zeros(n), np.zeros(n)
+    last_sign, reversals = np.zeros(n), np.zeros(n)
+    for step in range(steps):
+        t = step * STEP
+        lx, ly = leader(t, velocity)
+        history.append((fx + rng.normal(0, NOISE, n), fy + rng.normal(0, NOISE, n),
+                        lx + rng.normal(0, NOISE, n), ly + rng.normal(0, NOISE, n)))
+        seen_fx, seen_fy, seen_lx, seen_ly = history.pop(0)
+        cmd_x, cmd_y = batch_formation_velocity(seen_fx, seen_fy, seen_lx, seen_ly, r_min, r_max, max_velocity)
+
+        d = np.hypot(lx - fx, ly - fy)
+        error = np.maximum(0, band[0] - d) + np.maximum(0, d - band[1])
+        error_sum += error ** 2
+        np.maximum(error_max, error, out=error_max)
+        outside += error > 0
+
+        radial = np.divide(cmd_x * (lx - fx) + cmd_y * (ly - fy), d, out=np.zeros(n), where=d > 0)
+        sign = np.where(radial > REVERSAL_SPEED, 1.0, np.where(radial < -REVERSAL_SPEED, -1.0, 0.0))
+        reversals += (sign != 0) & (last_sign != 0) & (sign != last_sign)
+        last_sign = np.where(sign != 0, sign, last_sign)
+
+        vx += (cmd_x - vx) * STEP / TAU
+        vy += (cmd_y - vy) * STEP / TAU
+        fx = fx + vx * STEP
+        fy = fy + vy * STEP
+
+    return {'error_rms': np.sqrt(error_sum / steps), 'error_max': error_max, 'outside': outside / steps,
+            'reversals': reversals / (steps * STEP)}
+
+
+def grid(spec):
+    '''start stop num, as for np.linspace.'''
+    start, stop, num = spec
+    # Rounded, so the same distance in two grids compares equal
+    return np.round(np.linspace(start, stop, int(num)), 6)
+
+
+def settings(r_mins, r_maxs, max_velocities, velocities, current):
+    '''All the combinations with r_max > r_min, with the current setting of the script first.'''
+    combos = [current] + [combo for combo in itertools.product(r_mins, r_maxs, max_velocities, velocities)
+                          if combo[1] > combo[0] and combo != current]
+    return [np.array(values, dtype=float) for values in zip(*combos)]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Simulates the follower for many settings of the Leader-Follower scripts at once and ranks them '
+                    'by tracking error and oscillation.')
+    parser.add_argument('--script', choices=SCRIPTS, default='drone',
+                        help='Script whose control law and current settings are used')
+    parser.add_argument('--track', help='.npz leader track saved by Leader-Follower_Human-Drone.py or '
+                                        'common/telemetry_hub.py --record, instead of the scripted leader of '
+                                        'Leader-Follower_Drone-Drone.py')
+    parser.add_argument('--duration', type=float, default=None,
+                        help='Flight time [s], 20 s or the length of the track if unset')
+    parser.add_argument('--band', type=float, nargs=2, default=None, metavar=('R0', 'R1'),
+                        help='Distances the follower should keep [m], r_min and r_max of the script if unset')
+    parser.add_argument('--r-min', type=float, nargs=3, default=(0.4, 1.0, 7), metavar=('START', 'STOP', 'NUM'),
+                        help='Values of r_min tried [m]')
+    parser.add_argument('--r-max', type=float, nargs=3, default=(0.8, 1.6, 9), metavar=('START', 'STOP', 'NUM'),
+                        help='Values of r_max tried [m]')
+    parser.add_argument('--max-velocity', type=float, nargs=3, default=(0.5, 3.0, 6), metavar=('START', 'STOP', 'NUM'),
+                        help='Values of MAX_VELOCITY tried [m/s]')
+    parser.add_argument('--default-velocity', type=float, nargs=3, default=(0.25, 1.0, 4),
+                        metavar=('START', 'STOP', 'NUM'), help='Values of DEFAULT_VELOCITY, the velocity of the scripted leader, '
+                             'tried [m/s], not used with --track')
+    parser.add_argument('--top', type=int, default=5, help='Settings printed per leader velocity')
+    args = parser.parse_args()
+
+    lf = load_script(SCRIPTS[args.script])
+    worst = check_control_law(lf, np.random.default_rng(1))
+    print(f'Control law matches formation_velocity() of {SCRIPTS[args.script]} within {worst:.1e} m/s')
+
+    band = tuple(args.band) if args.band is not None else (lf.r_min, lf.r_max)
+    default_velocity = getattr(lf, 'DEFAULT_VELOCITY', 0.5)
+    if args.track is not None:
+        track = load_track(args.track)
+        leader = track_leader(track)
+        duration = args.duration if args.duration is not None else track[0][-1]
+        velocities = [default_velocity]
+    else:
+        leader = scripted_leader
+        duration = args.duration if args.duration is not None else 20.0
+        velocities = grid(args.default_velocity)
+    current = (lf.r_min, lf.r_max, lf.MAX_VELOCITY, default_velocity)
+    r_min, r_max, max_velocity, velocity = settings(grid(args.r_min), grid(args.r_max), grid(args.max_velocity),
+                                                    velocities, current)
+
+    start = time.process_time()
+    results = simulate(leader, duration, r_min, r_max, max_velocity, velocity, band)
+    cpu = time.process_time() - start
+    print(f'{len(r_min)} settings, {duration:.0f} s of flight each, simulated in {cpu:.2f} s of CPU '
+          f'({len(r_min) * duration / cpu:.0f} flight seconds per second)')
+    print(f'Tracking error: distance outside [{band[0]:.2f}, {band[1]:.2f}] m. '
+          f'Score: rms error + {OSCILLATION_WEIGHT} m x reversals per second\n')
+
+    score = results['error_rms'] + OSCILLATION_WEIGHT * results['reversals']
+    header = (f'{"rank":>4} {"r_min":>6} {"r_max":>6} {"max vel":>7} {"rms":>7} {"max":>7} '
+              f'{"outside":>7} {"rev/s":>6} {"score":>6}')
+
+    def row(rank, i):
+        label = '  <- current' if i == 0 else ''
+        print(f'{rank:4d} {r_min[i]:6.2f} {r_max[i]:6.2f} {max_velocity[i]:7.2f} '
+              f'{100 * results["error_rms"][i]:5.1f}cm {100 * results["error_max"][i]:5.1f}cm '
+              f'{100 * results["outside"][i]:6.1f}% {results["reversals"][i]:6.2f} {score[i]:6.3f}{label}')
+
+    # A slower leader is easier to follow, so the settings are only ranked against the same leader velocity
+    for leader_velocity in np.unique(velocity):
+        group = np.flatnonzero(velocity == leader_velocity)
+        order = group[np.argsort(score[group], kind='stable')]
+        print(f'Leader at {leader_velocity:.2f} m/s' if args.track is None else f'Leader track {args.track}')
+        print(header)
+        for rank, i in enumerate(order[:args.top], 1):
+            row(rank, i)
+        if 0 in order[args.top:]:
+            print(' ...')
+            row(int(np.flatnonzero(order == 0)[0]) + 1, 0)
+        print()
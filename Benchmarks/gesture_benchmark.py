@@ -0,0 +1,137 @@
+import argparse
+
+import numpy as np
+
+from scripts import load_script
+
+gesture_detector = load_script('Fist_flight/gesture_detector.py')
+
+OLD_PERIOD = 0.1  # s  Log period of the original single-sample detector
+OLD_BUSY = 1.2  # s  The original detector ignores gestures while a move is executed
+MATCH_WINDOW = 0.3  # s  A detection counts if it comes this long after a gesture onset
+
+
+def synthetic_session(duration=120, period=0.01, gestures=40, spikes=60, seed=0):
+    '''
+    A session with known gestures: each punch is a positive peak followed by
+    the opposite peak when the hand stops, on top of noise and random spikes.
+    '''
+    rng = np.random.default_rng(seed)
+    timestamps = np.arange(0, duration, period)
+    acc = rng.normal(0, 0.15, (len(timestamps), 3))
+
+    label_times = np.sort(rng.uniform(1, duration - 1, gestures))
+    label_times = label_times[np.insert(np.diff(label_times) > 1.5, 0, True)]
+    keys = list(gesture_detector.GESTURES)
+    label_gestures = []
+    for t in label_times:
+        axis, sign = keys[rng.integers(len(keys))]
+        pulse = np.sin(np.linspace(0, 2 * np.pi, 16)) * rng.uniform(2.5, 4.0)
+        start = int(t / period)
+        acc[start:start + len(pulse), axis] += sign * pulse[:len(acc) - start]
+        label_gestures.append(gesture_detector.GESTURES[(axis, sign)])
+
+    for i in rng.integers(0, len(timestamps), spikes):
+        acc[i, rng.integers(3)] += rng.choice([-1, 1]) * rng.uniform(2.0, 3.5)
+
+    return timestamps, acc, label_times, np.array(label_gestures)
+
+
+def onsets(timestamps, acc, threshold, quiet=1.0):
+    '''
+    Without labels, a gesture onset is the first sample above the threshold
+    after `quiet` seconds below it. Its direction is that of the sample.
+    '''
+    times = []
+    gestures = []
+    last = -np.inf
+    for t, sample in zip(timestamps, acc):
+        axis = int(np.argmax(np.abs(sample)))
+        if abs(sample[axis]) >= threshold:
+            if t - last > quiet:
+                times.append(t)
+                gestures.append(gesture_detector.GESTURES[(axis, int(np.sign(sample[axis])))])
+            last = t
+    return np.array(times), np.array(gestures)
+
+
+def run_detector(timestamps, acc, detector):
+    detections = []
+    for t, sample in zip(timestamps, acc):
+        gesture = detector.update(t, sample)
+        if gesture is not None:
+            detections.append((t, gesture))
+    return detections
+
+
+def run_single_sample(timestamps, acc, threshold):
+    step = max(1, int(round(OLD_PERIOD / np.median(np.diff(timestamps)))))
+    detections = []
+    busy_until = -np.inf
+    for t, sample in zip(timestamps[::step], acc[::step]):
+        if t < busy_until:
+            continue
+        gesture = gesture_detector.single_sample_detector(sample, threshold)
+        if gesture is not None:
+            detections.append((t, gesture))
+            busy_until = t + OLD_BUSY
+    return detections
+
+
+def score(detections, label_times, label_gestures, duration):
+    '''
+    Matches every detection to the latest gesture onset before it. Returns
+    the latencies of the correct detections and the false triggers per minute
+    (detections with no onset, with the wrong direction or duplicated).
+    '''
+    latencies = []
+    used = set()
+    false_triggers = 0
+    for t, gesture in detections:
+        candidates = np.nonzero((label_times <= t) & (label_times > t - MATCH_WINDOW))[0]
+        if len(candidates) == 0:
+            false_triggers += 1
+            continue
+        i = candidates[-1]
+        if i in used or label_gestures[i] != gesture:
+            false_triggers += 1
+            continue
+        used.add(i)
+        latencies.append(t - label_times[i])
+    missed = len(label_times) - len(used)
+    return np.array(latencies), false_triggers / (duration / 60), missed
+
+
+def report(name, latencies, false_rate, missed, total):
+    if len(latencies):
+        print(f'{name:<16} latency mean {1000*np.mean(latencies):6.1f} ms, '
+              f'p95 {1000*np.percentile(latencies, 95):6.1f} ms, '
+              f'false triggers {false_rate:5.2f}/min, missed {missed}/{total}')
+    else:
+        print(f'{name:<16} no correct detections, false triggers {false_rate:5.2f}/min, missed {missed}/{total}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Detection latency and false triggers of the gesture detectors.')
+    parser.add_argument('sessions', nargs='*', help='.npz sessions recorded by fist_flight.py')
+    parser.add_argument('--threshold', type=float, default=2.0)
+    args = parser.parse_args()
+
+    if args.sessions:
+        sessions = []
+        for file_name in args.sessions:
+            data = np.load(file_name)
+            timestamps, acc = data['timestamps'], data['acc']
+            label_times, label_gestures = onsets(timestamps, acc, args.threshold)
+            sessions.append((file_name, timestamps, acc, label_times, label_gestures))
+    else:
+        print('No session given, using a synthetic one.')
+        sessions = [('synthetic', *synthetic_session())]
+
+    for name, timestamps, acc, label_times, label_gestures in sessions:
+        duration = timestamps[-1] - timestamps[0]
+        print(f'\n{name}: {duration:.0f} s, {len(label_times)} gestures')
+        detections = run_single_sample(timestamps, acc, args.threshold)
+        report('single sample', *score(detections, label_times, label_gestures, duration), len(label_times))
+        detections = run_detector(timestamps, acc, gesture_detector.GestureDetector(threshold=args.threshold))
+        report('streaming', *score(detections, label_times, label_gestures, duration), len(label_times))
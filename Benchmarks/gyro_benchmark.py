@@ -0,0 +1,148 @@
+import timeit
+
+import numpy as np
+from cflib.crazyflie.log import LogTocElement
+from scipy.spatial.transform import Rotation
+
+from microbenchmarks import uris
+from scripts import load_script
+
+DRONES = 30
+STEP_RATE = 300  # deg/s, the drone starts turning at this rate
+GYRO_NOISE = 0.5  # deg/s
+TRIALS = 200
+LOG_HEADER = 5  # bytes of a log packet before the data: CRTP header, block id, timestamp
+
+QUATERNION = {'stateEstimate.qw': 'float', 'stateEstimate.qx': 'float', 'stateEstimate.qy': 'float',
+              'stateEstimate.qz': 'float'}
+GYRO = {'gyro.x': 'FP16', 'gyro.y': 'FP16', 'gyro.z': 'FP16'}
+
+
+def payload(variables):
+    sizes = {name: size for name, _, size in LogTocElement.types.values()}
+    return sum(sizes[fetch_as] for fetch_as in variables.values())
+
+
+def quaternion_data(rotation):
+    qx, qy, qz, qw = np.float32(rotation.as_quat())
+    return {'stateEstimate.qw': qw, 'stateEstimate.qx': qx, 'stateEstimate.qy': qy, 'stateEstimate.qz': qz}
+
+
+def gyro_data(rate):
+    '''The gyro rates as received, rounded to half floats.'''
+    gx, gy, gz = np.float16(rate)
+    return {'gyro.x': float(gx), 'gyro.y': float(gy), 'gyro.z': float(gz)}
+
+
+def filled_states(vibe, drones, rng):
+    '''Drones turning at random rates, with full ring buffers of both kinds of samples.'''
+    states = []
+    for uri in uris(drones):
+        state = vibe.DroneState(uri)
+        axis = rng.normal(size=3)
+        rate = rng.uniform(0, 500) * axis / np.linalg.norm(axis)
+        for i in range(vibe.samples):
+            t = i * vibe.log_period / 1000
+            vibe.attitude_callback(state, t * 1000, quaternion_data(Rotation.from_rotvec(np.radians(rate) * t)))
+        # The rate is constant, so all the gyro samples are the same
+        state.gyro[:] = np.float16(rate)
+        states.append(state)
+    return states
+
+
+def cpu(vibe, rng):
+    '''Time per call in µs of the callbacks and of the angular speed of one drone and of a batch of DRONES.'''
+    states = filled_states(vibe, DRONES, rng)
+    state = states[0]
+    # The callbacks write into their own state, with NumPy ring buffers as in the script
+    callback_state = vibe.DroneState(state.uri, np.zeros(vibe.samples), np.zeros((vibe.samples, 4)),
+                                     np.zeros((vibe.samples, 3)))
+    counts = np.array([s.count for s in states])
+    indices = np.array([s.index for s in states])
+    times = np.stack([s.timestamps for s in states])
+    quaternions = np.stack([s.quaternions for s in states])
+    gyro = np.stack([s.gyro for s in states])
+    quaternion_sample = quaternion_data(Rotation.random(random_state=0))
+    gyro_sample = gyro_data((100.0, -50.0, 20.0))
+
+    def best(func, number):
+        return 1e6 * min(timeit.repeat(func, number=number, repeat=5)) / number
+
+    return {
+        'quaternion': (best(lambda: vibe.attitude_callback(callback_state, 0, quaternion_sample), 20000),
+                       best(lambda: vibe.calculate_average_angular_velocity(state), 200),
+                       best(lambda: vibe.batch_angular_velocities(times, quaternions, indices, counts), 500)),
+        'gyro': (best(lambda: vibe.gyro_callback(callback_state, 0, gyro_sample), 20000),
+                 best(lambda: vibe.average_gyro_rate(state), 5000),
+                 best(lambda: vibe.batch_gyro_rates(gyro, counts), 2000)),
+    }
+
+
+def response(vibe, rng, use_gyro):
+    '''
+    Time from the start of a turn at STEP_RATE until the computed angular
+    speed reaches 50 % and 90 % of it, in ms, averaged over TRIALS random
+    phases of the log and of the vibration loop. The radio delay is the
+    same for both kinds of samples and is left out.
+    '''
+    period = vibe.log_period / 1000
+    tick = 1 / vibe.vibration_rate
+    crossings = {50: [], 90: []}
+    for _ in range(TRIALS):
+        state = vibe.DroneState('radio://0/80/2M/E7E7E7E7E7')
+        axis = rng.normal(size=3)
+        axis /= np.linalg.norm(axis)
+        log_phase, tick_phase = rng.uniform(0, period), rng.uniform(0, tick)
+        sample_times = np.arange(-vibe.samples * period + log_phase, 1.0, period)
+        tick_times = np.arange(tick_phase, 1.0, tick)
+        reached = {}
+        next_sample = 0
+        for now in tick_times:
+            while next_sample < len(sample_times) and sample_times[next_sample] <= now:
+                t = sample_times[next_sample]
+                if use_gyro:
+                    rate = STEP_RATE * axis * (t >= 0) + rng.normal(0, GYRO_NOISE, 3)
+                    vibe.gyro_callback(state, t * 1000, gyro_data(rate))
+                else:
+                    angle = np.radians(STEP_RATE) * max(t, 0.0)
+                    vibe.attitude_callback(state, t * 1000, quaternion_data(Rotation.from_rotvec(angle * axis)))
+                next_sample += 1
+            if use_gyro:
+                speed = vibe.average_gyro_rate(state)
+            else:
+                speed = vibe.calculate_average_angular_velocity(state)
+            for level in crossings:
+                if level not in reached and speed >= STEP_RATE * level / 100:
+                    reached[level] = now
+        for level in crossings:
+            crossings[level].append(1000 * reached.get(level, np.nan))
+    return {level: np.nanmean(values) for level, values in crossings.items()}
+
+
+if __name__ == '__main__':
+    vibe = load_script('Vibrate_to_Rotation/vibe_to_ang_vel.py')
+    rng = np.random.default_rng(0)
+    rate = 1000 / vibe.log_period
+
+    print(f'Log period {vibe.log_period} ms, {vibe.samples} samples averaged, vibration loop at {vibe.vibration_rate} Hz')
+    print('\nBandwidth per drone')
+    for name, variables in (('quaternion', QUATERNION), ('gyro', GYRO)):
+        size = payload(variables)
+        print(f'  {name:<11} {size:2d} bytes of data per sample, {(size + LOG_HEADER) * rate:6.0f} B/s with the '
+              f'log header')
+
+    print(f'\nCPU per call [µs]  (batch: {DRONES} drones)')
+    print(f'  {"":<11} {"callback":>9} {"one drone":>10} {"batch":>8}')
+    for name, (callback, single, batch) in cpu(vibe, rng).items():
+        print(f'  {name:<11} {callback:9.2f} {single:10.2f} {batch:8.2f}')
+
+    print(f'\nResponse to a turn starting at {STEP_RATE} deg/s [ms], without the radio delay')
+    print(f'  {"":<18} {"50 %":>6} {"90 %":>6}')
+    samples = vibe.samples
+    for name, use_gyro, window in (('quaternion', False, samples), ('gyro', True, samples),
+                                   (f'gyro, {samples - 1} samples', True, samples - 1)):
+        # The quaternions average samples - 1 differences, the same time window as samples - 1 gyro samples
+        vibe.samples = window
+        times = response(vibe, rng, use_gyro)
+        print(f'  {name:<18} {times[50]:6.1f} {times[90]:6.1f}')
+    vibe.samples = samples
@@ -0,0 +1,110 @@
+import argparse
+import contextlib
+import io
+import sys
+import time
+
+import numpy as np
+
+from attitude_simulator import SimulatedAttitude, TimeLimit, level_ratio, simulated_time
+from scripts import load_script
+
+# (time [s], roll [deg], pitch [deg]) the user tilts the drone to, from the start of the script.
+# The last one turns it upside down, which ends the script: the user turns it past 180 deg since the
+# motors hold it back, as they do for the other tilts.
+TILTS = [(0, 0, 0), (3, 20, 0), (5, -20, 0), (7, 0, 20), (9, 0, -20), (11, 15, 15), (13, -15, -15), (15, 0, 0),
+         (17, 240, 0)]
+TIME_LIMIT = 30.0  # s of simulated time, in case the script never ends
+OSCILLATION_LIMIT = 2.0  # deg, peak-to-peak of a held tilt
+
+
+def run(hover, tilts=TILTS, speed=None):
+    '''
+    Runs hover_simulation.py on a SimulatedAttitude, as its __main__ does
+    after the plots. Returns the simulator, the FixedRate of the motor loop
+    and the wall time of the run.
+    '''
+    sim = SimulatedAttitude(tilts, speed=speed, time_limit=TIME_LIMIT)
+    loop_rate_module = sys.modules[hover.FixedRate.__module__]
+    fixed_rate = hover.FixedRate
+    loops = []
+
+    def recorded_fixed_rate(*args, **kwargs):
+        loops.append(fixed_rate(*args, **kwargs))
+        return loops[-1]
+
+    hover.roll[:] = [0]
+    hover.pitch[:] = [0]
+    hover.FixedRate = recorded_fixed_rate
+    clock = sim.clock
+    start = time.perf_counter()
+    try:
+        # The motor drawing is printed every PRINT_EVERY loops
+        with simulated_time(clock, hover, loop_rate_module), contextlib.redirect_stdout(io.StringIO()):
+            hover.start_position_printing(sim.scf)
+            clock.sleep(1)
+            hover.vibration(sim.scf)
+    except TimeLimit:
+        pass
+    finally:
+        hover.FixedRate = fixed_rate
+    return sim, loops[0] if loops else None, time.perf_counter() - start
+
+
+def report(hover, sim, loop_rate, wall_time):
+    '''Prints the results and returns whether the hover loop is stable.'''
+    ended = abs(hover.roll[-1]) >= 170
+    summary = loop_rate.summary()
+    loops = summary['loops']
+    print(f'{sim.now:.1f} s simulated in {wall_time:.2f} s ({sim.now / wall_time:.0f}x real time)'
+          + ('' if ended else f', stopped at the {TIME_LIMIT:.0f} s limit: the drone never turned upside down'))
+    print(f'Motor loop: {summary["rate"]:.1f} Hz (target {hover.LOOP_RATE} Hz), late p99 {summary["late_p99"]:.2f} ms, '
+          f'{loop_rate.overruns} overruns, CPU {1000 * sim.cpu_time / max(loops, 1):.3f} ms per loop')
+    latency = 1000 * np.array(sim.param_latency) if sim.param_latency else np.zeros(1)
+    print(f'Parameter writes: {len(sim.param_latency)}, latency p50 {np.percentile(latency, 50):.1f} ms, '
+          f'p99 {np.percentile(latency, 99):.1f} ms\n')
+
+    print(f'{"wanted":>14} {"held":>14} {"left":>6} {"p-p":>12}')
+    problems = []
+    if not ended:
+        problems.append('never turned upside down')
+    if summary['rate'] < 0.95 * hover.LOOP_RATE:
+        problems.append('motor loop below its rate')
+    for segment in sim.settling():
+        ratio = level_ratio(segment)
+        (roll, pitch), (held_roll, held_pitch) = segment['target'], segment['mean']
+        peak_to_peak = max(segment['peak_to_peak'])
+        left = f'{100 * ratio:5.0f}%' if ratio is not None else '     -'
+        print(f'{roll:6.1f} {pitch:6.1f}° {held_roll:6.1f} {held_pitch:6.1f}° {left} {peak_to_peak:10.2f}°')
+        # The motors must take back part of every tilt, without shaking
+        if ratio is not None and ratio >= 1:
+            problems.append(f'tilted further than {roll:.0f}°/{pitch:.0f}° by the motors')
+        if peak_to_peak >= OSCILLATION_LIMIT:
+            problems.append(f'shaking by {peak_to_peak:.1f}° at {roll:.0f}°/{pitch:.0f}°')
+    print('\nStable' if not problems else f'\nUNSTABLE: {", ".join(problems)}')
+    return not problems
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Runs hover_simulation.py on a simulated handheld drone, faster than real time, and reports the '
+                    'rate of its motor loop and how well its mixer levels the drone.')
+    parser.add_argument('--speed', type=float, default=None,
+                        help='Pace the simulation at this many times real time, as fast as possible if unset')
+    parser.add_argument('--loop-rate', type=float, default=None, help='LOOP_RATE of the script [Hz]')
+    parser.add_argument('--log-period', type=int, default=None, help='LOG_PERIOD of the script [ms]')
+    parser.add_argument('--max-power', type=int, default=None, help='max_power of the script')
+    parser.add_argument('--max-angle', type=float, default=None, help='max_angle of the script [deg]')
+    parser.add_argument('--check', action='store_true', help='Exit with status 1 when unstable, e.g. in a CI job')
+    args = parser.parse_args()
+
+    hover = load_script('Hover_simulation/hover_simulation.py')
+    for name, value in (('LOOP_RATE', args.loop_rate), ('LOG_PERIOD', args.log_period),
+                        ('max_power', args.max_power), ('max_angle', args.max_angle)):
+        if value is not None:
+            setattr(hover, name, value)
+    print(f'LOOP_RATE {hover.LOOP_RATE} Hz, LOG_PERIOD {hover.LOG_PERIOD} ms, power {hover.min_power}-{hover.max_power} '
+          f'from {hover.min_angle} to {hover.max_angle} deg')
+    stable = report(hover, *run(hover, speed=args.speed))
+    if args.check and not stable:
+        sys.exit(1)
@@ -0,0 +1,128 @@
+import argparse
+import math
+import os
+import sys
+from collections import deque
+
+import numpy as np
+
+from scripts import load_script
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.motion_prediction import AlphaBetaFilter  # noqa: E402
+from common.time_sync import ClockSync, SnapshotSync  # noqa: E402
+
+STEP = 0.001  # Simulation step [s]
+LOG_PERIOD = 0.01
+LOOP_PERIOD = 0.005  # Control loop of leader_follower()
+NOISE = 0.002  # Position noise of the Lighthouse estimate [m]
+TAU = 0.1  # Time constant of the follower reaching its commanded velocity [s]
+
+
+def leader_position(t, velocity):
+    '''The sequence of the leader in Leader-Follower_Drone-Drone.py, starting at (0, 0).'''
+    if t < 3:
+        return velocity * t, 0.0
+    if t < 6:
+        return velocity * (6 - t), 0.0
+    # Circle to the right with a radius of 0.9 m, starting forward
+    angle = velocity * (t - 6) / 0.9
+    return 0.9 * math.sin(angle), -0.9 * (1 - math.cos(angle))
+
+
+def simulate(lf, predict, duration, velocity, delay, jitter, command_delay, latency, alpha, beta, seed=0):
+    '''
+    Flies the follower against the simulated leader. Both drones log their
+    position every LOG_PERIOD, received after `delay` + up to `jitter`
+    seconds. The commands of the follower take effect after `command_delay`.
+    Returns the true distance and the leader position error of the aim point
+    at every control step.
+    '''
+    rng = np.random.default_rng(seed)
+    uris = ('follower', 'leader')
+    sync = SnapshotSync(uris)
+    clocks = {uri: ClockSync() for uri in uris}
+    leader_filter = AlphaBetaFilter(alpha, beta)
+    boot = {'follower': 12.3, 'leader': 45.6}  # The drone clocks are not the host clock
+
+    follower = np.array([-0.9, 0.0])
+    follower_velocity = np.zeros(2)
+    commanded = np.zeros(2)
+    in_flight = deque()  # (receive time, uri, timestamp in ms, position)
+    commands = deque()  # (apply time, velocity)
+    distances, aim_errors = [], []
+
+    steps = int(duration / STEP)
+    log_every = round(LOG_PERIOD / STEP)
+    loop_every = round(LOOP_PERIOD / STEP)
+    for step in range(steps):
+        t = step * STEP
+        leader = np.array(leader_position(t, velocity))
+
+        if step % log_every == 0:
+            for uri, position in (('follower', follower), ('leader', leader)):
+                measured = position + rng.normal(0, NOISE, 2)
+                timestamp = round((t + boot[uri]) * 1000)
+                in_flight.append((t + delay + rng.uniform(0, jitter), uri, timestamp, measured))
+        for sample in [sample for sample in in_flight if sample[0] <= t]:
+            in_flight.remove(sample)
+            received, uri, timestamp, measured = sample
+            sync.add_host(uri, clocks[uri].to_host(timestamp, received), tuple(measured))
+
+        if step % loop_every == 0:
+            snapshot = sync.snapshot()
+            if snapshot is not None:
+                (fx, fy), (lx, ly) = snapshot['follower'], snapshot['leader']
+                if predict:
+                    for host_time, position in list(sync.samples['leader']):
+                        if leader_filter.time is None or host_time > leader_filter.time:
+                            leader_filter.update(host_time, position)
+                    fx, fy = sync.value_at('follower', t)
+                    lx, ly = leader_filter.predict(t + latency)
+                commands.append((t + command_delay, np.array(lf.formation_velocity(fx, fy, lx, ly, math.hypot(fx - lx, fy - ly)))))
+                true_leader = np.array(leader_position(t + command_delay, velocity))
+                aim_errors.append(math.hypot(lx - true_leader[0], ly - true_leader[1]))
+                distances.append(math.hypot(*(leader - follower)))
+
+        while commands and commands[0][0] <= t:
+            commanded = commands.popleft()[1]
+        follower_velocity += (commanded - follower_velocity) * STEP / TAU
+        follower = follower + follower_velocity * STEP
+
+    return np.array(distances), np.array(aim_errors)
+
+
+def band_error(lf, distances):
+    '''How far the true distance is outside [r_min, r_max].'''
+    return np.maximum(0, lf.r_min - distances) + np.maximum(0, distances - lf.r_max)
+
+
+def report(name, lf, distances, aim_errors):
+    error = band_error(lf, distances)
+    print(f'{name:<12} aim error mean {100 * aim_errors.mean():5.2f} cm  max {100 * aim_errors.max():5.2f} cm   '
+          f'outside band rms {100 * np.sqrt(np.mean(error ** 2)):5.2f} cm  max {100 * error.max():5.2f} cm  '
+          f'({100 * np.mean(error > 0):4.1f}% of the time)')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Tracking error of the follower with and without the leader prediction, on a simulated flight.')
+    parser.add_argument('--duration', type=float, default=20, help='Flight time [s]')
+    parser.add_argument('--velocity', type=float, default=None, help='Leader velocity [m/s], DEFAULT_VELOCITY if unset')
+    parser.add_argument('--delay', type=float, default=0.01, help='Minimum delay of the log packets [s]')
+    parser.add_argument('--jitter', type=float, default=0.01, help='Additional random delay of the log packets [s]')
+    parser.add_argument('--command-delay', type=float, default=0.02,
+                        help='Delay from a command to the follower reacting [s]')
+    parser.add_argument('--latency', type=float, default=None, help='Prediction horizon [s], LATENCY if unset')
+    parser.add_argument('--alpha', type=float, default=0.5)
+    parser.add_argument('--beta', type=float, default=0.1)
+    args = parser.parse_args()
+
+    lf = load_script('Leader-Follower_Drone-Drone/Leader-Follower_Drone-Drone.py')
+    velocity = args.velocity if args.velocity is not None else lf.DEFAULT_VELOCITY
+    latency = args.latency if args.latency is not None else lf.LATENCY
+    print(f'Leader at {velocity} m/s, log delay {1000 * args.delay:.0f}-{1000 * (args.delay + args.jitter):.0f} ms, '
+          f'command delay {1000 * args.command_delay:.0f} ms, prediction {1000 * latency:.0f} ms ahead')
+    for name, predict in (('reactive', False), ('predictive', True)):
+        report(name, lf, *simulate(lf, predict, args.duration, velocity, args.delay, args.jitter,
+                                   args.command_delay, latency, args.alpha, args.beta))
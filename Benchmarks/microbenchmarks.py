@@ -0,0 +1,286 @@
+import argparse
+import json
+import math
+import platform
+import sys
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+import numpy as np
+from scipy.spatial.transform import Rotation
+
+from scripts import load_script
+
+CALLS_PER_DRONE = 20
+LOG_PERIOD = 10  # ms, timestamps of the synthetic samples
+MIN_TIME = 0.05  # s, shortest timed pass of a case
+
+# name -> setup(drones, rng) returning the function and the list of its arguments
+CASES = {}
+
+
+def case(name):
+    def register(setup):
+        CASES[name] = setup
+        return setup
+    return register
+
+
+def fake_scf(uri):
+    '''Stands in for the SyncCrazyflie: the parameter writes go nowhere, so only the computation is timed.'''
+    param = SimpleNamespace(set_value=lambda name, value: None)
+    return SimpleNamespace(_link_uri=uri, cf=SimpleNamespace(link_uri=uri, param=param))
+
+
+def uris(drones):
+    return [f'radio://0/80/2M/E7E7E7{i:04X}' for i in range(drones)]
+
+
+@case('leader_follower.pos_to_vel')
+def setup_pos_to_vel(drones, rng):
+    lf = load_script('Leader-Follower_Drone-Drone/Leader-Follower_Drone-Drone.py')
+    inputs = []
+    for x1, y1, x2, y2 in rng.uniform(-3, 3, (drones * CALLS_PER_DRONE, 4)):
+        inputs.append((x1, y1, x2, y2, math.sqrt(pow((x1-x2), 2)+pow((y1-y2), 2))))
+    return lf.pos_to_vel, inputs
+
+
+@case('leader_follower.position_callback')
+def setup_position_callback(drones, rng):
+    lf = load_script('Leader-Follower_Drone-Drone/Leader-Follower_Drone-Drone.py')
+    inputs = []
+    for i in range(drones * CALLS_PER_DRONE):
+        x, y, z, yaw = rng.uniform(-2, 2, 4)
+        data = {'stateEstimate.x': x, 'stateEstimate.y': y, 'stateEstimate.z': z, 'stateEstimate.yaw': yaw}
+        # Only the follower and the leader exist in these scripts
+        inputs.append((lf.follower if i % 2 else lf.leader, (i // 2) * LOG_PERIOD, data))
+    return lf.position_callback, inputs
+
+
+@case('hover_simulation.power_profile')
+def setup_hover_power_profile(drones, rng):
+    hover = load_script('Hover_simulation/hover_simulation.py')
+    return hover.power_profile, [(angle,) for angle in rng.uniform(-40, 40, drones * CALLS_PER_DRONE)]
+
+
+@case('hover_simulation.motor_powers')
+def setup_motor_powers(drones, rng):
+    hover = load_script('Hover_simulation/hover_simulation.py')
+    return hover.motor_powers, [tuple(angles) for angles in rng.uniform(-40, 40, (drones * CALLS_PER_DRONE, 2))]
+
+
+@case('hover_simulation.attitude_callback')
+def setup_hover_attitude_callback(drones, rng):
+    hover = load_script('Hover_simulation/hover_simulation.py')
+    inputs = [(i * LOG_PERIOD, {'stateEstimate.roll': roll, 'stateEstimate.pitch': pitch}, None)
+              for i, (roll, pitch) in enumerate(rng.uniform(-40, 40, (drones * CALLS_PER_DRONE, 2)))]
+    return hover.attitude_callback, inputs
+
+
+@case('buzz_hunt.power_calculator')
+def setup_buzz_power_calculator(drones, rng):
+    buzz = load_script('Buzz_Hunt/buzz_hunt.py')
+    return buzz.power_calculator, [(dist,) for dist in rng.uniform(0, buzz.radius, drones * CALLS_PER_DRONE)]
+
+
+@case('buzz_hunt.position_callback')
+def setup_buzz_position_callback(drones, rng):
+    buzz = load_script('Buzz_Hunt/buzz_hunt.py')
+    buzz.x2, buzz.y2, buzz.z2 = buzz.random_3d_point()
+    inputs = [(i * 100, {'stateEstimate.x': x, 'stateEstimate.y': y, 'stateEstimate.z': z}, None)
+              for i, (x, y, z) in enumerate(rng.uniform(-2, 2, (drones * CALLS_PER_DRONE, 3)))]
+    return buzz.position_callback, inputs
+
+
+@case('vibe_to_acceleration.acceleration_callback')
+def setup_acceleration_callback(drones, rng):
+    vibe = load_script('Vibrate_to_Acceleration/vibe_to_acceleration.py')
+    states = [vibe.DroneState(uri) for uri in uris(drones)]
+    inputs = [(states[i % drones], {'stateEstimate.ax': ax, 'stateEstimate.ay': ay, 'stateEstimate.az': az})
+              for i, (ax, ay, az) in enumerate(rng.normal(0, 0.3, (drones * CALLS_PER_DRONE, 3)))]
+    return vibe.acceleration_callback, inputs
+
+
+@case('vibe_to_acceleration.power_calculator')
+def setup_acceleration_power_calculator(drones, rng):
+    vibe = load_script('Vibrate_to_Acceleration/vibe_to_acceleration.py')
+    inputs = []
+    for uri in uris(drones):
+        state = vibe.DroneState(uri)
+        for acc in rng.normal(0, 0.3, (vibe.samples, 3)):
+            vibe.acceleration_callback(state, dict(zip(('stateEstimate.ax', 'stateEstimate.ay', 'stateEstimate.az'),
+                                                       acc)))
+        scf = fake_scf(uri)
+        state.motor = vibe.motor_command(scf)
+        inputs.append((scf, state))
+    return vibe.power_calculator, inputs * CALLS_PER_DRONE
+
+
+def rotating_states(vibe, drones, rng):
+    '''Drones turning around a random axis at up to 500 deg/s, with a full ring buffer.'''
+    states = []
+    for uri in uris(drones):
+        state = vibe.DroneState(uri)
+        axis = rng.normal(size=3)
+        rate = np.radians(rng.uniform(0, 500)) * axis / np.linalg.norm(axis)
+        for i in range(vibe.samples):
+            t = i * vibe.log_period / 1000
+            qx, qy, qz, qw = Rotation.from_rotvec(rate * t).as_quat()
+            vibe.attitude_callback(state, t * 1000, {'stateEstimate.qw': qw, 'stateEstimate.qx': qx,
+                                                     'stateEstimate.qy': qy, 'stateEstimate.qz': qz})
+        states.append(state)
+    return states
+
+
+@case('vibe_to_ang_vel.attitude_callback')
+def setup_attitude_callback(drones, rng):
+    vibe = load_script('Vibrate_to_Rotation/vibe_to_ang_vel.py')
+    states = [vibe.DroneState(uri) for uri in uris(drones)]
+    inputs = []
+    for i, (qx, qy, qz, qw) in enumerate(Rotation.random(drones * CALLS_PER_DRONE, random_state=0).as_quat()):
+        data = {'stateEstimate.qw': qw, 'stateEstimate.qx': qx, 'stateEstimate.qy': qy, 'stateEstimate.qz': qz}
+        inputs.append((states[i % drones], (i // drones) * vibe.log_period, data))
+    return vibe.attitude_callback, inputs
+
+
+@case('vibe_to_ang_vel.calculate_average_angular_velocity')
+def setup_average_angular_velocity(drones, rng):
+    vibe = load_script('Vibrate_to_Rotation/vibe_to_ang_vel.py')
+    return vibe.calculate_average_angular_velocity, [(state,) for state in rotating_states(vibe, drones, rng)]
+
+
+@case('vibe_to_ang_vel.power_profile')
+def setup_ang_vel_power_profile(drones, rng):
+    vibe = load_script('Vibrate_to_Rotation/vibe_to_ang_vel.py')
+    return vibe.power_profile, [(dps,) for dps in rng.uniform(0, 500, drones * CALLS_PER_DRONE)]
+
+
+@case('fist_flight.acceleration_callback')
+def setup_fist_flight_callback(drones, rng):
+    fist = load_script('Fist_flight/fist_flight.py')
+    inputs = [(i * fist.TimePer, {'acc.x': x, 'acc.y': y, 'acc.z': 1 + z}, None)
+              for i, (x, y, z) in enumerate(rng.normal(0, 0.1, (drones * CALLS_PER_DRONE, 3)))]
+    return fist.acceleration_callback, inputs
+
+
+@case('drop_to_takeoff.acceleration_callback')
+def setup_drop_callback(drones, rng):
+    drop = load_script('Drop_to_take_off/drop_to_takeoff.py')
+    inputs = [(i * drop.TimePer, {'acc.z': 1 + z, 'range.zrange': 0, 'posEstAlt.estimatedZ': 0.0,
+                                  'stateEstimate.z': 0.0}, None)
+              for i, z in enumerate(rng.normal(0, 0.05, drones * CALLS_PER_DRONE))]
+    return drop.acceleration_callback, inputs
+
+
+@case('throw_to_takeoff.z_axis_callback')
+def setup_throw_callback(drones, rng):
+    throw = load_script('Throw_to_takeoff/throw_to_takeoff.py')
+    inputs = [(i * throw.TimePer, {'acc.z': 1 + z, 'stateEstimate.vz': vz}, None)
+              for i, (z, vz) in enumerate(rng.normal(0, 0.05, (drones * CALLS_PER_DRONE, 2)))]
+    return throw.z_axis_callback, inputs
+
+
+@case('multiranger_push.range_callback')
+def setup_range_callback(drones, rng):
+    push = load_script('Multiranger_push/multiranger_push.py')
+    inputs = [(i * 20, dict(zip(push.RANGES, ranges)), None)
+              for i, ranges in enumerate(rng.uniform(100, 9000, (drones * CALLS_PER_DRONE, len(push.RANGES))))]
+    return push.range_callback, inputs
+
+
+def measure(func, inputs, repeat):
+    '''
+    Returns the time per call in us (best of `repeat` timed passes), the
+    peak memory allocated during one call and the memory still held after
+    it, both in bytes and averaged over the calls.
+    '''
+    def run():
+        for args in inputs:
+            func(*args)
+
+    # Warm up, and enough passes over the inputs to time at least MIN_TIME
+    start = time.perf_counter()
+    run()
+    number = max(1, math.ceil(MIN_TIME / (time.perf_counter() - start)))
+    best = math.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            run()
+        best = min(best, (time.perf_counter() - start) / number)
+
+    calls = inputs[:200]
+    peak = kept = 0
+    tracemalloc.start()
+    try:
+        for args in calls:
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            func(*args)
+            current, call_peak = tracemalloc.get_traced_memory()
+            peak += call_peak - before
+            kept += current - before
+    finally:
+        tracemalloc.stop()
+    return {'us': 1e6 * best / len(inputs), 'peak_bytes': peak / len(calls), 'kept_bytes': kept / len(calls)}
+
+
+def run_cases(names, drones, repeat, seed=0):
+    results = {}
+    for name in names:
+        func, inputs = CASES[name](drones, np.random.default_rng(seed))
+        results[name] = measure(func, inputs, repeat)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    '''Prints the results next to the baseline and returns the names of the cases that got slower.'''
+    slower = []
+    print(f'{"":<52} {"us/call":>9} {"baseline":>9} {"ratio":>6} {"peak B":>8} {"kept B":>7}')
+    for name, result in results.items():
+        line = f'{name:<52} {result["us"]:9.3f}'
+        if name in baseline:
+            ratio = result['us'] / baseline[name]['us']
+            line += f' {baseline[name]["us"]:9.3f} {ratio:6.2f}'
+            if ratio > 1 + tolerance:
+                slower.append(name)
+        else:
+            line += f' {"-":>9} {"-":>6}'
+        line += f' {result["peak_bytes"]:8.0f} {result["kept_bytes"]:7.0f}'
+        print(line + ('  SLOWER' if name in slower else ''))
+    return slower
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Per-call time and allocations of the functions on the control path.')
+    parser.add_argument('-k', '--filter', default='', help='Only run the cases containing this text')
+    parser.add_argument('--drones', type=int, default=50, help='Number of simulated drones')
+    parser.add_argument('--repeat', type=int, default=5, help='Timed passes per case, the best one is kept')
+    parser.add_argument('--save', metavar='FILE', help='Save the results as a baseline')
+    parser.add_argument('--compare', metavar='FILE', help='Compare with a saved baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='Slowdown above which a case is reported as slower, 0.25 = 25%%')
+    parser.add_argument('--list', action='store_true', help='List the cases')
+    args = parser.parse_args()
+
+    names = [name for name in CASES if args.filter in name]
+    if args.list:
+        print('\n'.join(names))
+        sys.exit()
+
+    results = run_cases(names, args.drones, args.repeat)
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+    slower = compare(results, baseline, args.tolerance)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({'python': platform.python_version(), 'machine': platform.machine(),
+                       'drones': args.drones, 'results': results}, f, indent=2)
+        print(f'Baseline saved to {args.save}')
+    if slower:
+        print(f'{len(slower)} case(s) slower than the baseline by more than {100 * args.tolerance:.0f}%')
+        sys.exit(1)
@@ -0,0 +1,259 @@
+import math
+import threading
+import time
+from collections import deque
+from types import SimpleNamespace
+
+import numpy as np
+from cflib.crazyflie.log import CHAN_SETTINGS, CMD_START_LOGGING, CMD_STOP_LOGGING
+from cflib.utils.callbacks import Caller
+
+PACKET_RATE = 1000  # Packet exchanges per second on one Crazyradio channel
+QUEUE_SIZE = 20  # Packets a Crazyflie keeps for the host before it drops its log packets
+POSITION_GAIN = 2.0  # 1/s, of the simulated position controller (posCtlPid.xKp)
+MAX_SPEED = 1.0  # m/s, of the simulated position controller (posCtlPid.xVelMax)
+
+
+class SimulatedRadio:
+    '''
+    Stand-in for one Crazyradio shared by several Crazyflies on the same
+    channel, so the scripts can be run with many drones and no hardware.
+
+    The radio makes `packet_rate` exchanges per second, serving the drones
+    in turn: each exchange sends the oldest command of one drone and brings
+    back the oldest packet its firmware queued. The log blocks of the drones
+    queue a packet every period, up to `queue_size` packets, so a channel
+    that can't keep up loses log packets and delays the rest, like a real
+    one. The log callbacks run in the thread of the radio.
+    '''
+
+    def __init__(self, packet_rate=PACKET_RATE, queue_size=QUEUE_SIZE):
+        self.packet_time = 1 / packet_rate
+        self.queue_size = queue_size
+        self.drones = []
+        self.callback_time = 0.0  # CPU time spent in the log callbacks [s]
+        self.cpu_time = 0.0  # CPU time of the radio thread, callbacks included [s]
+        self._turn = 0
+        self._credit = 0.0
+        self._running = False
+        self._thread = None
+
+    def add(self, uri, model=None):
+        '''Adds a drone and returns its SyncCrazyflie stand-in.'''
+        drone = SimulatedCrazyflie(self, uri, model)
+        self.drones.append(drone)
+        return drone.scf
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _run(self):
+        last = time.monotonic()
+        while self._running:
+            now = time.monotonic()
+            # At most one turn of the drones of backlog, the radio doesn't catch up after a stall
+            self._credit = min(self._credit + (now - last) / self.packet_time, 2 * len(self.drones) + 1)
+            last = now
+            for drone in self.drones:
+                drone.produce(now)
+            exchanges = int(self._credit)
+            self._credit -= exchanges
+            for _ in range(exchanges):
+                if not self.drones:
+                    break
+                self._turn = (self._turn + 1) % len(self.drones)
+                self.drones[self._turn].exchange(time.monotonic())
+            self.cpu_time = time.thread_time()
+            time.sleep(self.packet_time)
+
+    def overhead(self):
+        '''CPU time of the simulation itself, without the log callbacks of the scripts [s].'''
+        return self.cpu_time - self.callback_time
+
+
+class SimulatedCrazyflie:
+    '''
+    One simulated drone: the host side (`cf`, `scf`) that the scripts use,
+    and the firmware side that answers the packets and produces the log
+    data from a simple point-mass model.
+
+    `model(drone, t)` can return the position at time t, for a drone
+    flying a fixed path (e.g. a leader). Otherwise the drone moves with the
+    last velocity setpoint it received, or flies to the last position
+    setpoint with a proportional position controller plus the velocity
+    feedforward of full state setpoints.
+    '''
+
+    def __init__(self, radio, uri, model=None):
+        self.radio = radio
+        self.uri = uri
+        self.model = model
+        self.blocks = {}
+        self.uplink = deque()
+        self.downlink = deque()
+        self.position = np.zeros(3)
+        self.velocity = np.zeros(3)
+        self.target = None
+        self.feedforward = np.zeros(3)
+        self.rotation_rate = np.zeros(3)  # rad/s, for the attitude log
+        self.time = None
+        self.rng = np.random.default_rng(abs(hash(uri)) % 2**32)
+
+        self.log_received = 0
+        self.log_lost = 0
+        self.log_latency = []
+        self.commands = 0
+        self.command_latency = []
+        self.params = {}
+
+        log = SimpleNamespace(add_config=self._add_config)
+        param = SimpleNamespace(set_value=self._set_param)
+        commander = SimpleNamespace(send_velocity_world_setpoint=self._velocity_setpoint,
+                                    send_position_setpoint=self._position_setpoint,
+                                    send_full_state_setpoint=self._full_state_setpoint,
+                                    send_notify_setpoint_stop=lambda remain_valid_milliseconds=0: None)
+        link_statistics = SimpleNamespace(link_quality_updated=Caller(), uplink_rssi_updated=Caller())
+        self.cf = SimpleNamespace(link_uri=uri, link=self, log=log, param=param, commander=commander,
+                                  link_statistics=link_statistics, send_packet=self._send_packet)
+        self.scf = SimpleNamespace(cf=self.cf, _link_uri=uri)
+
+    # Host side
+
+    def _add_config(self, log_conf):
+        log_conf.cf = self.cf
+        log_conf.id = len(self.blocks)
+        log_conf._added = True
+        log_conf.valid = True
+        self.blocks[log_conf.id] = SimpleNamespace(conf=log_conf, period=None, next_time=None)
+
+    def _send(self, kind, *args):
+        self.uplink.append((time.monotonic(), kind, args))
+
+    def _send_packet(self, pk, expected_reply=(), **kwargs):
+        if pk.channel == CHAN_SETTINGS and pk.data[0] in (CMD_START_LOGGING, CMD_STOP_LOGGING):
+            self._send('log', *pk.data)
+
+    def _set_param(self, name, value):
+        self._send('param', name, value)
+
+    def _velocity_setpoint(self, vx, vy, vz, yawrate):
+        self._send('velocity', vx, vy, vz)
+
+    def _position_setpoint(self, x, y, z, yaw):
+        self._send('position', x, y, z)
+
+    def _full_state_setpoint(self, pos, vel, acc, orientation, rollrate, pitchrate, yawrate):
+        self._send('position', *pos, *vel)
+
+    # Firmware side
+
+    def state(self, t):
+        '''Position and velocity of the drone at time t, which only moves forward.'''
+        if self.time is not None and t <= self.time:
+            return self.position, self.velocity
+        if self.model is not None:
+            position = np.asarray(self.model(self, t), dtype=float)
+            if self.time is not None:
+                self.velocity = (position - self.position) / (t - self.time)
+            self.position = position
+        elif self.time is not None:
+            if self.target is not None:
+                velocity = self.feedforward + POSITION_GAIN * (self.target - self.position)
+                speed = np.linalg.norm(velocity)
+                self.velocity = velocity if speed <= MAX_SPEED else velocity * MAX_SPEED / speed
+            self.position = self.position + self.velocity * (t - self.time)
+        self.time = t
+        return self.position, self.velocity
+
+    def sample(self, t):
+        '''The values of all the log variables the scripts use, at time t.'''
+        (x, y, z), (vx, vy, vz) = self.state(t)
+        ax, ay, az = self.rng.normal(0, 0.3, 3)
+        angle = np.linalg.norm(self.rotation_rate) * t
+        axis = self.rotation_rate / max(np.linalg.norm(self.rotation_rate), 1e-9)
+        qx, qy, qz = math.sin(angle / 2) * axis
+        return {'stateEstimate.x': x, 'stateEstimate.y': y, 'stateEstimate.z': z, 'stateEstimate.yaw': 0.0,
+                'stateEstimate.vx': vx, 'stateEstimate.vy': vy, 'stateEstimate.vz': vz,
+                'stateEstimate.ax': ax, 'stateEstimate.ay': ay, 'stateEstimate.az': az,
+                'stateEstimate.qw': math.cos(angle / 2), 'stateEstimate.qx': qx, 'stateEstimate.qy': qy,
+                'stateEstimate.qz': qz}
+
+    def produce(self, now):
+        '''Queues the log packets that are due, dropping them when the queue is full.'''
+        for block in self.blocks.values():
+            if block.period is None:
+                continue
+            while block.next_time <= now:
+                if len(self.downlink) < self.radio.queue_size:
+                    self.downlink.append((block.next_time, block.conf))
+                else:
+                    self.log_lost += 1
+                block.next_time += block.period
+
+    def exchange(self, now):
+        '''One radio exchange: the oldest command goes up, the oldest log packet comes down.'''
+        if self.uplink:
+            sent, kind, args = self.uplink.popleft()
+            self.commands += 1
+            self.command_latency.append(now - sent)
+            self._receive(now, kind, args)
+        if self.downlink:
+            produced, log_conf = self.downlink.popleft()
+            sample = self.sample(produced)
+            data = {variable.name: sample[variable.name] for variable in log_conf.variables}
+            self.log_received += 1
+            self.log_latency.append(now - produced)
+            start = time.thread_time()
+            log_conf.data_received_cb.call(int(produced * 1000), data, log_conf)
+            self.radio.callback_time += time.thread_time() - start
+
+    def _receive(self, now, kind, args):
+        if kind == 'log':
+            command, block_id = args[:2]
+            block = self.blocks[block_id]
+            if command == CMD_START_LOGGING:
+                block.period = args[2] / 100
+                block.next_time = now + block.period
+            else:
+                block.period = None
+        elif kind == 'param':
+            self.params[args[0]] = args[1]
+        elif kind == 'velocity':
+            self.state(now)
+            self.target = None
+            self.velocity = np.array(args, dtype=float)
+        elif kind == 'position':
+            self.state(now)
+            self.target = np.array(args[:3], dtype=float)
+            self.feedforward = np.array(args[3:6] if len(args) > 3 else (0.0, 0.0, 0.0), dtype=float)
+
+    def summary(self, duration):
+        '''Rates per second over duration, latencies in ms.'''
+        def percentile(values, q):
+            return 1e3 * float(np.percentile(values, q)) if values else float('nan')
+        return {'log_rate': self.log_received / duration, 'log_lost': self.log_lost,
+                'log_latency_p50': percentile(self.log_latency, 50),
+                'log_latency_p99': percentile(self.log_latency, 99),
+                'command_rate': self.commands / duration,
+                'command_latency_p99': percentile(self.command_latency, 99)}
+
+    def reset_stats(self):
+        self.log_received = 0
+        self.log_lost = 0
+        self.log_latency = []
+        self.commands = 0
+        self.command_latency = []
@@ -0,0 +1,67 @@
+import math
+import os
+import sys
+import timeit
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.spatial_hash import SpatialHash  # noqa: E402
+
+RADIUS = 0.5
+SPACING = 1.0  # Average distance between the drones [m]
+SWARM_SIZES = (4, 12, 40, 64, 100, 200, 300, 1000)
+
+
+def brute_force(positions, radius):
+    '''The neighbours of every drone by checking all the pairs.'''
+    neighbours = {}
+    for key, position in positions.items():
+        neighbours[key] = {other for other, other_position in positions.items()
+                           if other != key and math.dist(position, other_position) <= radius}
+    return neighbours
+
+
+def queried(hash, positions, radius):
+    '''The neighbours of every drone with one query per drone, as the followers do, updated with the new positions first.'''
+    for key, position in positions.items():
+        hash.update(key, position)
+    return {key: {other for other, _, _ in hash.neighbours(position, radius, exclude=(key,))}
+            for key, position in positions.items()}
+
+
+def batched(hash, positions, radius):
+    '''The neighbours of every drone with one neighbour_sets() call, updated with the new positions first.'''
+    for key, position in positions.items():
+        hash.update(key, position)
+    return hash.neighbour_sets(radius)
+
+
+def swarm(size, rng):
+    '''Random positions with a constant density of drones.'''
+    side = SPACING * math.sqrt(size)
+    return {f'cf{i}': tuple(p) for i, p in enumerate(rng.uniform(0, side, (size, 2)))}
+
+
+def measure(function, size):
+    number = max(1, 2000 // size)
+    return 1e3 * min(timeit.repeat(function, number=number, repeat=3)) / number
+
+
+if __name__ == '__main__':
+    rng = np.random.default_rng(0)
+    print(f'Neighbours within {RADIUS} m of every drone, one drone per {SPACING} m2, time per control tick [ms]')
+    print('         all pairs   all drones: query   batch    grid: query   batch')
+    for size in SWARM_SIZES:
+        positions = swarm(size, rng)
+        dense = SpatialHash(cell_size=RADIUS, dense_limit=size, batch_limit=size)
+        grid = SpatialHash(cell_size=RADIUS, dense_limit=0, batch_limit=0)
+        expected = brute_force(positions, RADIUS)
+        for hash in (dense, grid):
+            assert queried(hash, positions, RADIUS) == expected
+            assert batched(hash, positions, RADIUS) == expected
+        times = [measure(lambda: brute_force(positions, RADIUS), size)]
+        for hash in (dense, grid):
+            times += [measure(lambda: queried(hash, positions, RADIUS), size),
+                      measure(lambda: batched(hash, positions, RADIUS), size)]
+        print(f'{size:4d} drones {times[0]:8.3f}   {times[1]:16.3f} {times[2]:8.3f}   {times[3]:11.3f} {times[4]:8.3f}')
@@ -0,0 +1,270 @@
+import argparse
+import contextlib
+import io
+import math
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+from scripts import load_script
+from simulated_link import PACKET_RATE, SimulatedRadio
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.command_filter import Deadband  # noqa: E402
+from common.loop_rate import FixedRate  # noqa: E402
+from common.motion_prediction import AlphaBetaFilter  # noqa: E402
+from common.setpoint_stream import SetpointStream  # noqa: E402
+from common.spatial_hash import SpatialHash  # noqa: E402
+from common.time_sync import SnapshotSync  # noqa: E402
+
+SWARM_SIZES = (2, 4, 8, 16, 30)
+DURATION = 5.0  # s, measured
+WARMUP = 1.0  # s, before the measurement, for the log rates to settle
+
+# name -> setup(radio, drones) returning the control loops to run in threads and a function that stops them
+BEHAVIOURS = {}
+
+
+def behaviour(name):
+    def register(setup):
+        BEHAVIOURS[name] = setup
+        return setup
+    return register
+
+
+def uris(drones):
+    return [f'radio://0/80/2M/E7E7E7{i:04X}' for i in range(drones)]
+
+
+@behaviour('vibe_to_acceleration')
+def setup_acceleration(radio, drones):
+    vibe = load_script('Vibrate_to_Acceleration/vibe_to_acceleration.py')
+    vibe.uris = uris(drones)
+    vibe.acc_windows = np.zeros((drones, vibe.samples))
+    for uri in vibe.uris:
+        vibe.start_logging(radio.add(uri))
+    states = [vibe.drone_states[uri] for uri in vibe.uris]
+    return [lambda: vibe.batched_vibration(states)], lambda: setattr(vibe, 'execute', False)
+
+
+@behaviour('vibe_to_ang_vel')
+def setup_rotation(radio, drones):
+    vibe = load_script('Vibrate_to_Rotation/vibe_to_ang_vel.py')
+    vibe.uris = uris(drones)
+    vibe.time_windows = np.zeros((drones, vibe.samples))
+    vibe.quaternion_windows = np.zeros((drones, vibe.samples, 4))
+    vibe.gyro_windows = np.zeros((drones, vibe.samples, 3))
+    rng = np.random.default_rng(0)
+    for uri in vibe.uris:
+        scf = radio.add(uri)
+        # Handheld drones turning at up to 400 deg/s
+        radio.drones[-1].rotation_rate = np.radians(rng.uniform(-400, 400, 3) / math.sqrt(3))
+        vibe.start_logging(scf)
+    states = [vibe.drone_states[uri] for uri in vibe.uris]
+    return [lambda: vibe.batched_vibration(states)], lambda: setattr(vibe, 'execute', False)
+
+
+def leader_path(drone, t):
+    '''The circle of the leader of Leader-Follower_Drone-Drone.py.'''
+    omega = 0.5 / 0.9
+    return 0.9 * math.cos(omega * t), 0.9 * math.sin(omega * t), 0.75
+
+
+@behaviour('leader_follower')
+def setup_leader_follower(radio, drones, streaming=False):
+    '''
+    One leader and drones - 1 followers, every follower keeps its distance
+    to the leader, with velocity setpoints or, when streaming, full state
+    setpoints (SETPOINT_MODE = 'full_state').
+    '''
+    lf = load_script('Leader-Follower_Drone-Drone/Leader-Follower_Drone-Drone.py')
+    leader, *followers = uris(drones)
+    lf.sync = SnapshotSync([leader, *followers])
+    lf.SEPARATION = True  # Several followers
+    lf.neighbours = SpatialHash(cell_size=lf.SEPARATION_DISTANCE)
+    lf.states = {uri: lf.DroneState(uri) for uri in (leader, *followers)}
+    lf.log_rates = {}
+    scfs = {leader: radio.add(leader, model=leader_path)}
+    # The followers start around the leader, in the formation
+    start_x, start_y, _ = leader_path(None, time.monotonic())
+    for i, uri in enumerate(followers):
+        scfs[uri] = radio.add(uri)
+        angle = 2 * math.pi * i / len(followers)
+        r = (lf.r_min + lf.r_max) / 2
+        radio.drones[-1].position = np.array([start_x + r * math.cos(angle), start_y + r * math.sin(angle), 0.75])
+    for scf in scfs.values():
+        lf.start_position_printing(scf)
+
+    running = threading.Event()
+    running.set()
+    loop = streaming_follower if streaming else follower
+    loops = [lambda scf=scfs[uri]: loop(lf, scf, leader, running) for uri in followers]
+    return loops, running.clear
+
+
+@behaviour('leader_follower_full_state')
+def setup_streaming_leader_follower(radio, drones):
+    return setup_leader_follower(radio, drones, streaming=True)
+
+
+def follower(lf, scf, leader, running):
+    '''
+    The follower part of leader_follower() for one of many followers, with
+    world frame velocity setpoints: the pair follower-leader is taken at
+    its latest common time, not the whole swarm.
+    '''
+    uri = scf.cf.link_uri
+    send = lambda vx, vy, vz: scf.cf.commander.send_velocity_world_setpoint(vx, vy, vz, 0)  # noqa: E731
+    # Resent every 0.2 s like the MotionCommander does
+    motion = Deadband(send, deadband=lf.VELOCITY_DEADBAND, keep_alive=0.2, name=uri)
+    loop_rate = FixedRate(lf.CONTROL_RATE, uri)
+    samples = lf.sync.samples
+    while running.is_set():
+        if samples[uri] and samples[leader]:
+            common_time = min(samples[uri][-1][0], samples[leader][-1][0])
+            fx, fy = lf.sync.value_at(uri, common_time)
+            lx, ly = lf.sync.value_at(leader, common_time)
+            d = math.sqrt(pow((fx-lx), 2)+pow((fy-ly), 2))
+            if d > 0:
+                vx, vy = lf.formation_velocity(fx, fy, lx, ly, d)
+                sx, sy = lf.neighbours.separation(uri, lf.SEPARATION_DISTANCE, lf.MAX_VELOCITY, exclude=(leader,))
+                motion(vx + sx, vy + sy, 0)
+        loop_rate.sleep()
+    return loop_rate.summary()
+
+
+def streaming_follower(lf, scf, leader, running):
+    '''streaming_follower() of the Leader-Follower script for one of many followers.'''
+    uri = scf.cf.link_uri
+    stream = SetpointStream(scf.cf, mode='full_state', name=uri)
+    leader_filter = AlphaBetaFilter()
+    loop_rate = FixedRate(lf.SETPOINT_RATE, uri)
+    samples = lf.sync.samples
+    while running.is_set():
+        if samples[uri] and samples[leader]:
+            common_time = min(samples[uri][-1][0], samples[leader][-1][0])
+            fx, fy = lf.sync.value_at(uri, common_time)
+            lx, ly = lf.sync.value_at(leader, common_time)
+            d = math.sqrt(pow((fx-lx), 2)+pow((fy-ly), 2))
+            target_x, target_y = lf.formation_target(fx, fy, lx, ly, d)
+            sep_x, sep_y = lf.neighbours.separation(uri, lf.SEPARATION_DISTANCE, lf.MAX_VELOCITY, exclude=(leader,))
+            target_x += sep_x * lf.SEPARATION_DISTANCE / lf.MAX_VELOCITY
+            target_y += sep_y * lf.SEPARATION_DISTANCE / lf.MAX_VELOCITY
+            for host_time, position in list(samples[leader]):
+                if leader_filter.time is None or host_time > leader_filter.time:
+                    leader_filter.update(host_time, position)
+            stream.track((fx, fy))
+            stream.send((target_x, target_y, lf.DEFAULT_HEIGHT), (*leader_filter.velocity, 0.0))
+        loop_rate.sleep()
+    summary = loop_rate.summary()
+    summary.update(stream.summary())
+    return summary
+
+
+def run(name, drones, duration=DURATION, packet_rate=PACKET_RATE):
+    '''Runs one behaviour with drones simulated drones on one radio and returns its measurements.'''
+    radio = SimulatedRadio(packet_rate=packet_rate)
+    summaries = []
+
+    def worker(loop):
+        summaries.append(loop())
+
+    # The scripts print a line per drone, which is not what is measured
+    with radio, contextlib.redirect_stdout(io.StringIO()):
+        loops, stop = BEHAVIOURS[name](radio, drones)
+        threads = [threading.Thread(target=worker, args=(loop,), daemon=True) for loop in loops]
+        for thread in threads:
+            thread.start()
+        time.sleep(WARMUP)
+
+        for drone in radio.drones:
+            drone.reset_stats()
+        start_overhead = radio.overhead()
+        start_cpu = time.process_time()
+        time.sleep(duration)
+        cpu = time.process_time() - start_cpu - (radio.overhead() - start_overhead)
+        stop()
+        for thread in threads:
+            thread.join()
+
+    links = [drone.summary(duration) for drone in radio.drones]
+    received = sum(drone.log_received for drone in radio.drones)
+    lost = sum(drone.log_lost for drone in radio.drones)
+    periods = [block.period for drone in radio.drones for block in drone.blocks.values() if block.period]
+    return {'drones': drones,
+            'log_rate': np.mean([link['log_rate'] for link in links]),
+            'log_period': 1000 * np.mean(periods) if periods else float('nan'),
+            'log_lost': lost / (received + lost) if received + lost else 0.0,
+            'log_latency_p50': np.nanmedian([link['log_latency_p50'] for link in links]),
+            'log_latency_p99': np.nanmax([link['log_latency_p99'] for link in links]),
+            'command_rate': np.mean([link['command_rate'] for link in links]),
+            'command_latency_p99': np.nanmax([link['command_latency_p99'] for link in links]),
+            'loop_rate': np.mean([summary['rate'] for summary in summaries]),
+            'loop_target': summaries[0]['target'],
+            'late_p99': max(summary['late_p99'] for summary in summaries),
+            'tracking_p95': max(summary.get('error_p95', float('nan')) for summary in summaries),
+            'cpu': cpu / duration}
+
+
+def print_curve(name, results):
+    print(f'\n{name}')
+    print(f'{"drones":>6} {"log Hz":>7} {"period":>7} {"lost":>6} {"lat p50":>8} {"lat p99":>8} '
+          f'{"cmd Hz":>7} {"cmd p99":>8} {"loop Hz":>8} {"late p99":>9} {"CPU":>6} {"track p95":>9}')
+    for r in results:
+        tracking = f'{100 * r["tracking_p95"]:7.1f}cm' if not math.isnan(r['tracking_p95']) else f'{"-":>9}'
+        print(f'{r["drones"]:6d} {r["log_rate"]:7.1f} {r["log_period"]:5.0f}ms {100 * r["log_lost"]:5.1f}% '
+              f'{r["log_latency_p50"]:6.1f}ms {r["log_latency_p99"]:6.1f}ms {r["command_rate"]:7.1f} '
+              f'{r["command_latency_p99"]:6.1f}ms {r["loop_rate"]:8.1f} {r["late_p99"]:7.2f}ms '
+              f'{100 * r["cpu"]:5.1f}% {tracking}')
+
+
+def plot_curves(curves, path):
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    panels = [('log_rate', 'Log rate per drone [Hz]'), ('log_latency_p99', 'Log latency p99 [ms]'),
+              ('loop_rate', 'Control loop rate [Hz]'), ('cpu', 'CPU [share of one core]')]
+    fig, axes = plt.subplots(2, 2, figsize=(10, 7))
+    for ax, (key, label) in zip(axes.flat, panels):
+        for name, results in curves.items():
+            ax.plot([r['drones'] for r in results], [r[key] for r in results], marker='o', label=name)
+        ax.set_xlabel('Drones on one radio')
+        ax.set_ylabel(label)
+        ax.grid()
+    axes.flat[0].legend()
+    fig.tight_layout()
+    fig.savefig(path)
+    print(f'\nScaling curves saved to {path}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Runs the behaviours with more and more simulated drones on one '
+                                                 'radio and measures how the links and the control loops keep up.')
+    parser.add_argument('-b', '--behaviour', action='append', choices=sorted(BEHAVIOURS),
+                        help='behaviour to run, can be repeated (default: all)')
+    parser.add_argument('--drones', type=int, nargs='+', default=SWARM_SIZES, help='swarm sizes')
+    parser.add_argument('--duration', type=float, default=DURATION, help='measured time per run [s]')
+    parser.add_argument('--packet-rate', type=int, default=PACKET_RATE,
+                        help='packet exchanges per second of the simulated radio')
+    parser.add_argument('--plot', metavar='FILE', help='save the scaling curves to an image')
+    args = parser.parse_args()
+
+    print(f'Simulated radio: {args.packet_rate} packets/s shared by all the drones, {args.duration:.0f} s per run')
+    print('log Hz: log packets received per drone, period: log period at the end (adaptive), '
+          'lat: log latency, cmd: commands per drone and their latency, late: control loop lateness, '
+          'CPU: log callbacks and control loops, without the simulation, '
+          'track: distance between the streamed setpoints and the drones')
+    curves = {}
+    for name in args.behaviour or BEHAVIOURS:
+        curves[name] = [run(name, drones, args.duration, args.packet_rate) for drones in args.drones]
+        print_curve(name, curves[name])
+    if args.plot:
+        plot_curves(curves, args.plot)
+
+
+if __name__ == '__main__':
+    main()
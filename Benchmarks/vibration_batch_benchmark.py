@@ -0,0 +1,102 @@
+import time
+
+import numpy as np
+from scipy.spatial.transform import Rotation
+
+from microbenchmarks import fake_scf
+from scripts import load_script
+
+SWARM_SIZES = (4, 8, 16, 30)
+TICKS = 200
+
+
+def acceleration_swarm(vibe, size, rng):
+    '''Drones with a random number of samples in their ring buffers, which are rows of vibe.acc_windows.'''
+    vibe.uris = [f'radio://0/80/2M/E7E7E7E7{i:02X}' for i in range(size)]
+    vibe.acc_windows = np.zeros((size, vibe.samples))
+    states = []
+    for row, uri in enumerate(vibe.uris):
+        state = vibe.DroneState(uri, vibe.acc_windows[row])
+        for acc in rng.normal(0, 0.3, (rng.integers(1, 3 * vibe.samples), 3)):
+            vibe.acceleration_callback(state, dict(zip(('stateEstimate.ax', 'stateEstimate.ay', 'stateEstimate.az'),
+                                                       acc)))
+        state.motor = vibe.motor_command(fake_scf(uri))
+        states.append(state)
+    return states
+
+
+def rotation_swarm(vibe, size, rng):
+    '''Drones turning around random axes, with a random number of samples in their ring buffers.'''
+    vibe.uris = [f'radio://0/80/2M/E7E7E7E7{i:02X}' for i in range(size)]
+    vibe.time_windows = np.zeros((size, vibe.samples))
+    vibe.quaternion_windows = np.zeros((size, vibe.samples, 4))
+    states = []
+    for row, uri in enumerate(vibe.uris):
+        state = vibe.DroneState(uri, vibe.time_windows[row], vibe.quaternion_windows[row])
+        axis = rng.normal(size=3)
+        rate = np.radians(rng.uniform(0, 500)) * axis / np.linalg.norm(axis)
+        for i in range(rng.integers(1, 3 * vibe.samples)):
+            t = i * vibe.log_period / 1000
+            qx, qy, qz, qw = Rotation.from_rotvec(rate * t).as_quat()
+            vibe.attitude_callback(state, t * 1000, {'stateEstimate.qw': qw, 'stateEstimate.qx': qx,
+                                                     'stateEstimate.qy': qy, 'stateEstimate.qz': qz})
+        state.motor = vibe.motor_command(fake_scf(uri))
+        states.append(state)
+    return states
+
+
+def cpu_per_tick(tick):
+    '''CPU time of one tick of a vibration loop [ms], the best of 3 runs of TICKS ticks.'''
+    best = float('inf')
+    for _ in range(3):
+        start = time.process_time()
+        for _ in range(TICKS):
+            tick()
+        best = min(best, time.process_time() - start)
+    return 1e3 * best / TICKS
+
+
+def compare(name, vibe, make_swarm, per_drone, batched_powers, rng):
+    print(name)
+    for size in SWARM_SIZES:
+        states = make_swarm(vibe, size, rng)
+        rows = np.arange(size)
+        expected = per_drone_powers(vibe, states, per_drone)
+        assert np.abs(batched_powers(vibe, states) - expected).max() <= 1, 'batched powers differ'
+        scfs = [fake_scf(state.uri) for state in states]
+        before = cpu_per_tick(lambda: [per_drone(scf, state) for scf, state in zip(scfs, states)])
+        after = cpu_per_tick(lambda: vibe.coordinator_tick(states, rows))
+        print(f'{size:4d} drones   per drone {before:7.3f} ms   batched {after:7.3f} ms   ({before / after:.1f}x)')
+
+
+def per_drone_powers(vibe, states, per_drone):
+    '''The powers the per-drone loops send, read back from their Deadband.'''
+    powers = []
+    for state in states:
+        state.motor.reset()
+        per_drone(fake_scf(state.uri), state)
+        powers.append(state.motor.last[0])
+        state.motor.reset()
+    return powers
+
+
+def acceleration_powers(vibe, states):
+    counts = np.array([state.count for state in states])
+    return vibe.batch_powers(vibe.acc_windows, counts)[0]
+
+
+def rotation_powers(vibe, states):
+    indices = np.array([state.index for state in states])
+    counts = np.array([state.count for state in states])
+    return vibe.batch_power_profile(vibe.batch_angular_velocities(vibe.time_windows, vibe.quaternion_windows,
+                                                                  indices, counts))
+
+
+if __name__ == '__main__':
+    rng = np.random.default_rng(0)
+    print('CPU time of one vibration tick for the whole swarm, per-drone loops against one batched coordinator')
+    acceleration = load_script('Vibrate_to_Acceleration/vibe_to_acceleration.py')
+    compare('vibe_to_acceleration', acceleration, acceleration_swarm, acceleration.power_calculator,
+            acceleration_powers, rng)
+    rotation = load_script('Vibrate_to_Rotation/vibe_to_ang_vel.py')
+    compare('vibe_to_ang_vel', rotation, rotation_swarm, rotation.power_distribution, rotation_powers, rng)
@@ -1,5 +1,7 @@
 import math
+import os
 import random
+import sys
 import time
 
 import matplotlib.pyplot as plt
@@ -12,6 +14,10 @@ from cflib.crazyflie.swarm import CachedCfFactory
 from cflib.crazyflie.syncCrazyflie import SyncCrazyflie
 from cflib.utils import uri_helper
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.loop_rate import FixedRate  # noqa: E402
+from common.shutdown import MotorShutdown  # noqa: E402
+
 URI = uri_helper.uri_from_env(default='radio://0/80/2M/E7E7E7E7E7')
 
 # Crazyflie's position
@@ -23,6 +29,7 @@ radius = 5  # Vibrations start when d <= radius
 min_power = 1000  # Minimum motor power
 max_power = 50000  # Maximum motor power
 CURVE_TYPE = 1  # 1 for Linear and 2 for Exponential
+LOOP_RATE = 10  # Hz
 Space_limits_x = (-2.8, 2.6)
 Space_limits_y = (-3.0, 0.6)
 Space_limits_z = (0.2, 1.8)
@@ -37,6 +44,14 @@ def random_3d_point():
     return (x, y, z)
 
 
+def new_target():
+    '''Picks a new random target, out of radius until the first position arrives.'''
+    global x2, y2, z2, d
+    x2, y2, z2 = random_3d_point()
+    d = math.inf
+    print(f'The target is at:[{x2:.3f}, {y2:.3f}, {z2:.3f}]')
+
+
 def position_callback(timestamp, data, logconf):
     global d
     x1.append(data['stateEstimate.x'])
@@ -56,7 +71,7 @@ def start_position_printing(scf):
     log_conf.start()
 
 
-def power_distribution(pow):
+def power_distribution(scf, pow):
     '''
     Here, we can choose how to power each motor: either
     apply the same power to all motors simultaneously, or
@@ -78,30 +93,43 @@ def power_calculator(dist):
     return power
 
 
+def hunt_step(scf):
+    '''One loop of the hunt, returns True once the target is found.'''
+    if d <= radius:
+        power = power_calculator(d)
+        power_distribution(scf, power)
+        pow_percentage = int((power-min_power)*100/max_power)
+        print(f'Distance from target:{d:.3f}, Motor power:{pow_percentage}%')
+        if pow_percentage >= 90: #  Could replace this with a distance expression
+            scf.cf.param.set_value('sound.effect', '7')
+            time.sleep(0.5)
+            return True
+    else:
+        power_distribution(scf, 0)
+        print('Out of radius. Move closer to the target')
+    return False
+
+
 def vibration(scf):
     scf.cf.param.set_value('motorPowerSet.enable', '1')
     time.sleep(1)
     global Stop
+    loop_rate = FixedRate(LOOP_RATE, 'Vibration')
     while Stop is False:
-        if d <= radius:
-            power = power_calculator(d)
-            power_distribution(power)
-            pow_percentage = int((power-min_power)*100/max_power)
-            print(f'Distance from target:{d:.3f}, Motor power:{pow_percentage}%')
-            time.sleep(0.1)
-            if pow_percentage >= 90: #  Could replace this with a distance expression
-                scf.cf.param.set_value('sound.effect', '7')
-                Stop = True
-                time.sleep(0.5)
-        else:
-            power_distribution(0)
-            print('Out of radius. Move closer to the target')
-            time.sleep(0.1)
-
-    power_distribution(0)
-    time.sleep(1)
-    scf.cf.param.set_value('motorPowerSet.enable', '0')
-    time.sleep(1)
+        if hunt_step(scf):
+            Stop = True
+        loop_rate.sleep()
+
+    stop_motors(scf)
+    if loop_rate.ticks:
+        print(loop_rate)
+
+
+def stop_motors(scf):
+    '''Zero power to the motors, then motorPowerSet disabled, as soon as the Crazyflie confirms them.'''
+    shutdown = MotorShutdown([scf])
+    shutdown.run()
+    print(shutdown)
 
 
 def simple_plot():
@@ -124,8 +152,7 @@ if __name__ == '__main__':
     factory = CachedCfFactory(rw_cache='./cache')
     simple_plot()
 
-    x2, y2, z2 = random_3d_point()
-    print(f'The target is at:[{x2:.3f}, {y2:.3f}, {z2:.3f}]')
+    new_target()
 
     with SyncCrazyflie(URI, cf=Crazyflie(rw_cache='./cache')) as scf:
         start_position_printing(scf)
@@ -135,4 +162,4 @@ if __name__ == '__main__':
         except KeyboardInterrupt:
             print("\n=== STOPPING ALL MOTORS ===")
             Stop = True
-            vibration(scf)
+            stop_motors(scf)
@@ -1,3 +1,5 @@
+import os
+import sys
 import time
 
 import matplotlib.pyplot as plt
@@ -10,23 +12,27 @@ from cflib.crazyflie.swarm import CachedCfFactory
 from cflib.crazyflie.syncCrazyflie import SyncCrazyflie
 from cflib.utils import uri_helper
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.event_detector import free_fall_detector, save_session  # noqa: E402
+
 Uri = uri_helper.uri_from_env(default='radio://0/80/2M/E7E7E7E7E7')
 
 acc_z = []
-TimePer = 100  # ms
+acc_t = []
+TimePer = 10  # ms
+SESSION_FILE = 'drop_session.npz'  # Replay it with Benchmarks/event_detector_benchmark.py
+detector = free_fall_detector()
 Takeoff = False
-Executing = False
 
 
 def acceleration_callback(timestamp, data, logconf):
-    global Executing, Takeoff
+    global Takeoff
 
     acc_z.append(data['acc.z'])
+    acc_t.append(timestamp / 1000)
 
-    if Executing is False:
-        if acc_z[-1] < 0.1:
-            Takeoff = True
-            Executing = True
+    if detector.update(acc_t[-1], data):
+        Takeoff = True
 
 
 def start_acceleration_printing(scf):
@@ -77,4 +83,5 @@ if __name__ == '__main__':
         time.sleep(0.5)
         scf.close_link()
         time.sleep(0.5)
+        save_session(SESSION_FILE, acc_t, {'acc.z': acc_z})
         plot_acc(acc_z)
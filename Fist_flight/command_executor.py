@@ -0,0 +1,131 @@
+import queue
+import time
+
+# Unit vector of every move in the body frame of the flying Crazyflie
+DIRECTIONS = {
+    'forward': (1, 0, 0),
+    'back': (-1, 0, 0),
+    'left': (0, 1, 0),
+    'right': (0, -1, 0),
+    'up': (0, 0, 1),
+    'down': (0, 0, -1),
+}
+
+
+class CommandExecutor:
+    '''
+    Runs the gestures as non-blocking moves. Every move is a velocity
+    setpoint stream started with start_linear_motion() and stopped once the
+    move distance has been covered, so new gestures can be submitted while
+    the Crazyflie is moving:
+    - the same gesture again merges with the current move and extends it,
+    - a different gesture preempts the current move and starts right away.
+
+    Only the take off and the final landing are blocking. The gestures
+    detected during the take off are dropped, as the user can't see them
+    executed yet.
+    '''
+
+    def __init__(self, mc, height, distance=0.4, velocity=1.0, rate=50, on_idle=None):
+        self.mc = mc
+        self.height = height  # Callable returning the current height of the flying Crazyflie
+        self.distance = distance
+        self.velocity = velocity
+        self.period = 1 / rate
+        self.on_idle = on_idle
+        self.commands = queue.Queue()
+        self.current = None
+        self.end_time = 0
+        self.executed = 0
+        self.merged = 0
+        self.preempted = 0
+        self.dropped = 0
+        self.start_time = None
+        self.flight_time = 0
+        self.terminate = False
+
+    def submit(self, gesture):
+        '''Thread safe, can be called from the log callbacks.'''
+        self.commands.put(gesture)
+
+    def run(self):
+        '''Processes the queue until the Crazyflie has landed.'''
+        while self.step(self.period):
+            pass
+
+    def step(self, timeout=0):
+        '''
+        Executes the next gesture, waiting up to timeout seconds for one, and
+        stops the current move once it is over. Returns False once the
+        Crazyflie has landed. Called by run(), or from another loop.
+        '''
+        try:
+            gesture = self.commands.get(timeout=timeout)
+        except queue.Empty:
+            gesture = None
+
+        if gesture is not None:
+            if self.start_time is None and gesture == 'up':
+                self.start_time = time.time()
+            self.execute(gesture)
+
+        if self.current is not None and time.time() >= self.end_time:
+            self.mc.stop()
+            self.current = None
+            if self.on_idle is not None and self.commands.empty():
+                self.on_idle()
+
+        if self.terminate and self.start_time is not None:
+            self.flight_time = time.time() - self.start_time
+        return not self.terminate
+
+    def execute(self, gesture):
+        if not self.mc._is_flying:
+            if gesture == 'up':
+                print('Taking off')
+                self.mc.take_off(2*self.distance)
+                self.executed += 1
+                self.flush()
+                if self.on_idle is not None:
+                    self.on_idle()
+            return
+
+        if gesture == 'down' and self.height() < self.distance:
+            print('Landing')
+            self.current = None
+            self.mc.land()
+            self.executed += 1
+            self.terminate = True
+            return
+
+        move_time = self.distance / self.velocity
+        if gesture == self.current:
+            print(f'Going {gesture} (merged)')
+            self.end_time += move_time
+            self.merged += 1
+        else:
+            if self.current is not None:
+                print(f'Going {gesture} (preempts {self.current})')
+                self.preempted += 1
+            else:
+                print(f'Going {gesture}')
+            self.current = gesture
+            self.end_time = time.time() + move_time
+            vx, vy, vz = (self.velocity * v for v in DIRECTIONS[gesture])
+            self.mc.start_linear_motion(vx, vy, vz)
+        self.executed += 1
+
+    def flush(self):
+        '''Drops the gestures queued so far.'''
+        while True:
+            try:
+                self.commands.get_nowait()
+            except queue.Empty:
+                return
+            self.dropped += 1
+
+    def report(self):
+        if self.flight_time > 0:
+            rate = 60 * self.executed / self.flight_time
+            print(f'Gestures executed: {self.executed} in {self.flight_time:.1f} s ({rate:.1f} per minute), '
+                  f'merged: {self.merged}, preempted: {self.preempted}, dropped during take off: {self.dropped}')
@@ -11,6 +11,9 @@ from cflib.crazyflie.syncCrazyflie import SyncCrazyflie
 from cflib.positioning.motion_commander import MotionCommander
 from cflib.utils import uri_helper
 
+from command_executor import CommandExecutor
+from gesture_detector import GestureDetector, save_session
+
 Uri_sensor = uri_helper.uri_from_env(default='radio://0/80/2M/E7E7E7E7E7')
 Uri_drone = uri_helper.uri_from_env(default='radio://0/80/2M/E7E7E7E7E8')
 
@@ -18,17 +21,14 @@ Uri_drone = uri_helper.uri_from_env(default='radio://0/80/2M/E7E7E7E7E8')
 acc_x = []
 acc_y = []
 acc_z = []
+acc_t = []
 z = []
-TimePer = 100  # ms  How fast we log data.
+detections = []
+TimePer = 10  # ms  How fast we log data.
 acc_threshold = 2.0  # Gs
-GoForward = False
-GoBack = False
-GoLeft = False
-GoRight = False
-GoUp = False
-GoDown = False
-Terminate = False
-Executing = False
+SESSION_FILE = 'fist_flight_session.npz'  # Replay it with Benchmarks/gesture_benchmark.py
+detector = GestureDetector(threshold=acc_threshold)
+executor = None
 
 
 def position_callback(timestamp, data, logconf):
@@ -44,38 +44,17 @@ def start_position_printing(scf):
 
 
 def acceleration_callback(timestamp, data, logconf):
-    global GoForward, GoBack
-    global GoLeft, GoRight
-    global GoUp, GoDown
-    global Executing
-
     acc_x.append(data['acc.x'])
     acc_y.append(data['acc.y'])
     acc_z.append(data['acc.z']-1)
+    acc_t.append(timestamp / 1000)
+
+    gesture = detector.update(acc_t[-1], (acc_x[-1], acc_y[-1], acc_z[-1]))
 
-    last_values = {'acc_x': acc_x[-1], 'acc_y': acc_y[-1], 'acc_z': acc_z[-1]}
-    max_magnitude = max(last_values, key=lambda k: abs(last_values[k]))
-    max_acc = last_values[max_magnitude]
-
-    if Executing is False:
-        if abs(max_acc) > acc_threshold:
-            Executing = True
-
-            if max_magnitude == 'acc_x':
-                if max_acc > 0:
-                    GoForward = True
-                elif max_acc < 0:
-                    GoBack = True
-            elif max_magnitude == 'acc_y':
-                if max_acc > 0:
-                    GoLeft = True
-                elif max_acc < 0:
-                    GoRight = True
-            elif max_magnitude == 'acc_z':
-                if max_acc > 0:
-                    GoUp = True
-                elif max_acc < 0:
-                    GoDown = True
+    # Gestures are queued even while a move is executed
+    if gesture is not None and executor is not None:
+        detections.append((acc_t[-1], gesture))
+        executor.submit(gesture)
 
 
 def start_acceleration_printing(scf):
@@ -88,95 +67,11 @@ def start_acceleration_printing(scf):
     log_conf.start()
 
 
-def flight_commands(mc, scf):
-    global GoForward, GoBack
-    global GoLeft, GoRight
-    global GoUp, GoDown
-    global Executing, Terminate
-    timeTest = 0.2
-    distance = 0.4
+def flight_commands(executor, scf):
     print('Flight!')
-    scf_s.cf.param.set_value('sound.effect', '7')
-
-    while Terminate is False:
-
-        if not mc._is_flying and not GoUp:
-            Executing = False
-            GoForward = False
-            GoBack = False
-            GoLeft = False
-            GoRight = False
-            GoDown = False
-            time.sleep(0.001)
-            continue
-
-        if GoUp is True:
-            if mc._is_flying is False:
-                print('Taking off')
-                mc.take_off(2*distance)
-            elif mc._is_flying is True:
-                print('Going up')
-                mc.up(distance, 1)
-            GoUp = False
-            time.sleep(timeTest)
-            print('Go')
-            scf.cf.param.set_value('sound.effect', '7')
-            Executing = False
-
-        if GoDown is True:
-            if z[-1] < distance:
-                print('Landing')
-                mc.land()
-                GoDown = False
-                time.sleep(timeTest)
-                Executing = False
-                Terminate = True
-            else:
-                print('Going down')
-                mc.down(distance, 1)
-                GoDown = False
-                time.sleep(timeTest)
-                Executing = False
-                print('Go')
-                scf.cf.param.set_value('sound.effect', '7')
-
-        if GoForward is True:
-            print('Going forward')
-            mc.forward(distance, 1)
-            GoForward = False
-            time.sleep(timeTest)
-            Executing = False
-            print('Go')
-            scf.cf.param.set_value('sound.effect', '7')
-
-        if GoBack is True:
-            print('Going back')
-            mc.back(distance, 1)
-            GoBack = False
-            time.sleep(timeTest)
-            Executing = False
-            print('Go')
-            scf.cf.param.set_value('sound.effect', '7')
-
-        if GoLeft is True:
-            print('Going left')
-            mc.left(distance, 1)
-            GoLeft = False
-            time.sleep(timeTest)
-            Executing = False
-            print('Go')
-            scf.cf.param.set_value('sound.effect', '7')
-
-        if GoRight is True:
-            print('Going right')
-            mc.right(distance, 1)
-            GoRight = False
-            time.sleep(timeTest)
-            Executing = False
-            print('Go')
-            scf.cf.param.set_value('sound.effect', '7')
-
-        time.sleep(0.001)
+    scf.cf.param.set_value('sound.effect', '7')
+    executor.run()
+    executor.report()
 
 
 def plot_three_acc(list1, list2, list3):
@@ -203,17 +98,20 @@ if __name__ == '__main__':
     with SyncCrazyflie(Uri_sensor, cf=Crazyflie(rw_cache='./cache')) as scf_s:
         with SyncCrazyflie(Uri_drone, cf=Crazyflie(rw_cache='./cache')) as scf_d:
             mc = MotionCommander(scf_d)
+            executor = CommandExecutor(mc, lambda: z[-1],
+                                       on_idle=lambda: scf_s.cf.param.set_value('sound.effect', '7'))
             scf_d.cf.platform.send_arming_request(True)
             time.sleep(0.5)
             start_acceleration_printing(scf_s)
             start_position_printing(scf_d)
             print('Ready?...')
             time.sleep(1)
-            flight_commands(mc, scf_s)
+            flight_commands(executor, scf_s)
             time.sleep(0.5)
             scf_d.cf.platform.send_arming_request(False)
             time.sleep(0.5)
             scf_s.close_link()
             scf_d.close_link()
             time.sleep(0.5)
+            save_session(SESSION_FILE, acc_t, acc_x, acc_y, acc_z, detections)
             plot_three_acc(acc_x, acc_y, acc_z)
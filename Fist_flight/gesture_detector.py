@@ -0,0 +1,102 @@
+import numpy as np
+
+# Gesture name for each (axis, sign) pair
+GESTURES = {
+    (0, 1): 'forward',
+    (0, -1): 'back',
+    (1, 1): 'left',
+    (1, -1): 'right',
+    (2, 1): 'up',
+    (2, -1): 'down',
+}
+
+
+class GestureDetector:
+    '''
+    Streaming punch detector. The last `window` acceleration samples are
+    kept in a fixed ring buffer and every new sample updates three features
+    of that window: the peak per axis, the energy per axis and the dominant
+    axis (the one holding most of the energy).
+
+    A gesture is detected when the dominant axis stays above `threshold`
+    for `min_samples` samples in a row, so single noisy spikes are ignored.
+    The direction is taken from the first sample above the threshold, which
+    is the punch itself and not the opposite peak when the hand stops.
+    After a detection the buffer is cleared and nothing is detected for
+    `refractory` seconds.
+    '''
+
+    def __init__(self, window=10, threshold=2.0, min_samples=2, dominance=0.5, refractory=0.4):
+        self.window = window
+        self.threshold = threshold
+        self.min_samples = min_samples
+        self.dominance = dominance
+        self.refractory = refractory
+        self.buffer = np.zeros((window, 3))
+        self.index = 0
+        self.last_detection = -np.inf
+
+    def reset(self):
+        self.buffer[:] = 0
+        self.index = 0
+
+    def features(self):
+        '''
+        Returns the peak and energy of every axis and the dominant axis
+        of the current window.
+        '''
+        peak = np.max(np.abs(self.buffer), axis=0)
+        energy = np.sum(self.buffer**2, axis=0)
+        return peak, energy, int(np.argmax(energy))
+
+    def update(self, timestamp, acc):
+        '''
+        Adds one sample (timestamp in seconds, [x, y, z] in Gs) and returns
+        the name of the detected gesture, or None.
+        '''
+        self.buffer[self.index % self.window] = acc
+        self.index += 1
+
+        if timestamp - self.last_detection < self.refractory:
+            return None
+        if self.index < self.min_samples:
+            return None
+
+        peak, energy, axis = self.features()
+        if peak[axis] < self.threshold or energy[axis] < self.dominance * np.sum(energy):
+            return None
+
+        # Samples of the dominant axis, oldest first
+        order = np.arange(self.index - min(self.index, self.window), self.index) % self.window
+        values = self.buffer[order, axis]
+        above = np.abs(values) >= self.threshold
+        if not np.all(above[-self.min_samples:]):
+            return None
+
+        first = values[np.argmax(above)]
+        self.last_detection = timestamp
+        self.reset()
+        return GESTURES[(axis, int(np.sign(first)))]
+
+
+def single_sample_detector(acc, threshold=2.0):
+    '''
+    The original rule of fist_flight.py: the axis with the largest
+    magnitude in one sample decides the gesture.
+    '''
+    axis = int(np.argmax(np.abs(acc)))
+    if abs(acc[axis]) > threshold:
+        return GESTURES[(axis, int(np.sign(acc[axis])))]
+    return None
+
+
+def save_session(file_name, timestamps, acc_x, acc_y, acc_z, detections):
+    '''
+    Stores a flight session so it can be replayed with Benchmarks/gesture_benchmark.py.
+    `detections` is a list of (timestamp, gesture) pairs.
+    '''
+    np.savez(file_name,
+             timestamps=np.asarray(timestamps),
+             acc=np.column_stack([acc_x, acc_y, acc_z]),
+             detection_times=np.array([t for t, _ in detections]),
+             detection_gestures=np.array([g for _, g in detections]))
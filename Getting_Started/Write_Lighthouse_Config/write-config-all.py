@@ -1,4 +1,5 @@
 import sys
+import threading
 import time
 
 import cflib.crtp
@@ -19,12 +20,24 @@ uris = [
 ]
 
 
-def write_one(file_name, scf):
+def write_one(file_name, scf, timeout=10):
     print(f'Writing to \033[92m{uri}\033[97m...', end='', flush=True)
+    start = time.perf_counter()
+    stored = threading.Event()
+    result = []
+
+    def data_stored(success):
+        result.append(success)
+        stored.set()
+
+    # The writer calls back once the data is stored on the Crazyflie
     writer = LighthouseConfigWriter(scf.cf)
-    writer.write_and_store_config_from_file(None, file_name)
-    print('Success!')
-    time.sleep(1)
+    writer.write_and_store_config_from_file(data_stored, file_name)
+    if not stored.wait(timeout):
+        raise Exception('Timed out while writing the configuration')
+    if not result[0]:
+        raise Exception('The Crazyflie could not store the configuration')
+    print(f'Success! ({time.perf_counter() - start:.2f} s)')
 
 
 if __name__ == '__main__':
@@ -37,13 +50,12 @@ if __name__ == '__main__':
     for uri in uris:
         try:
             Drone = uri_helper.uri_from_env(default=uri)
+            start = time.perf_counter()
             with SyncCrazyflie(Drone, cf=Crazyflie(rw_cache='./cache')) as scf:
-                print(f'\033[92m{uri} \033[97mFully connected: {scf.is_params_updated()}. ', end='', flush=True)
-                while scf.is_params_updated() is False:
-                    print('.', end='', flush=True)
-                    time.sleep(0.1)
-                print(f'Fully connected: {scf.is_params_updated()}')
-                time.sleep(0.5)
+                print(f'\033[92m{uri} \033[97mConnected in {time.perf_counter() - start:.2f} s. ', end='', flush=True)
+                # Returns as soon as all the parameters are downloaded
+                scf.wait_for_params()
+                print(f'Fully connected in {time.perf_counter() - start:.2f} s')
                 write_one(file_name, scf)
                 ps = PowerSwitch(Drone)
                 ps.platform_power_down()
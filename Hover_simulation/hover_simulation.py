@@ -1,6 +1,9 @@
+import os
+import sys
 import time
 
 import matplotlib.pyplot as plt
+import numpy as np
 
 import cflib
 from cflib.crazyflie import Crazyflie
@@ -9,6 +12,9 @@ from cflib.crazyflie.swarm import CachedCfFactory
 from cflib.crazyflie.syncCrazyflie import SyncCrazyflie
 from cflib.utils import uri_helper
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.loop_rate import FixedRate  # noqa: E402
+
 URI = uri_helper.uri_from_env(default='radio://0/80/2M/E7E7E7E7E7')
 
 # Crazyflie's attitude
@@ -19,6 +25,18 @@ min_power = 1000  # Minimum motor power
 max_power = 30000  # Maximum motor power. Warning: Avoid setting this above 30000
 min_angle = 0   # The Crazyflie hovers while: min_angle < roll,pitch < max_angle
 max_angle = 30
+LOG_PERIOD = 10  # ms  How fast we log the attitude.
+LOOP_RATE = 50  # Hz  How fast we update the motors.
+PRINT_EVERY = 10  # Refresh the motor drawing every N loops
+
+# Each column is one half of the response: [pitch < 0, pitch > 0, roll < 0, roll > 0]
+# Each row is one motor: [m1, m2, m3, m4]
+MIXER = np.array([
+    [1, 0, 0, 1],
+    [0, 1, 0, 1],
+    [0, 1, 1, 0],
+    [1, 0, 1, 0],
+])
 
 
 def attitude_callback(timestamp, data, logconf):
@@ -27,7 +45,7 @@ def attitude_callback(timestamp, data, logconf):
 
 
 def start_position_printing(scf):
-    log_conf = LogConfig(name='Attitude', period_in_ms=100)
+    log_conf = LogConfig(name='Attitude', period_in_ms=LOG_PERIOD)
     log_conf.add_variable('stateEstimate.roll', 'float')
     log_conf.add_variable('stateEstimate.pitch', 'float')
     scf.cf.log.add_config(log_conf)
@@ -35,39 +53,29 @@ def start_position_printing(scf):
     log_conf.start()
 
 
-def power_profile(angle):
-    if abs(angle) > max_angle:
-        power = int(max_power)
-    else:
-        power = int((min_power*max_angle + (max_power-min_power)*abs(angle))/(max_angle-min_angle))
-    return power
-
-
-def power_distribution():
-    m1_p = 0
-    m2_p = 0
-    m3_p = 0
-    m4_p = 0
-    m1_r = 0
-    m2_r = 0
-    m3_r = 0
-    m4_r = 0
-    if pitch[-1] < 0:
-        m1_p = power_profile(pitch[-1])
-        m4_p = power_profile(pitch[-1])
-    elif pitch[-1] > 0:
-        m2_p = power_profile(pitch[-1])
-        m3_p = power_profile(pitch[-1])
-    if roll[-1] < 0:
-        m3_r = power_profile(roll[-1])
-        m4_r = power_profile(roll[-1])
-    elif roll[-1] > 0:
-        m1_r = power_profile(roll[-1])
-        m2_r = power_profile(roll[-1])
-    m1 = min(m1_p + m1_r, max_power)
-    m2 = min(m2_p + m2_r, max_power)
-    m3 = min(m3_p + m3_r, max_power)
-    m4 = min(m4_p + m4_r, max_power)
+def power_profile(angles):
+    '''
+    Works on a single angle or an array of angles. The response rises
+    linearly from min_power to max_power and is clipped at max_power.
+    '''
+    angles = np.abs(angles)
+    power = (min_power*max_angle + (max_power-min_power)*angles)/(max_angle-min_angle)
+    return np.minimum(power, max_power)
+
+
+def motor_powers(roll_angle, pitch_angle):
+    '''
+    Returns the power of [m1, m2, m3, m4] for the given attitude.
+    Only the side of the drone that is tilted down gets a response,
+    and the mixing matrix routes it to the motors on that side.
+    '''
+    angles = np.array([pitch_angle, pitch_angle, roll_angle, roll_angle])
+    active = np.array([pitch_angle < 0, pitch_angle > 0, roll_angle < 0, roll_angle > 0])
+    response = power_profile(angles).astype(int) * active
+    return np.minimum(MIXER @ response, max_power)
+
+
+def print_motors(m1, m2, m3, m4):
     print('\n' * 50)  # Clear screen
     print(f'[{m4:^5}]    [{m1:^5}]')
     print(r'      \   /    ')
@@ -75,6 +83,12 @@ def power_distribution():
     print(r'       / \     ')
     print(r'      /   \    ')
     print(f'[{m3:^5}]    [{m2:^5}]')
+
+
+def power_distribution(scf, loop_count=0):
+    m1, m2, m3, m4 = motor_powers(roll[-1], pitch[-1])
+    if loop_count % PRINT_EVERY == 0:
+        print_motors(m1, m2, m3, m4)
     scf.cf.param.set_value('motorPowerSet.m1', str(m1))
     scf.cf.param.set_value('motorPowerSet.m2', str(m2))
     scf.cf.param.set_value('motorPowerSet.m3', str(m3))
@@ -84,9 +98,12 @@ def power_distribution():
 def vibration(scf):
     scf.cf.param.set_value('motorPowerSet.enable', '1')
     time.sleep(1)
+    loop_count = 0
+    loop_rate = FixedRate(LOOP_RATE, 'Motors')
     while abs(roll[-1]) < 170:
-        power_distribution()
-        time.sleep(0.1)
+        power_distribution(scf, loop_count)
+        loop_count += 1
+        loop_rate.sleep()
 
     scf.cf.param.set_value('motorPowerSet.m1', 0)
     scf.cf.param.set_value('motorPowerSet.m2', 0)
@@ -95,6 +112,7 @@ def vibration(scf):
     time.sleep(0.5)
     scf.cf.param.set_value('motorPowerSet.enable', '0')
     time.sleep(1)
+    print(loop_rate)
 
 
 def simple_plot():
@@ -1,20 +1,55 @@
 import math
+import os
+import sys
 import time
 from collections import namedtuple
 
 import matplotlib.pyplot as plt
+import numpy as np
 
 import cflib.crtp
 from cflib.crazyflie.log import LogConfig
 from cflib.crazyflie.swarm import CachedCfFactory
 from cflib.crazyflie.swarm import Swarm
 from cflib.positioning.motion_commander import MotionCommander
+from cflib.utils.reset_estimator import reset_estimator
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common import process_swarm  # noqa: E402
+from common.command_filter import Deadband  # noqa: E402
+from common.link_monitor import AdaptiveLog  # noqa: E402
+from common.loop_rate import FixedRate  # noqa: E402
+from common.motion_prediction import AlphaBetaFilter  # noqa: E402
+from common.process_swarm import ProcessSwarm  # noqa: E402
+from common.setpoint_stream import SetpointStream  # noqa: E402
+from common.spatial_hash import SpatialHash  # noqa: E402
+from common.startup import PhaseTimer, start_logging  # noqa: E402
+from common.time_sync import SnapshotSync  # noqa: E402
 
 # Change uris according to your setup
 # URIs in a swarm using the same radio must also be on the same channel
 Follower = 'radio://0/80/2M/E7E7E7E7E7'  # Follower
 Leader = 'radio://0/80/2M/E7E7E7E7E8'  # Leader
 
+# Run each drone in its own process. Each drone then needs its own radio (radio://0/..., radio://1/...)
+USE_PROCESSES = False
+
+# Aim at the predicted position of the leader instead of its last reported one
+PREDICT_LEADER = False
+LATENCY = 0.03  # Time from a position sample of the leader to the reaction of the follower [s]
+MAX_PREDICTION = 0.1  # The leader is never predicted further than this past its last sample, e.g. on link loss [s]
+
+# How the follower is commanded:
+# 'velocity': body frame velocities through the MotionCommander, after turning to yaw 0
+# 'position' or 'full_state': world frame setpoints streamed at SETPOINT_RATE, no yaw alignment
+SETPOINT_MODE = 'velocity'
+SETPOINT_RATE = 100  # Hz
+
+# Slow the position log down (up to MAX_LOG_PERIOD) when packets get lost on a busy channel
+ADAPT_LOG_RATE = True
+LOG_PERIOD = 10  # ms
+MAX_LOG_PERIOD = 50  # ms
+
 # List of URIs
 uris = {
     Follower,
@@ -26,14 +61,54 @@ r_max = 1.0  # The maximum distance between the 2 drones
 DEFAULT_HEIGHT = 0.75
 DEFAULT_VELOCITY = 0.5
 MAX_VELOCITY = 2
-x1 = [0]
-y1 = [0]
-z1 = [0]
-x2 = [0]
-y2 = [0]
-z2 = [0]
-yaw1 = [0]
-yaw2 = [0]
+CONTROL_RATE = 200  # Hz
+VELOCITY_DEADBAND = 0.01  # m/s  Smaller changes of the follower velocity are not sent
+SEPARATION = False  # Push the follower away from drones other than the leader, with more than 2 drones
+SEPARATION_DISTANCE = 0.5  # Drones other than the leader closer than this push the follower away
+HISTORY = 6000  # Position samples kept per drone for the plots, 60 s at LOG_PERIOD 10 ms
+
+
+class DroneState:
+    '''
+    Latest position of one drone. It is bound to the log config of its
+    drone once at setup, so the callback writes straight into it. The
+    samples (timestamp, x, y, z, yaw) are kept for the plots in a ring
+    buffer of HISTORY entries allocated once.
+    '''
+    __slots__ = ('uri', 'x', 'y', 'z', 'yaw', 'history', 'index')
+
+    def __init__(self, uri):
+        self.uri = uri
+        self.x = 0.0
+        self.y = 0.0
+        self.z = 0.0
+        self.yaw = 0.0
+        self.history = [None] * HISTORY
+        self.index = 0
+
+    def track(self):
+        '''The samples kept, oldest first, as rows [timestamp (ms), x, y, z, yaw].'''
+        if self.history[self.index] is None:
+            rows = self.history[:self.index]
+        else:
+            rows = self.history[self.index:] + self.history[:self.index]
+        return np.array(rows, dtype=float).reshape(-1, 5)
+
+
+follower = DroneState(Follower)
+leader = DroneState(Leader)
+states = {Follower: follower, Leader: leader}
+
+# The x-y positions of both drones on the host clock, so the distance is
+# computed from positions taken at the same time
+sync = SnapshotSync([Follower, Leader])
+leader_filter = AlphaBetaFilter(max_extrapolation=MAX_PREDICTION)
+
+# Latest x-y position of every drone, for the separation between the drones, only kept with SEPARATION
+neighbours = SpatialHash(cell_size=SEPARATION_DISTANCE) if SEPARATION else None
+
+# Adaptive log rate of each drone, its current period is in log_rates[uri].period_in_ms
+log_rates = {}
 
 
 forward = namedtuple('forward', ['velocity'])
@@ -45,8 +120,7 @@ circle_left = namedtuple('circle_left', ['radius', 'velocity'])
 
 
 def wait_for_param_download(scf):
-    while not scf.cf.param.is_updated:
-        time.sleep(1.0)
+    scf.wait_for_params()
     print('Parameters downloaded for', scf.cf.link_uri)
 
 
@@ -105,45 +179,118 @@ def pos_to_vel(x1, y1, x2, y2, dist):
     return Vx, Vy
 
 
-def position_callback(uri, data):
-    global d
-    if uri == Follower:  # Follower
-        x1.append(data['stateEstimate.x'])
-        y1.append(data['stateEstimate.y'])
-        z1.append(data['stateEstimate.z'])
-        yaw1.append(data['stateEstimate.yaw'])
-    elif uri == Leader:  # Leader
-        x2.append(data['stateEstimate.x'])
-        y2.append(data['stateEstimate.y'])
-        z2.append(data['stateEstimate.z'])
-        yaw2.append(data['stateEstimate.yaw'])
+def formation_velocity(fx, fy, lx, ly, d):
+    '''Velocity of the follower at (fx, fy) that keeps it between r_min and r_max of the leader at (lx, ly).'''
+    if d > r_max:  # Too far, move closer
+        return pos_to_vel(fx, fy, lx, ly, d)
+    elif d >= r_min and d <= r_max:  # Optimal distance, stay put
+        return 0, 0
+    else:  # Too close, back away
+        opp_cmd_vel_x, opp_cmd_vel_y = pos_to_vel(fx, fy, lx, ly, d)
+        return -opp_cmd_vel_x, -opp_cmd_vel_y
+
+
+def formation_target(fx, fy, lx, ly, d):
+    '''
+    World frame x-y setpoint of the follower at (fx, fy): the closest point
+    between r_min and r_max of the leader at (lx, ly).
+    '''
+    if d == 0:
+        return lx + r_min, ly
+    r = min(max(d, r_min), r_max)
+    return lx + (fx - lx) * r / d, ly + (fy - ly) * r / d
+
+
+def position_callback(state, timestamp, data):
+    sample = (timestamp, data['stateEstimate.x'], data['stateEstimate.y'], data['stateEstimate.z'],
+              data['stateEstimate.yaw'])
+    _, state.x, state.y, state.z, state.yaw = sample
+    index = state.index
+    state.history[index] = sample
+    state.index = index + 1 if index + 1 < HISTORY else 0
+    sync.add(state.uri, timestamp, (state.x, state.y))
+    if SEPARATION:
+        neighbours.update(state.uri, (state.x, state.y))
 
-    d = math.sqrt(pow((x1[-1]-x2[-1]), 2)+pow((y1[-1]-y2[-1]), 2))
+    if process_swarm.shared is not None:
+        share_position(state)
+
+
+def relative_position():
+    '''
+    Returns the x-y positions of the follower and the leader at their
+    latest common time, and the distance between them, or None until both
+    drones have sent data. With PREDICT_LEADER, the follower is taken at the
+    current time and the leader where it is predicted to be LATENCY later.
+    '''
+    snapshot = sync.snapshot()
+    if snapshot is None:
+        return None
+    (fx, fy), (lx, ly) = snapshot[Follower], snapshot[Leader]
+    if PREDICT_LEADER:
+        update_leader_filter()
+        now = time.monotonic()
+        fx, fy = sync.value_at(Follower, now)
+        lx, ly = leader_filter.predict(now + LATENCY)
+    return fx, fy, lx, ly, math.sqrt(pow((fx-lx), 2)+pow((fy-ly), 2))
+
+
+def update_leader_filter():
+    '''Feeds the samples of the leader that leader_filter hasn't seen yet.'''
+    for host_time, position in list(sync.samples[Leader]):
+        if leader_filter.time is None or host_time > leader_filter.time:
+            leader_filter.update(host_time, position)
+
+
+def share_position(state):
+    '''
+    Process mode: every process only receives the data of its own drone.
+    It publishes its latest position with its host time to the shared
+    memory and reads the latest position of the other drone from it. The
+    host clock (time.monotonic()) is the same for all the processes.
+    '''
+    other = leader if state is follower else follower
+    host_time = sync.samples[state.uri][-1][0]
+    process_swarm.shared.write(state.uri, (state.x, state.y, state.z, state.yaw, host_time))
+    other.x, other.y, other.z, other.yaw, other_time = process_swarm.shared.read(other.uri)
+    other_samples = sync.samples[other.uri]
+    if other_time > 0 and (not other_samples or other_samples[-1][0] < other_time):
+        sync.add_host(other.uri, other_time, (other.x, other.y))
+        if SEPARATION:
+            neighbours.update(other.uri, (other.x, other.y))
 
 
 def start_position_printing(scf):
-    log_conf1 = LogConfig(name='Position', period_in_ms=10)
+    log_conf1 = LogConfig(name='Position', period_in_ms=LOG_PERIOD)
     log_conf1.add_variable('stateEstimate.x', 'float')
     log_conf1.add_variable('stateEstimate.y', 'float')
     log_conf1.add_variable('stateEstimate.z', 'float')
     log_conf1.add_variable('stateEstimate.yaw', 'float')
     scf.cf.log.add_config(log_conf1)
-    log_conf1.data_received_cb.add_callback(lambda _timestamp, data, _logconf: position_callback(scf.cf.link_uri, data))
-    log_conf1.start()
+    state = states[scf.cf.link_uri]
+    log_conf1.data_received_cb.add_callback(lambda timestamp, data, _logconf: position_callback(state, timestamp, data))
+    if ADAPT_LOG_RATE:
+        log_rates[state.uri] = AdaptiveLog(scf.cf, log_conf1, min_period=LOG_PERIOD, max_period=MAX_LOG_PERIOD,
+                                           name=state.uri)
+    if not start_logging(log_conf1):
+        raise Exception(f'No position received from {scf.cf.link_uri}')
 
 
 def leader_follower(scf):
+    is_follower = states[scf.cf.link_uri] is follower
+    if is_follower and SETPOINT_MODE != 'velocity':
+        return streaming_follower(scf)
     with MotionCommander(scf, default_height=DEFAULT_HEIGHT) as mc:
 
         # The follower turns until it is aligned with the global coordinate system
-        while abs(yaw1[-1]) > 2:
-            if scf.__dict__['_link_uri'] == Follower:  # Follower
-                if yaw1[-1] > 0:
-                    mc.start_turn_right(36 if abs(yaw1[-1]) > 15 else 9)
-                elif yaw1[-1] < 0:
-                    mc.start_turn_left(36 if abs(yaw1[-1]) > 15 else 9)
-
-            elif scf.__dict__['_link_uri'] == Leader:  # Leader
+        while SETPOINT_MODE == 'velocity' and abs(follower.yaw) > 2:
+            if is_follower:
+                if follower.yaw > 0:
+                    mc.start_turn_right(36 if abs(follower.yaw) > 15 else 9)
+                elif follower.yaw < 0:
+                    mc.start_turn_left(36 if abs(follower.yaw) > 15 else 9)
+
+            else:
                 mc.stop()
             time.sleep(0.005)
 
@@ -153,22 +300,25 @@ def leader_follower(scf):
         # Define the flight time after the follower is aligned
         end_time = time.time() + 20
 
+        loop_rate = FixedRate(CONTROL_RATE, scf.cf.link_uri)
+        # The motion commander resends the last setpoint, so an unchanged velocity is not sent again
+        motion = Deadband(mc.start_linear_motion, deadband=VELOCITY_DEADBAND, name=scf.cf.link_uri)
         while time.time() < end_time:
-
-            if scf.__dict__['_link_uri'] == Follower:
-                if d > r_max:  # Too far, move closer
-                    cmd_vel_x, cmd_vel_y = pos_to_vel(x1[-1], y1[-1], x2[-1], y2[-1], d)
-                elif d >= r_min and d <= r_max:  # Optimal distance, stay put
-                    cmd_vel_x = 0
-                    cmd_vel_y = 0
-                elif d < r_min:  # Too close, back away
-                    opp_cmd_vel_x, opp_cmd_vel_y = pos_to_vel(x1[-1], y1[-1], x2[-1], y2[-1], d)
-                    cmd_vel_x = -opp_cmd_vel_x
-                    cmd_vel_y = -opp_cmd_vel_y
-
-                mc.start_linear_motion(cmd_vel_x, cmd_vel_y, 0)
-
-            elif scf.__dict__['_link_uri'] == Leader:
+            if is_follower:
+                relative = relative_position()
+                if relative is None:
+                    loop_rate.sleep()
+                    continue
+                cmd_vel_x, cmd_vel_y = formation_velocity(*relative)
+
+                if SEPARATION:
+                    # Keep away from the other drones of the swarm
+                    sep_vel_x, sep_vel_y = neighbours.separation(Follower, SEPARATION_DISTANCE, MAX_VELOCITY,
+                                                                 exclude=(Leader,))
+                    cmd_vel_x, cmd_vel_y = cmd_vel_x + sep_vel_x, cmd_vel_y + sep_vel_y
+                motion(cmd_vel_x, cmd_vel_y, 0)
+
+            else:
                 # Define the sequence of the leader
                 if time.time() - start_time < 3:
                     mc.start_forward(DEFAULT_VELOCITY)
@@ -179,9 +329,76 @@ def leader_follower(scf):
                 else:
                     mc.stop()
 
-            time.sleep(0.005)
+            loop_rate.sleep()
         time.sleep(1)
         mc.land()
+    print(loop_rate)
+    summary = loop_rate.summary()
+    if scf.cf.link_uri in log_rates:
+        print(log_rates[scf.cf.link_uri])
+        summary['log_period'] = log_rates[scf.cf.link_uri].period_in_ms
+    if is_follower:
+        print(motion)
+        summary.update(motion.summary())
+    return summary
+
+
+def streaming_follower(scf):
+    '''
+    The follower with SETPOINT_MODE 'position' or 'full_state': it takes off
+    with the high level commander and streams the formation target in the
+    world frame at SETPOINT_RATE, with the velocity of the leader as
+    feedforward in 'full_state' mode. The setpoints hold the yaw the drone
+    has after the takeoff, so it doesn't turn to align with the world frame.
+    '''
+    commander = scf.cf.high_level_commander
+    commander.takeoff(DEFAULT_HEIGHT, 2.0)
+    time.sleep(2.0)
+
+    stream = SetpointStream(scf.cf, mode=SETPOINT_MODE, yaw=states[scf.cf.link_uri].yaw, name=scf.cf.link_uri)
+    loop_rate = FixedRate(SETPOINT_RATE, scf.cf.link_uri)
+    # Same flight time as the leader after the alignment
+    end_time = time.time() + 0.5 + 20
+    while time.time() < end_time:
+        relative = relative_position()
+        if relative is None:
+            loop_rate.sleep()
+            continue
+        fx, fy, lx, ly, d = relative
+        target_x, target_y = formation_target(fx, fy, lx, ly, d)
+
+        if SEPARATION:
+            # The separation velocity is MAX_VELOCITY * (1 - distance / SEPARATION_DISTANCE),
+            # scaled to a distance it moves the target out of the radius of the neighbour
+            sep_vel_x, sep_vel_y = neighbours.separation(Follower, SEPARATION_DISTANCE, MAX_VELOCITY,
+                                                         exclude=(Leader,))
+            target_x += sep_vel_x * SEPARATION_DISTANCE / MAX_VELOCITY
+            target_y += sep_vel_y * SEPARATION_DISTANCE / MAX_VELOCITY
+
+        update_leader_filter()
+        leader_vel_x, leader_vel_y = leader_filter.velocity if leader_filter.velocity is not None else (0.0, 0.0)
+        stream.track((fx, fy))
+        stream.send((target_x, target_y, DEFAULT_HEIGHT), (leader_vel_x, leader_vel_y, 0.0))
+        loop_rate.sleep()
+
+    stream.stop()
+    commander.land(0.0, 2.0)
+    time.sleep(2.0)
+    commander.stop()
+    print(loop_rate)
+    print(stream)
+    summary = loop_rate.summary()
+    summary.update(stream.summary())
+    if scf.cf.link_uri in log_rates:
+        print(log_rates[scf.cf.link_uri])
+        summary['log_period'] = log_rates[scf.cf.link_uri].period_in_ms
+    return summary
+
+
+def trajectory(scf):
+    '''Process mode: returns the trajectory of this process' own drone.'''
+    _, xs, ys, zs, _ = states[scf.cf.link_uri].track().T
+    return xs, ys, zs
 
 
 def trajectory_plots(uri1x, uri1y, uri1z, uri2x, uri2y, uri2z):
@@ -214,22 +431,32 @@ def trajectory_plots(uri1x, uri1y, uri1z, uri2x, uri2y, uri2z):
 if __name__ == '__main__':
     cflib.crtp.init_drivers()
 
+    if USE_PROCESSES:
+        velocity_profile_plot()
+        with ProcessSwarm([Follower, Leader], fields=5) as swarm:
+            results = swarm.run([reset_estimator, start_position_printing, wait_for_param_download, arm,
+                                 leader_follower, trajectory])
+            swarm.print_phase_times()
+        for uri in (Follower, Leader):
+            print(f'{uri}: {results[uri][-2]["rate"]:.1f} Hz')
+        trajectory_plots(*results[Follower][-1], *results[Leader][-1])
+        sys.exit()
+
     factory = CachedCfFactory(rw_cache='./cache')
     with Swarm(uris, factory=factory) as swarm:
 
         velocity_profile_plot()
 
-        swarm.reset_estimators()
-
-        print('Waiting for parameters to be downloaded...')
-        swarm.parallel_safe(wait_for_param_download)
-        time.sleep(0.5)
-
-        swarm.parallel_safe(arm)
-        time.sleep(0.5)
-
-        swarm.parallel_safe(start_position_printing)
-        time.sleep(0.5)
+        # The estimators are reset first so no position from before the reset
+        # reaches the plots or the follower. The log TOC is ready as soon as
+        # the links are, so the logging starts while the parameters are still
+        # downloading
+        startup = PhaseTimer()
+        startup.run('estimators', swarm.reset_estimators)
+        startup.run('logging', swarm.parallel_safe, start_position_printing)
+        startup.run('parameters', swarm.parallel_safe, wait_for_param_download)
+        startup.run('arming', swarm.parallel_safe, arm)
+        print(startup)
 
         swarm.parallel_safe(leader_follower)
         time.sleep(0.5)
@@ -237,4 +464,6 @@ if __name__ == '__main__':
         swarm.close_links()
         time.sleep(0.5)
 
-        trajectory_plots(x1, y1, z1, x2, y2, z2)
+        _, follower_x, follower_y, follower_z, _ = follower.track().T
+        _, leader_x, leader_y, leader_z, _ = leader.track().T
+        trajectory_plots(follower_x, follower_y, follower_z, leader_x, leader_y, leader_z)
@@ -1,23 +1,96 @@
+import os
+import sys
+import threading
 import time
 
+import numpy as np
+
 import cflib.crtp
 from cflib.crazyflie import Crazyflie
+from cflib.crazyflie.log import LogConfig
 from cflib.crazyflie.syncCrazyflie import SyncCrazyflie
 from cflib.positioning.motion_commander import MotionCommander
 from cflib.utils import uri_helper
-from cflib.utils.multiranger import Multiranger
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.command_filter import Deadband  # noqa: E402
 
 URI = uri_helper.uri_from_env(default='radio://0/80/2M/E7E7E7E7E7')
 
 DEFAULT_HEIGHT = 0.5
-
-def is_close(range):
-    MIN_DISTANCE = 0.2  # m
-
-    if range is None:
-        return False
-    else:
-        return range < MIN_DISTANCE
+MIN_DISTANCE = 0.2  # m  Full repulsion at this distance or closer
+INFLUENCE_DISTANCE = 0.6  # m  No repulsion at this distance or further
+MAX_VELOCITY = 0.5  # m/s
+RANGE_PERIOD = 20  # ms  How fast we log the ranges
+SETPOINT_RATE = 50  # Hz  How often the loop checks for new ranges when none arrive
+VELOCITY_DEADBAND = 0.01  # m/s  Smaller changes of the velocity are not sent
+
+# The ranges are logged in this order. Up is only used to stop the script.
+RANGES = ['range.front', 'range.back', 'range.left', 'range.right', 'range.up']
+# Direction of the push [x, y] for each range except up
+PUSH = np.array([
+    [-1, 0],  # Front
+    [1, 0],  # Back
+    [0, -1],  # Left
+    [0, 1],  # Right
+])
+
+velocity = np.zeros(2)
+keep_flying = True
+new_data = threading.Event()
+data_time = 0
+latencies = []
+
+
+def repulsion(ranges):
+    '''
+    Takes the five ranges in meters and returns the velocity [x, y] that
+    pushes the Crazyflie away from everything close to it. Each side pushes
+    with a speed that grows linearly from 0 at INFLUENCE_DISTANCE to
+    MAX_VELOCITY at MIN_DISTANCE.
+    '''
+    strength = np.clip((INFLUENCE_DISTANCE - ranges[:4]) / (INFLUENCE_DISTANCE - MIN_DISTANCE), 0, 1)
+    return MAX_VELOCITY * strength @ PUSH
+
+
+def range_callback(timestamp, data, logconf):
+    global velocity, keep_flying, data_time
+
+    ranges = np.array([data[name] for name in RANGES], dtype=float)
+    ranges[ranges >= 8000] = np.inf  # Out of range
+    ranges /= 1000
+
+    velocity = repulsion(ranges)
+    if ranges[4] < MIN_DISTANCE:
+        keep_flying = False
+
+    data_time = time.perf_counter()
+    new_data.set()
+
+
+def start_range_printing(scf):
+    log_conf = LogConfig(name='Ranges', period_in_ms=RANGE_PERIOD)
+    for name in RANGES:
+        log_conf.add_variable(name, 'uint16_t')
+    scf.cf.log.add_config(log_conf)
+    log_conf.data_received_cb.add_callback(range_callback)
+    log_conf.start()
+    return log_conf
+
+
+def push(motion_commander):
+    '''
+    Sends a setpoint as soon as new ranges change the velocity by more than
+    VELOCITY_DEADBAND. In between, the motion commander keeps resending
+    the last one, so hovering idle doesn't use the radio.
+    '''
+    command = Deadband(motion_commander.start_linear_motion, deadband=VELOCITY_DEADBAND, name='Setpoints')
+    while keep_flying:
+        if new_data.wait(1 / SETPOINT_RATE):
+            new_data.clear()
+            if command(velocity[0], velocity[1], 0):
+                latencies.append(time.perf_counter() - data_time)
+    return command
 
 
 if __name__ == '__main__':
@@ -31,30 +104,12 @@ if __name__ == '__main__':
         time.sleep(1.0)
 
         with MotionCommander(scf, default_height=DEFAULT_HEIGHT) as motion_commander:
-            with Multiranger(scf) as multiranger:
-                keep_flying = True
-
-                while keep_flying:
-                    VELOCITY = 0.5
-                    velocity_x = 0.0
-                    velocity_y = 0.0
-
-                    if is_close(multiranger.front):
-                        velocity_x -= VELOCITY
-                    if is_close(multiranger.back):
-                        velocity_x += VELOCITY
-
-                    if is_close(multiranger.left):
-                        velocity_y -= VELOCITY
-                    if is_close(multiranger.right):
-                        velocity_y += VELOCITY
-
-                    if is_close(multiranger.up):
-                        keep_flying = False
-
-                    motion_commander.start_linear_motion(
-                        velocity_x, velocity_y, 0)
-
-                    time.sleep(0.1)
-
-            print('Script terminated!')
+            log_conf = start_range_printing(scf)
+            command = push(motion_commander)
+            log_conf.stop()
+        print(command)
+
+        if latencies:
+            print(f'Reaction latency from new ranges to setpoint: mean {1000*np.mean(latencies):.2f} ms, '
+                  f'max {1000*np.max(latencies):.2f} ms (plus up to {RANGE_PERIOD} ms of log period)')
+        print('Script terminated!')
@@ -1,8 +1,6 @@
-import time
-import cflib
-from cflib.crazyflie import Crazyflie
-from cflib.crazyflie.swarm import CachedCfFactory, Swarm
-from cflib.crazyflie.syncCrazyflie import SyncCrazyflie
+import asyncio
+
+from common.async_swarm import AsyncSwarm
 
 # List your Crazyflie URIs here
 uris = [
@@ -12,35 +10,26 @@ uris = [
     'radio://0/30/2M/e7e7e7e7e8'
 ]
 
-def filter_uris(uris):
-    valid_uris = []
-    for uri in uris:
-        try:
-            with SyncCrazyflie(uri, cf=Crazyflie(rw_cache='./cache')) as scf:
-                print(f"Successfully connected to   {uri}")
-                valid_uris.append(uri)
-        except Exception as e:
-            print(f"Failed to connect to {uri}: {e}")
-    return valid_uris
+async def stop_motors(acf):
+    # Each write returns once the Crazyflie has confirmed it, so the power is
+    # only zeroed after the motors are disabled
+    await acf.set_param('motorPowerSet.enable', '0')
+    await acf.set_param('motorPowerSet.m1', '0')
+    #await acf.set_param('motorPowerSet.m2', '0')
+    #await acf.set_param('motorPowerSet.m3', '0')
+    #await acf.set_param('motorPowerSet.m4', '0')
+    print(f"Motors stopped for {acf.uri}")
 
-def stop_motors(scf):
-    scf.cf.param.set_value('motorPowerSet.enable', '0')
-    time.sleep(1)
-    scf.cf.param.set_value('motorPowerSet.m1', '0')
-    #scf.cf.param.set_value('motorPowerSet.m2', '0')
-    #scf.cf.param.set_value('motorPowerSet.m3', '0')
-    #scf.cf.param.set_value('motorPowerSet.m4', '0')
-    print(f"Motors stopped for {scf._link_uri}")
+async def stop_all_motors(uris):
+    # All the drones are connected at once, the unreachable ones are skipped
+    async with AsyncSwarm(uris, skip_unreachable=True) as swarm:
+        for uri in swarm.crazyflies:
+            print(f"Successfully connected to   {uri}")
+        if not swarm.crazyflies:
+            print("No valid Crazyflie connections found. Exiting.")
+            return
+        await swarm.gather(stop_motors)
 
 if __name__ == '__main__':
     print("=== STOPPING ALL MOTORS ===")
-    cflib.crtp.init_drivers()
-    factory = CachedCfFactory(rw_cache='./cache')
-    valid_uris = filter_uris(uris)
-    if not valid_uris:
-        print("No valid Crazyflie connections found. Exiting.")
-        exit()
-    with Swarm(valid_uris, factory=factory) as swarm:
-        swarm.parallel_safe(stop_motors)
-        time.sleep(1)
-    
\ No newline at end of file
+    asyncio.run(stop_all_motors(uris))
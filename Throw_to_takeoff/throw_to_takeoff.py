@@ -1,3 +1,5 @@
+import os
+import sys
 import time
 
 import matplotlib.pyplot as plt
@@ -10,25 +12,29 @@ from cflib.crazyflie.swarm import CachedCfFactory
 from cflib.crazyflie.syncCrazyflie import SyncCrazyflie
 from cflib.utils import uri_helper
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.event_detector import save_session, throw_detector  # noqa: E402
+
 Uri = uri_helper.uri_from_env(default='radio://0/80/2M/E7E7E7E7E7')
 
 vel_z = []
 acc_z = []
-TimePer = 100  # ms
+acc_t = []
+TimePer = 10  # ms
+SESSION_FILE = 'throw_session.npz'  # Replay it with Benchmarks/event_detector_benchmark.py
+detector = throw_detector()
 Takeoff = False
-Executing = False
 
 
 def z_axis_callback(timestamp, data, logconf):
-    global Executing, Takeoff
+    global Takeoff
 
     vel_z.append(data['stateEstimate.vz'])
     acc_z.append(data['acc.z'])
+    acc_t.append(timestamp / 1000)
 
-    if Executing is False:
-        if acc_z[-1] < 0.1 and vel_z[-1] < 0.05:
-            Takeoff = True
-            Executing = True
+    if detector.update(acc_t[-1], data):
+        Takeoff = True
 
 
 def start_callback_printing(scf):
@@ -90,4 +96,5 @@ if __name__ == '__main__':
         time.sleep(0.5)
         scf.close_link()
         time.sleep(0.5)
+        save_session(SESSION_FILE, acc_t, {'acc.z': acc_z, 'stateEstimate.vz': vel_z})
         simple_plot(acc_z, vel_z)
@@ -1,3 +1,5 @@
+import os
+import sys
 import time
 
 import matplotlib.pyplot as plt
@@ -12,6 +14,13 @@ from cflib.crazyflie.swarm import Swarm
 from cflib.crazyflie.syncCrazyflie import SyncCrazyflie
 from cflib.utils import uri_helper
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.command_filter import Deadband  # noqa: E402
+from common.link_monitor import AdaptiveLog  # noqa: E402
+from common.loop_rate import FixedRate  # noqa: E402
+from common.process_swarm import ProcessSwarm  # noqa: E402
+from common.shutdown import MotorShutdown  # noqa: E402
+
 
 ######################### PLAY WITH THESE NUMBERS ##################################
 
@@ -26,9 +35,18 @@ invert = False
 # Handy for tuning values when connected to one crazyflie. 
 printing = False
 
+# Run each drone in its own process. Each drone then needs its own radio (radio://0/..., radio://1/...)
+use_processes = False
+
+# One loop computes the power of all the drones in a single NumPy pass, instead of one thread per drone
+batched = True
+
 # Smoothing, more samples, smoother response
 samples = 4
 
+# Motor power changes smaller than this are not sent, to save radio packets
+power_deadband = 500
+
 ####################################################################################
 
 # Connection URI for the Crazyflie
@@ -39,34 +57,61 @@ uris = [
 'radio://0/30/2M/e7e7e7e7e8'
 ]
 
-# Global dictionary to store 3d acceleration data for each Crazyflie
-acc_3d_dict = {}
+# State of each Crazyflie, created once when its logging starts
+drone_states = {}
+
+# Ring buffers of all the Crazyflies, one row per uri, so the batched mode reads them as one array
+acc_windows = np.zeros((len(uris), samples))
+
+
+class DroneState:
+    '''
+    Recent 3d acceleration of one Crazyflie, in a ring buffer of `samples`
+    values allocated once. It is bound to the log config of its Crazyflie,
+    so the callback writes straight into it. The ring buffer can be a row
+    of acc_windows, for the batched mode.
+    '''
+    __slots__ = ('uri', 'scf', 'acc_3d', 'index', 'count', 'motor', 'log')
+
+    def __init__(self, uri, acc_3d=None):
+        self.uri = uri
+        self.scf = None
+        self.acc_3d = acc_3d if acc_3d is not None else [0.0] * samples
+        self.index = 0
+        self.count = 0
+        self.motor = None
+        self.log = None
 
 # TODO FIND LOG PERIOD THAT SUITS THE BANDWIDTH, 4 DRONES 
 log_period = 40 #ms
 
+# Slow the log down (up to max_log_period) when packets get lost on a busy channel
+adapt_log_rate = True
+max_log_period = 200 #ms
+
+# How often the motor power is updated
+vibration_rate = 20 #Hz
+
 global execute
 execute = True
 
 
-def acceleration_callback(timestamp, data, logconf):
+def acceleration_callback(state, data):
     acc_x = data['stateEstimate.ax']
     acc_y = data['stateEstimate.ay']
     acc_z = data['stateEstimate.az']
 
-    # Extract URI from logconf.name
-    uri = logconf.name.split(' ')[-1]
-
-    acc_3d = (math.sqrt(acc_x**2 + acc_y**2 + acc_z**2))
+    #add the data to the ring buffer, which keeps the last samples specified at the top of the script. 
+    state.acc_3d[state.index] = math.sqrt(acc_x**2 + acc_y**2 + acc_z**2)
+    state.index = (state.index + 1) % samples
+    if state.count < samples:
+        state.count += 1
 
-    # Ensure each Crazyflie has its own key/list in the dict
-    if uri not in acc_3d_dict:
-        acc_3d_dict[uri] = []
 
-    #add the data to the list and keep it the length of samples specified at the top of the script. 
-    acc_3d_dict[uri].append(acc_3d)
-    if len(acc_3d_dict[uri]) > samples:
-        acc_3d_dict[uri].pop(0)
+def motor_command(scf):
+    '''Sends the power of m1 when it changed by more than power_deadband, or every second.'''
+    return Deadband(lambda power: scf.cf.param.set_value('motorPowerSet.m1', str(power)),
+                    deadband=power_deadband, keep_alive=1.0, name=scf._link_uri)
 
 
 def start_logging(scf):
@@ -75,43 +120,128 @@ def start_logging(scf):
     log_conf.add_variable('stateEstimate.ay', 'float')
     log_conf.add_variable('stateEstimate.az', 'float')
     scf.cf.log.add_config(log_conf)
-    log_conf.data_received_cb.add_callback(acceleration_callback)
+    state = drone_states[scf._link_uri] = DroneState(scf._link_uri, acc_windows[uris.index(scf._link_uri)])
+    state.scf = scf
+    state.motor = motor_command(scf)
+    log_conf.data_received_cb.add_callback(lambda timestamp, data, logconf: acceleration_callback(state, data))
+    if adapt_log_rate:
+        state.log = AdaptiveLog(scf.cf, log_conf, min_period=log_period, max_period=max_log_period, name=scf._link_uri)
     log_conf.start()
     print(f"Started logging for         {scf._link_uri}")
 
 
-def vibration(scf):
+def enable_motors(scf):
     scf.cf.param.set_value('motorPowerSet.enable', '1')
     time.sleep(1)
 
     if execute == True:
         print(f'Ready to vibrate!           {scf._link_uri}')
 
-    while execute == True:
-        power_calculator(scf)
-        time.sleep(.05)
-    
-    time.sleep(1)
-    # Turn off all motors
-    scf.cf.param.set_value('motorPowerSet.m1', '0')
-    scf.cf.param.set_value('motorPowerSet.m2', '0')
-    scf.cf.param.set_value('motorPowerSet.m3', '0')
-    scf.cf.param.set_value('motorPowerSet.m4', '0')
-    time.sleep(1)
 
-def power_calculator(scf):
-    # Extract URI from scf
-    uri = scf._link_uri
+def shutdown(states):
+    '''
+    Ctrl + C: the powers are not sent anymore and the motors of all the
+    drones are stopped at once, without waiting for the vibration loops.
+    '''
+    print("\n=== STOPPING ALL MOTORS ===")
+    for state in states:
+        state.motor.close()
+    stop = MotorShutdown([state.scf for state in states])
+    stop.run()
+    print(stop)
+    return stop.summary()
 
-    # Ensure the URI exists in the dictionary and has data
-    if uri not in acc_3d_dict or not acc_3d_dict[uri]:
-        print(f"No acceleration data available for {uri}. Skipping power calculation.")
-        return
 
-    # look up the right acc_3d list from the global dict
-    acc_3d = acc_3d_dict[uri]
+def vibration(scf):
+    enable_motors(scf)
+
+    state = drone_states[scf._link_uri]
+    loop_rate = FixedRate(vibration_rate, scf._link_uri)
+    try:
+        while execute == True:
+            power_calculator(scf, state)
+            loop_rate.sleep()
+    finally:
+        # Also printed on Ctrl + C, before the motors are stopped
+        if loop_rate.ticks:
+            print(loop_rate)
+            print(state.motor)
+        if state.log is not None:
+            print(state.log)
+    summary = loop_rate.summary()
+    summary.update(state.motor.summary())
+    if state.log is not None:
+        summary['log_period'] = state.log.period_in_ms
+    return summary
+
+
+def vibrate(scf):
+    '''
+    Process mode: each process gets the Ctrl + C and stops the motors of
+    its own drone. Returns the shutdown times.
+    '''
+    global execute
+    try:
+        return vibration(scf)
+    except KeyboardInterrupt:
+        execute = False
+        return shutdown([drone_states[scf._link_uri]])
+
+def batch_powers(windows, counts):
+    '''
+    Motor power of all the drones at once: row i of windows is the ring
+    buffer of drone i, with counts[i] samples in it. The buffers start at
+    zero, so the sum of a row is the sum of its samples.
+    '''
+    mean_acc = windows.sum(axis=1) / np.maximum(counts, 1)
+    power = np.minimum((mean_acc / .5 * max_power).astype(int), max_power)
+    if invert == True:
+        power = max_power - power
+    return power, mean_acc
+
+
+def coordinator_tick(states, rows):
+    '''One tick of the batched mode: rows[i] is the row of acc_windows of states[i].'''
+    counts = np.array([state.count for state in states])
+    powers, mean_acc = batch_powers(acc_windows[rows], counts)
+    for state, count, power, mean in zip(states, counts.tolist(), powers.tolist(), mean_acc.tolist()):
+        # No acceleration data yet
+        if count == 0:
+            continue
+        if printing == True:
+            print(f'URI: {state.uri}, Acceleration: {mean:.2f} g → Motor power: {power}')
+        state.motor(power)
+
+
+def batched_vibration(states):
+    '''
+    Batched mode: one loop gathers the ring buffers of all the drones,
+    computes every power in one NumPy pass and sends them, so the CPU per
+    tick hardly grows with the number of drones.
+    '''
+    rows = np.array([uris.index(state.uri) for state in states])
+    loop_rate = FixedRate(vibration_rate, 'Coordinator')
+    try:
+        while execute == True:
+            coordinator_tick(states, rows)
+            loop_rate.sleep()
+    finally:
+        if loop_rate.ticks:
+            print(loop_rate)
+        for state in states:
+            print(state.motor)
+            if state.log is not None:
+                print(state.log)
+    return loop_rate.summary()
+
+
+def power_calculator(scf, state):
+    # Ensure the Crazyflie has data
+    if state.count == 0:
+        print(f"No acceleration data available for {state.uri}. Skipping power calculation.")
+        return
 
-    mean_acc = sum(acc_3d) / len(acc_3d)
+    mean_acc = sum(state.acc_3d[:state.count]) / state.count
 
     if invert == True:
         power = max_power - min(int((mean_acc / 0.5) * max_power), max_power)
@@ -123,7 +253,7 @@ def power_calculator(scf):
         print(f'URI: {scf._link_uri}, Angular velocity: {mean_acc:.1f}°/s → Motor power: {power}')
     
 
-    scf.cf.param.set_value('motorPowerSet.m1', str(power))
+    state.motor(power)
     #scf.cf.param.set_value('motorPowerSet.m2', str(power))
     #scf.cf.param.set_value('motorPowerSet.m3', str(power))
     #scf.cf.param.set_value('motorPowerSet.m4', str(power))
@@ -153,16 +283,35 @@ if __name__ == '__main__':
         print("No valid Crazyflie connections found. Exiting.")
         exit()
 
+    if use_processes:
+        with ProcessSwarm(valid_uris) as swarm:
+            results = swarm.run([start_logging, vibrate])
+        for uri in valid_uris:
+            silent = results[uri][-1]['silent']
+            print(f'{uri}: motors silent after {1000 * silent:.0f} ms' if silent is not None
+                  else f'{uri}: motors stop not confirmed')
+        exit()
+
     with Swarm(valid_uris, factory=factory) as swarm:
         # Not resetting estimators or arming the Crazyflie as it is not flying
 
         swarm.parallel_safe(start_logging)
         time.sleep(1)
 
-        try:
-            swarm.parallel_safe(vibration)
-
-        except KeyboardInterrupt:
-            print("\n=== STOPPING ALL MOTORS ===")
-            execute = False
-            swarm.parallel_safe(vibration)
\ No newline at end of file
+        states = [drone_states[uri] for uri in valid_uris]
+        if batched:
+            swarm.parallel_safe(enable_motors)
+            try:
+                batched_vibration(states)
+            except KeyboardInterrupt:
+                execute = False
+                shutdown(states)
+
+        else:
+            try:
+                swarm.parallel_safe(vibration)
+
+            except KeyboardInterrupt:
+                # The vibration threads end at their next tick, and send no power anymore
+                execute = False
+                shutdown(states)
\ No newline at end of file
@@ -1,3 +1,5 @@
+import os
+import sys
 import time
 import numpy as np
 from scipy.spatial.transform import Rotation
@@ -9,6 +11,13 @@ from cflib.crazyflie.swarm import CachedCfFactory
 from cflib.crazyflie.swarm import Swarm
 from cflib.crazyflie.syncCrazyflie import SyncCrazyflie
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.command_filter import Deadband  # noqa: E402
+from common.link_monitor import AdaptiveLog  # noqa: E402
+from common.loop_rate import FixedRate  # noqa: E402
+from common.process_swarm import ProcessSwarm  # noqa: E402
+from common.shutdown import MotorShutdown  # noqa: E402
+
 ######################### PLAY WITH THESE NUMBERS ##################################
 
 #NOTE: Press control + C to end the script. 
@@ -25,9 +34,22 @@ printing = False
 # the required Angular velocity that produces max power
 max_angular_velocity_dps = 400  # (degrees per second)
 
+# Run each drone in its own process. Each drone then needs its own radio (radio://0/..., radio://1/...)
+use_processes = False
+
+# One loop computes the power of all the drones in a single NumPy pass, instead of one thread per drone
+batched = True
+
+# Log the gyro rates (3 half floats) instead of the quaternion (4 floats) and
+# average their norm, instead of differentiating the attitude on the computer
+use_gyro = False
+
 # Smoothing, more samples, smoother and more laggy response
 samples = 4
 
+# Motor power changes smaller than this are not sent, to save radio packets
+power_deadband = 500
+
 # Response curve, 1 = linear response.
 vibration_exponent = 1 
 
@@ -41,80 +63,139 @@ uris = [
 'radio://0/30/2M/e7e7e7e7e8'
 ]
 
-# Global dictionary to store quaternion data for each Crazyflie
-quat_data_dict = {}
+# State of each Crazyflie, created once when its logging starts
+drone_states = {}
+
+# Ring buffers of all the Crazyflies, one row per uri, so the batched mode reads them as one array
+time_windows = np.zeros((len(uris), samples))
+quaternion_windows = np.zeros((len(uris), samples, 4))
+gyro_windows = np.zeros((len(uris), samples, 3))
+
+
+class DroneState:
+    """
+    Recent quaternions of one Crazyflie with their timestamps, or its gyro
+    rates with use_gyro, in ring buffers of `samples` entries allocated
+    once. It is bound to the log config of its Crazyflie, so the callback
+    writes straight into it. The ring buffers can be rows of time_windows,
+    quaternion_windows and gyro_windows, for the batched mode.
+    """
+    __slots__ = ('uri', 'scf', 'timestamps', 'quaternions', 'gyro', 'index', 'count', 'motor', 'log')
+
+    def __init__(self, uri, timestamps=None, quaternions=None, gyro=None):
+        self.uri = uri
+        self.scf = None
+        self.timestamps = timestamps if timestamps is not None else [0.0] * samples
+        self.quaternions = quaternions if quaternions is not None else [None] * samples
+        self.gyro = gyro if gyro is not None else np.zeros((samples, 3))
+        self.index = 0
+        self.count = 0
+        self.motor = None
+        self.log = None
+
+    def ordered(self):
+        """Returns the indices of the stored samples, oldest first."""
+        start = self.index - self.count
+        return [(start + i) % samples for i in range(self.count)]
 
 # TODO FIND LOG PERIOD THAT SUITS THE BANDWIDTH, 4 DRONES 
 log_period = 40 #ms
 
+# Slow the log down (up to max_log_period) when packets get lost on a busy channel
+adapt_log_rate = True
+max_log_period = 200 #ms
+
+# How often the motor power is updated
+vibration_rate = 20 #Hz
+
 global execute
 execute = True
 
 
-def attitude_callback(timestamp, data, logconf):
+def attitude_callback(state, timestamp, data):
     """
     Callback function that receives quaternion data from Crazyflie.
     Stores quaternion data with timestamps for velocity calculation.
     """
-    quat = [data['stateEstimate.qw'], data['stateEstimate.qx'], 
-            data['stateEstimate.qy'], data['stateEstimate.qz']]
-    
-    # Extract URI from logconf.name
-    uri = logconf.name.split(' ')[-1]
+    #add the data to the ring buffer, which keeps the last samples specified at the top of the script. 
+    state.timestamps[state.index] = timestamp / 1000.0  # Convert milliseconds to seconds
+    state.quaternions[state.index] = [data['stateEstimate.qw'], data['stateEstimate.qx'],
+                                      data['stateEstimate.qy'], data['stateEstimate.qz']]
+    state.index = (state.index + 1) % samples
+    if state.count < samples:
+        state.count += 1
 
-    # Ensure each Crazyflie has its own key/list in the dict
-    if uri not in quat_data_dict:
-        quat_data_dict[uri] = []
 
-    #add the data to the list and keep it the length of samples specified at the top of the script. 
-    quat_data_dict[uri].append({
-        'timestamp': timestamp / 1000.0,  # Convert milliseconds to seconds
-        'quaternion': quat
-    })
-    if len(quat_data_dict[uri]) > samples:
-        quat_data_dict[uri].pop(0)
+def gyro_callback(state, timestamp, data):
+    """Stores the gyro rates (°/s) in the ring buffer."""
+    state.gyro[state.index] = (data['gyro.x'], data['gyro.y'], data['gyro.z'])
+    state.index = (state.index + 1) % samples
+    if state.count < samples:
+        state.count += 1
 
-    #print(f"URI: {uri}, Timestamp: {timestamp}, Data: {data}")
+
+def motor_command(scf):
+    """Sends the power of m1 when it changed by more than power_deadband, or every second."""
+    return Deadband(lambda power: scf.cf.param.set_value('motorPowerSet.m1', str(power)),
+                    deadband=power_deadband, keep_alive=1.0, name=scf._link_uri)
 
 
 def start_logging(scf):
     """
-    Set up logging to receive quaternion data from Crazyflie.
+    Set up logging to receive quaternion data, or gyro rates with use_gyro, from Crazyflie.
     """
-    log_conf = LogConfig(name='Quaternion_Attitude for '+ scf._link_uri, period_in_ms=log_period)  # 20 Hz for better velocity estimation
-    
-    # Add quaternion variables to logging
-    log_conf.add_variable('stateEstimate.qw', 'float')
-    log_conf.add_variable('stateEstimate.qx', 'float')
-    log_conf.add_variable('stateEstimate.qy', 'float')
-    log_conf.add_variable('stateEstimate.qz', 'float')
-    
-    scf.cf.log.add_config(log_conf)
-    log_conf.data_received_cb.add_callback(attitude_callback)
+    row = uris.index(scf._link_uri)
+    state = drone_states[scf._link_uri] = DroneState(scf._link_uri, time_windows[row], quaternion_windows[row],
+                                                     gyro_windows[row])
+    state.scf = scf
+    state.motor = motor_command(scf)
+
+    if use_gyro:
+        # Half floats: 6 bytes per sample, resolution 0.25°/s up to 512°/s
+        log_conf = LogConfig(name='Gyro for '+ scf._link_uri, period_in_ms=log_period)
+        log_conf.add_variable('gyro.x', 'FP16')
+        log_conf.add_variable('gyro.y', 'FP16')
+        log_conf.add_variable('gyro.z', 'FP16')
+        scf.cf.log.add_config(log_conf)
+        log_conf.data_received_cb.add_callback(lambda timestamp, data, logconf: gyro_callback(state, timestamp, data))
+    else:
+        log_conf = LogConfig(name='Quaternion_Attitude for '+ scf._link_uri, period_in_ms=log_period)  # 20 Hz for better velocity estimation
+
+        # Add quaternion variables to logging
+        log_conf.add_variable('stateEstimate.qw', 'float')
+        log_conf.add_variable('stateEstimate.qx', 'float')
+        log_conf.add_variable('stateEstimate.qy', 'float')
+        log_conf.add_variable('stateEstimate.qz', 'float')
+
+        scf.cf.log.add_config(log_conf)
+        log_conf.data_received_cb.add_callback(lambda timestamp, data, logconf: attitude_callback(state, timestamp, data))
+    if adapt_log_rate:
+        state.log = AdaptiveLog(scf.cf, log_conf, min_period=log_period, max_period=max_log_period, name=scf._link_uri)
     log_conf.start()
     print(f"Started logging for         {scf._link_uri}")
 
-def calculate_average_angular_velocity(uri):
+def calculate_average_angular_velocity(state):
     """
     Calculate the average angular velocity in degrees per second for a specific Crazyflie.
-    Uses all quaternion data in the deque to estimate rotational speed.
+    Uses all quaternion data in the ring buffer to estimate rotational speed.
     """
-    if uri not in quat_data_dict or len(quat_data_dict[uri]) < 2:
+    if state.count < 2:
         return 0.0
 
+    order = state.ordered()
     angular_velocities = []
-    for i in range(1, len(quat_data_dict[uri])):
-        current = quat_data_dict[uri][i]
-        previous = quat_data_dict[uri][i - 1]
+    for i in range(1, len(order)):
+        current = order[i]
+        previous = order[i - 1]
 
         # Calculate time difference
-        dt = current['timestamp'] - previous['timestamp']
+        dt = state.timestamps[current] - state.timestamps[previous]
         if dt <= 0:
             continue
 
         # Convert quaternions to scipy Rotation objects
-        curr_quat = current['quaternion']
-        prev_quat = previous['quaternion']
+        curr_quat = state.quaternions[current]
+        prev_quat = state.quaternions[previous]
 
         curr_rot = Rotation.from_quat([curr_quat[1], curr_quat[2], curr_quat[3], curr_quat[0]])
         prev_rot = Rotation.from_quat([prev_quat[1], prev_quat[2], prev_quat[3], prev_quat[0]])
@@ -135,6 +216,13 @@ def calculate_average_angular_velocity(uri):
     # Return the average angular velocity
     return np.mean(angular_velocities) if angular_velocities else 0.0
 
+def average_gyro_rate(state):
+    """Average angular speed in degrees per second from the gyro rates in the ring buffer."""
+    if state.count == 0:
+        return 0.0
+    return float(np.linalg.norm(state.gyro, axis=1).sum() / state.count)
+
+
 def power_profile(angular_velocity_dps):
     """
     Convert angular velocity to motor power using exponential curve.
@@ -164,13 +252,97 @@ def power_profile(angular_velocity_dps):
     
     return power
 
-def power_distribution(scf):
+def batch_angular_velocities(timestamps, quaternions, indices, counts):
+    """
+    Average angular velocity (°/s) of all the drones at once, the batched
+    version of calculate_average_angular_velocity.
+
+    Row i of timestamps (drones x samples) and quaternions (drones x
+    samples x 4) is the ring buffer of drone i, indices[i] its next write
+    position and counts[i] the number of samples in it. The angle of the
+    rotation between two unit quaternions is 2 acos(|q1 . q2|).
+    """
+    step = np.arange(samples)
+    # Ring buffer positions, oldest first, only the first counts[i] are samples
+    order = (indices[:, None] - counts[:, None] + step) % samples
+    t = np.take_along_axis(timestamps, order, axis=1)
+    q = np.take_along_axis(quaternions, order[:, :, None], axis=1)
+    q = q / np.maximum(np.linalg.norm(q, axis=2, keepdims=True), 1e-9)
+
+    dt = np.diff(t, axis=1)
+    dot = np.abs(np.sum(q[:, 1:] * q[:, :-1], axis=2))
+    angle = 2 * np.arccos(np.minimum(dot, 1.0))
+    valid = (step[1:] < counts[:, None]) & (dt > 0)
+    velocity = np.where(valid, np.degrees(angle) / np.where(valid, dt, 1.0), 0.0)
+    pairs = valid.sum(axis=1)
+    return velocity.sum(axis=1) / np.maximum(pairs, 1)
+
+
+def batch_gyro_rates(gyro, counts):
+    """
+    Average angular speed (°/s) of all the drones at once from their gyro
+    rates, gyro being drones x samples x 3. The buffers start at zero, so
+    the sum of a row is the sum of its samples.
+    """
+    return np.linalg.norm(gyro, axis=2).sum(axis=1) / np.maximum(counts, 1)
+
+
+def batch_power_profile(angular_velocities_dps):
+    """power_profile for an array of angular velocities."""
+    normalized_velocity = np.clip(angular_velocities_dps / max_angular_velocity_dps, 0.0, 1.0)
+    power_ratio = normalized_velocity ** vibration_exponent
+    if invert:
+        power_ratio = 1 - power_ratio
+    return (max_power * power_ratio).astype(int)
+
+
+def coordinator_tick(states, rows):
+    """One tick of the batched mode: rows[i] is the row of the windows of states[i]."""
+    counts = np.array([state.count for state in states])
+    if use_gyro:
+        velocities = batch_gyro_rates(gyro_windows[rows], counts)
+    else:
+        indices = np.array([state.index for state in states])
+        velocities = batch_angular_velocities(time_windows[rows], quaternion_windows[rows], indices, counts)
+    powers = batch_power_profile(velocities)
+    for state, power, velocity in zip(states, powers.tolist(), velocities.tolist()):
+        if printing == True:
+            print(f'URI: {state.uri}, Average angular velocity: {velocity:.1f}°/s → Motor power: {power}')
+        state.motor(power)
+
+
+def batched_vibration(states):
+    """
+    Batched mode: one loop gathers the ring buffers of all the drones,
+    computes every power in one NumPy pass and sends them, so the CPU per
+    tick hardly grows with the number of drones.
+    """
+    rows = np.array([uris.index(state.uri) for state in states])
+    loop_rate = FixedRate(vibration_rate, 'Coordinator')
+    try:
+        while execute == True:
+            coordinator_tick(states, rows)
+            loop_rate.sleep()
+    finally:
+        if loop_rate.ticks:
+            print(loop_rate)
+        for state in states:
+            print(state.motor)
+            if state.log is not None:
+                print(state.log)
+    return loop_rate.summary()
+
+
+def power_distribution(scf, state):
     """
     Calculate motor power based on average angular velocity.
     All motors vibrate equally based on how fast the drone is rotating.
     """
     # Calculate average angular velocity
-    average_velocity = calculate_average_angular_velocity(scf._link_uri)
+    if use_gyro:
+        average_velocity = average_gyro_rate(state)
+    else:
+        average_velocity = calculate_average_angular_velocity(state)
 
     # Convert to motor power
     motor_power = power_profile(average_velocity)
@@ -183,34 +355,70 @@ def power_distribution(scf):
         print(f'URI: {scf._link_uri}, Average angular velocity: {average_velocity:.1f}°/s → Motor power: {motor_power}')
 
     # Send commands to all motors
-    scf.cf.param.set_value('motorPowerSet.m1', str(m1))
+    state.motor(m1)
     #scf.cf.param.set_value('motorPowerSet.m2', str(m2))
     #scf.cf.param.set_value('motorPowerSet.m3', str(m3))
     #scf.cf.param.set_value('motorPowerSet.m4', str(m4))
 
 
-def vibration(scf):
-    """
-    Main vibration control loop. Angular velocity feedback.
-    """
-    
+def enable_motors(scf):
     scf.cf.param.set_value('motorPowerSet.enable', '1')
     time.sleep(1)
     if execute == True:
         print(f'Ready to vibrate!           {scf._link_uri}')
 
-    while execute == True:
-        power_distribution(scf)
-        time.sleep(.05)  
-    
-    time.sleep(1)
-    # Turn off all motors
-    scf.cf.param.set_value('motorPowerSet.m1', '0')
-    #scf.cf.param.set_value('motorPowerSet.m2', '0')
-    #scf.cf.param.set_value('motorPowerSet.m3', '0')
-    #scf.cf.param.set_value('motorPowerSet.m4', '0')
 
-    time.sleep(1)
+def shutdown(states):
+    '''
+    Ctrl + C: the powers are not sent anymore and the motors of all the
+    drones are stopped at once, without waiting for the vibration loops.
+    '''
+    print("\n=== STOPPING ALL MOTORS ===")
+    for state in states:
+        state.motor.close()
+    stop = MotorShutdown([state.scf for state in states])
+    stop.run()
+    print(stop)
+    return stop.summary()
+
+
+def vibration(scf):
+    """
+    Main vibration control loop. Angular velocity feedback.
+    """
+    enable_motors(scf)
+
+    state = drone_states[scf._link_uri]
+    loop_rate = FixedRate(vibration_rate, scf._link_uri)
+    try:
+        while execute == True:
+            power_distribution(scf, state)
+            loop_rate.sleep()
+    finally:
+        # Also printed on Ctrl + C, before the motors are stopped
+        if loop_rate.ticks:
+            print(loop_rate)
+            print(state.motor)
+        if state.log is not None:
+            print(state.log)
+    summary = loop_rate.summary()
+    summary.update(state.motor.summary())
+    if state.log is not None:
+        summary['log_period'] = state.log.period_in_ms
+    return summary
+
+
+def vibrate(scf):
+    '''
+    Process mode: each process gets the Ctrl + C and stops the motors of
+    its own drone. Returns the shutdown times.
+    '''
+    global execute
+    try:
+        return vibration(scf)
+    except KeyboardInterrupt:
+        execute = False
+        return shutdown([drone_states[scf._link_uri]])
 
 def filter_uris(uris):
     valid_uris = []
@@ -239,19 +447,37 @@ if __name__ == '__main__':
 
     #TODO add a plot of the vibration funciton here
 
+    if use_processes:
+        with ProcessSwarm(valid_uris) as swarm:
+            results = swarm.run([start_logging, vibrate])
+        for uri in valid_uris:
+            silent = results[uri][-1]['silent']
+            print(f'{uri}: motors silent after {1000 * silent:.0f} ms' if silent is not None
+                  else f'{uri}: motors stop not confirmed')
+        exit()
+
     with Swarm(valid_uris, factory=factory) as swarm:
     # not resetting estimators or arming the crazyflie as it it not flying
 
         swarm.parallel_safe(start_logging)
         time.sleep(1)
 
-        try: 
-            swarm.parallel_safe(vibration)
-            time.sleep(1)
-
-        except KeyboardInterrupt:
-            print("\n=== STOPPING ALL MOTORS ===")
-            execute = False 
-            swarm.parallel_safe(vibration)
+        states = [drone_states[uri] for uri in valid_uris]
+        if batched:
+            swarm.parallel_safe(enable_motors)
+            try:
+                batched_vibration(states)
+            except KeyboardInterrupt:
+                execute = False
+                shutdown(states)
+
+        else:
+            try:
+                swarm.parallel_safe(vibration)
+
+            except KeyboardInterrupt:
+                # The vibration threads end at their next tick, and send no power anymore
+                execute = False
+                shutdown(states)
 
     #TODO add a plot of the movements to show at the end. 
\ No newline at end of file
@@ -0,0 +1,188 @@
+import asyncio
+import sys
+import time
+
+import cflib.crtp
+from cflib.crazyflie import Crazyflie
+from cflib.crazyflie.log import LogConfig
+
+
+class AsyncCrazyflie:
+    '''
+    asyncio front end over the cflib primitives used by the scripts. The
+    cflib callbacks run in the threads of cflib, so every one of them hands
+    its result over to the event loop with call_soon_threadsafe(). Each
+    phase then awaits the event that really ends it instead of sleeping.
+    '''
+
+    def __init__(self, uri, rw_cache='./cache'):
+        self.uri = uri
+        self.cf = Crazyflie(rw_cache=rw_cache)
+        self.loop = None
+
+    def _future(self):
+        return self.loop.create_future()
+
+    def _resolve(self, future, result=None):
+        def resolve():
+            if not future.done():
+                future.set_result(result)
+        self.loop.call_soon_threadsafe(resolve)
+
+    def _fail(self, future, message):
+        def fail():
+            if not future.done():
+                future.set_exception(Exception(message))
+        self.loop.call_soon_threadsafe(fail)
+
+    async def connect(self):
+        '''Returns once the link is open and all the parameters are downloaded.'''
+        self.loop = asyncio.get_running_loop()
+        connected = self._future()
+        on_connected = lambda uri: self._resolve(connected)  # noqa: E731
+        on_failed = lambda uri, message: self._fail(connected, f'Connection to {uri} failed: {message}')  # noqa: E731
+        self.cf.fully_connected.add_callback(on_connected)
+        self.cf.connection_failed.add_callback(on_failed)
+        self.cf.open_link(self.uri)
+        try:
+            await connected
+        finally:
+            self.cf.fully_connected.remove_callback(on_connected)
+            self.cf.connection_failed.remove_callback(on_failed)
+
+    async def close(self):
+        self.cf.close_link()
+
+    async def set_param(self, name, value):
+        '''Sets a parameter and returns once the Crazyflie has confirmed it.'''
+        updated = self._future()
+        group, param = name.split('.')
+        callback = lambda name, value: self._resolve(updated, value)  # noqa: E731
+        self.cf.param.add_update_callback(group=group, name=param, cb=callback)
+        self.cf.param.set_value(name, value)
+        try:
+            return await updated
+        finally:
+            self.cf.param.remove_update_callback(group=group, name=param, cb=callback)
+
+    async def arm(self):
+        self.cf.platform.send_arming_request(True)
+
+    async def disarm(self):
+        self.cf.platform.send_arming_request(False)
+
+    async def log_stream(self, variables, period_in_ms, name='Async log'):
+        '''
+        Async iterator over (timestamp, data) of a log config. The log
+        config is removed when the iteration stops.
+        '''
+        queue = asyncio.Queue()
+        log_conf = LogConfig(name=name, period_in_ms=period_in_ms)
+        for variable in variables:
+            log_conf.add_variable(variable, 'float')
+        callback = lambda timestamp, data, logconf: self.loop.call_soon_threadsafe(  # noqa: E731
+            queue.put_nowait, (timestamp, data))
+        self.cf.log.add_config(log_conf)
+        log_conf.data_received_cb.add_callback(callback)
+        log_conf.start()
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            log_conf.delete()
+
+    async def reset_estimator(self, threshold=0.001, history=10):
+        '''Resets the Kalman filter and returns once the position variance is stable.'''
+        await self.set_param('kalman.resetEstimation', '1')
+        await self.set_param('kalman.resetEstimation', '0')
+        variances = []
+        stream = self.log_stream(['kalman.varPX', 'kalman.varPY', 'kalman.varPZ'], 100, 'Kalman Variance')
+        async for _, data in stream:
+            variances.append((data['kalman.varPX'], data['kalman.varPY'], data['kalman.varPZ']))
+            recent = variances[-history:]
+            if len(recent) == history and all(max(v) - min(v) < threshold for v in zip(*recent)):
+                break
+        await stream.aclose()
+
+    async def stream_setpoints(self, setpoint, rate=50):
+        '''
+        Sends hover setpoints at a fixed rate. `setpoint` is called on every
+        tick and returns (vx, vy, yawrate, z), or None to stop.
+        '''
+        period = 1 / rate
+        next_time = self.loop.time()
+        while True:
+            values = setpoint()
+            if values is None:
+                break
+            self.cf.commander.send_hover_setpoint(*values)
+            next_time += period
+            await asyncio.sleep(max(0, next_time - self.loop.time()))
+        self.cf.commander.send_notify_setpoint_stop()
+
+    async def takeoff(self, height, duration):
+        self.cf.high_level_commander.takeoff(height, duration)
+        await asyncio.sleep(duration)
+
+    async def land(self, duration):
+        self.cf.high_level_commander.land(0.0, duration)
+        await asyncio.sleep(duration)
+        self.cf.high_level_commander.stop()
+
+
+class AsyncSwarm:
+    '''
+    All the drones of a swarm on one event loop, without a thread per drone.
+
+        async with AsyncSwarm(uris) as swarm:
+            await swarm.gather(AsyncCrazyflie.reset_estimator)
+            await swarm.gather(AsyncCrazyflie.arm)
+
+    The time of every phase is kept in `phase_times`. With
+    `skip_unreachable`, the drones that fail to connect are left out of
+    `crazyflies` instead of failing the whole swarm.
+    '''
+
+    def __init__(self, uris, rw_cache='./cache', skip_unreachable=False):
+        self.crazyflies = {uri: AsyncCrazyflie(uri, rw_cache) for uri in uris}
+        self.skip_unreachable = skip_unreachable
+        self.phase_times = {}
+
+    async def gather(self, func, *args, return_exceptions=False):
+        '''Runs func(acf, *args) for all the drones at once and returns the results per uri.'''
+        start = time.perf_counter()
+        results = await asyncio.gather(*(func(acf, *args) for acf in self.crazyflies.values()),
+                                       return_exceptions=return_exceptions)
+        self.phase_times[getattr(func, '__name__', str(func))] = time.perf_counter() - start
+        return dict(zip(self.crazyflies, results))
+
+    async def __aenter__(self):
+        cflib.crtp.init_drivers()
+        results = await self.gather(AsyncCrazyflie.connect, return_exceptions=self.skip_unreachable)
+        for uri, result in results.items():
+            if isinstance(result, Exception):
+                print(f'Failed to connect to {uri}: {result}')
+                self.crazyflies.pop(uri).cf.close_link()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.gather(AsyncCrazyflie.close)
+
+    def print_phase_times(self):
+        for phase, duration in self.phase_times.items():
+            print(f'{phase:<20} {duration:.2f} s')
+
+
+async def _startup(uris):
+    '''Connects to the swarm, resets the estimators, arms and disarms, then prints the time of each phase.'''
+    async with AsyncSwarm(uris) as swarm:
+        await swarm.gather(AsyncCrazyflie.reset_estimator)
+        await swarm.gather(AsyncCrazyflie.arm)
+        await swarm.gather(AsyncCrazyflie.disarm)
+        swarm.print_phase_times()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        raise ValueError('URIs missing')
+    asyncio.run(_startup(sys.argv[1:]))
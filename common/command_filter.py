@@ -0,0 +1,67 @@
+import time
+
+
+class Deadband:
+    '''
+    Wraps a send function (a parameter write, a setpoint, ...) and drops
+    the commands that are within `deadband` of the last command sent, so
+    a control loop can call it on every tick without using the radio when
+    nothing changed. With `keep_alive` (s), a command is sent at least that
+    often even when it doesn't change.
+
+        motor = Deadband(lambda power: cf.param.set_value('motorPowerSet.m1', str(power)), deadband=500)
+        motor(power)
+
+    The commands are compared with the last one sent, not with a value
+    confirmed by the drone: setpoints are never acknowledged, and cflib
+    already resends the packets the radio lost. A parameter write that
+    still doesn't arrive is corrected by the next command past the
+    deadband, or by `keep_alive`.
+
+    The number of commands sent and dropped is kept, for summary(). After
+    close(), nothing is sent anymore, so a loop that is still running can't
+    override the commands of a shutdown.
+    '''
+
+    def __init__(self, send, deadband=0.0, keep_alive=None, name=''):
+        self.send = send
+        self.deadband = deadband
+        self.keep_alive = keep_alive
+        self.name = name
+        self.last = None
+        self.last_time = 0.0
+        self.sent = 0
+        self.dropped = 0
+        self.closed = False
+
+    def __call__(self, *values):
+        if self.closed:
+            return False
+        now = time.monotonic()
+        if (self.last is None
+                or any(abs(value - last) > self.deadband for value, last in zip(values, self.last))
+                or (self.keep_alive is not None and now - self.last_time >= self.keep_alive)):
+            self.send(*values)
+            self.last = values
+            self.last_time = now
+            self.sent += 1
+            return True
+        self.dropped += 1
+        return False
+
+    def reset(self):
+        '''The next command is sent whatever its value, e.g. after the drone was commanded by other means.'''
+        self.last = None
+
+    def close(self):
+        self.closed = True
+
+    def summary(self):
+        total = self.sent + self.dropped
+        return {'sent': self.sent, 'dropped': self.dropped,
+                'saved': self.dropped / total if total else 0.0}
+
+    def __str__(self):
+        summary = self.summary()
+        return (f'{self.name}: {summary["sent"]} commands sent, {summary["dropped"]} dropped '
+                f'({100 * summary["saved"]:.0f}% of the packets saved)')
@@ -0,0 +1,92 @@
+import numpy as np
+
+
+class Threshold:
+    '''
+    One signal of an EventDetector with hysteresis. With below=True the
+    signal becomes active when it drops under `trigger` and only becomes
+    inactive again when it rises over `release`.
+    '''
+
+    def __init__(self, name, trigger, release, below=True):
+        self.name = name
+        self.trigger = trigger
+        self.release = release
+        self.below = below
+        self.active = False
+
+    def update(self, value):
+        if self.below:
+            if value < self.trigger:
+                self.active = True
+            elif value > self.release:
+                self.active = False
+        else:
+            if value > self.trigger:
+                self.active = True
+            elif value < self.release:
+                self.active = False
+        return self.active
+
+
+class EventDetector:
+    '''
+    Streaming event detector. The event fires once all the thresholds have
+    been active for at least `min_duration` seconds, so a single noisy
+    sample can't trigger it. After firing it stays latched until reset().
+
+    update() takes the log timestamp in seconds and the data dict of the
+    log callback, so it can be fed straight from the callback.
+    '''
+
+    def __init__(self, thresholds, min_duration=0.03):
+        self.thresholds = thresholds
+        self.min_duration = min_duration
+        self.start_time = None
+        self.fired = False
+        self.fire_time = None
+
+    def reset(self):
+        for threshold in self.thresholds:
+            threshold.active = False
+        self.start_time = None
+        self.fired = False
+        self.fire_time = None
+
+    def update(self, timestamp, data):
+        '''Returns True only for the sample that fires the event.'''
+        if self.fired:
+            return False
+
+        active = [threshold.update(data[threshold.name]) for threshold in self.thresholds]
+        if not all(active):
+            self.start_time = None
+            return False
+
+        if self.start_time is None:
+            self.start_time = timestamp
+        if timestamp - self.start_time >= self.min_duration:
+            self.fired = True
+            self.fire_time = timestamp
+            return True
+        return False
+
+
+def free_fall_detector(min_duration=0.03):
+    '''The Crazyflie is dropped: the accelerometer reads close to 0 G.'''
+    return EventDetector([Threshold('acc.z', 0.1, 0.3)], min_duration)
+
+
+def throw_detector(min_duration=0.03):
+    '''The Crazyflie was thrown and is past the top of its flight.'''
+    return EventDetector([Threshold('acc.z', 0.1, 0.3),
+                          Threshold('stateEstimate.vz', 0.05, 0.15)], min_duration)
+
+
+def save_session(file_name, timestamps, signals):
+    '''
+    Stores a recorded session for Benchmarks/event_detector_benchmark.py.
+    `signals` maps the log variable names to the recorded values.
+    '''
+    np.savez(file_name, timestamps=np.asarray(timestamps),
+             **{name: np.asarray(values) for name, values in signals.items()})
@@ -0,0 +1,111 @@
+import threading
+
+
+class AdaptiveLog:
+    '''
+    Adapts the period of a running LogConfig to the quality of the link.
+
+    The loss is measured from the log timestamps: over every `window`
+    seconds, the samples received are compared to the samples the period
+    should have produced. The link quality (share of packets acknowledged
+    without retries) and the uplink RSSI come from cflib's link statistics.
+    When the loss is above `target_loss` or the link quality below
+    `min_quality`, the period is doubled; when the loss is well below the
+    target, it is shortened by 10 ms, but only after `hold` good windows
+    following a slowdown, so it doesn't keep probing a busy channel. The
+    log then gets slower on a busy channel instead of losing packets, and
+    faster again when it clears.
+
+    `period_in_ms` and `rate` give the current period to the control
+    loops. Create it after the LogConfig was added to the Crazyflie.
+    '''
+
+    def __init__(self, cf, log_conf, min_period=10, max_period=200, target_loss=0.05, min_quality=70,
+                 window=1.0, hold=5, name=''):
+        self.cf = cf
+        self.log_conf = log_conf
+        self.min_period = min_period
+        self.max_period = max_period
+        self.target_loss = target_loss
+        self.min_quality = min_quality
+        self.window = window * 1000
+        self.hold = hold
+        self._holding = 0
+        self.name = name or log_conf.name
+        self.period_in_ms = log_conf.period_in_ms
+        self.link_quality = 100.0
+        self.rssi = None
+        self.loss = 0.0
+        self.changes = []
+        self.lock = threading.Lock()
+        self._first = None
+        self._last = None
+        self._received = 0
+
+        stats = cf.link_statistics
+        stats.link_quality_updated.add_callback(self._link_quality)
+        stats.uplink_rssi_updated.add_callback(self._rssi)
+        log_conf.data_received_cb.add_callback(self._sample)
+
+    @property
+    def rate(self):
+        return 1000 / self.period_in_ms
+
+    def _link_quality(self, quality):
+        self.link_quality = quality
+
+    def _rssi(self, rssi):
+        self.rssi = rssi
+
+    def _sample(self, timestamp, data, logconf):
+        with self.lock:
+            if self._first is None:
+                self._first = timestamp
+                self._received = 0
+            self._last = timestamp
+            self._received += 1
+            span = self._last - self._first
+            # At least 50 samples, a few lost samples must not look like a busy channel
+            if span < max(self.window, 50 * self.period_in_ms):
+                return
+            expected = span / self.period_in_ms + 1
+            self.loss = max(0.0, 1 - self._received / expected)
+            self._first = None
+            self._adapt()
+
+    def _adapt(self):
+        period = self.period_in_ms
+        if self.loss > self.target_loss or self.link_quality < self.min_quality:
+            period = min(self.max_period, 2 * period)
+            self._holding = self.hold
+        elif self._holding:
+            self._holding -= 1
+        elif self.loss < self.target_loss / 2:
+            period = max(self.min_period, period - 10)
+        if period != self.period_in_ms:
+            self.set_period(period)
+
+    def set_period(self, period_in_ms):
+        '''Changes the period of the running log config (10 ms steps).'''
+        period_in_ms = max(10, int(round(period_in_ms / 10)) * 10)
+        self.log_conf.period = period_in_ms // 10
+        self.log_conf.period_in_ms = period_in_ms
+        self.period_in_ms = period_in_ms
+        self.changes.append(period_in_ms)
+        # Starting a block that is already running only changes its period
+        self.log_conf.start()
+
+    def close(self):
+        stats = self.cf.link_statistics
+        stats.link_quality_updated.remove_callback(self._link_quality)
+        stats.uplink_rssi_updated.remove_callback(self._rssi)
+        self.log_conf.data_received_cb.remove_callback(self._sample)
+
+    def summary(self):
+        return {'period': self.period_in_ms, 'loss': self.loss, 'link_quality': self.link_quality,
+                'rssi': self.rssi, 'changes': len(self.changes)}
+
+    def __str__(self):
+        rssi = f'{self.rssi:.0f} dBm' if self.rssi is not None else 'n/a'
+        return (f'{self.name}: log period {self.period_in_ms} ms ({len(self.changes)} changes), '
+                f'loss {100 * self.loss:.1f}%, link quality {self.link_quality:.0f}%, RSSI {rssi}')
@@ -0,0 +1,90 @@
+import math
+import time
+
+import numpy as np
+
+
+class LoopRate:
+    '''
+    Measures how fast a control loop really runs. Call tick() once per
+    iteration and summary() at the end.
+    '''
+
+    def __init__(self, name=''):
+        self.name = name
+        self.ticks = []
+
+    def tick(self):
+        self.ticks.append(time.perf_counter())
+
+    def summary(self):
+        '''Returns the number of loops, the mean rate in Hz and the period jitter (std) in ms.'''
+        if len(self.ticks) < 2:
+            return {'loops': len(self.ticks), 'rate': 0.0, 'jitter': 0.0}
+        periods = np.diff(self.ticks)
+        return {'loops': len(self.ticks),
+                'rate': 1 / np.mean(periods),
+                'jitter': 1000 * np.std(periods)}
+
+    def __str__(self):
+        summary = self.summary()
+        return f'{self.name}: {summary["rate"]:.1f} Hz, jitter {summary["jitter"]:.2f} ms over {summary["loops"]} loops'
+
+
+class FixedRate(LoopRate):
+    '''
+    Runs a control loop at a fixed rate: call sleep() at the end of each
+    iteration instead of time.sleep(). It waits until the next deadline, a
+    whole number of periods after the first call, so the time spent in the
+    work doesn't add up to the period and the loop doesn't drift.
+
+    A deadline already passed when sleep() is called is an overrun. With
+    skip=True the missed deadlines are dropped and the loop waits for the
+    next one, keeping its phase. With skip=False it runs again straight away
+    to catch up on them.
+    '''
+
+    def __init__(self, rate, name='', skip=True):
+        super().__init__(name)
+        self.rate = rate
+        self.period = 1 / rate
+        self.skip = skip
+        self.deadline = None
+        self.lateness = []
+        self.overruns = 0
+        self.skipped = 0
+
+    def sleep(self):
+        now = time.perf_counter()
+        if self.deadline is None:
+            self.deadline = now
+        self.deadline += self.period
+        if now > self.deadline:
+            self.overruns += 1
+            if self.skip:
+                missed = math.floor((now - self.deadline) / self.period) + 1
+                self.skipped += missed
+                self.deadline += missed * self.period
+        if self.deadline > now:
+            time.sleep(self.deadline - now)
+        self.tick()
+        self.lateness.append(self.ticks[-1] - self.deadline)
+
+    def summary(self):
+        '''
+        Adds the target rate, the overruns, the skipped deadlines and the
+        percentiles of how late the loop woke up after its deadlines, in ms.
+        '''
+        summary = super().summary()
+        summary.update({'target': self.rate, 'overruns': self.overruns, 'skipped': self.skipped})
+        lateness = 1000 * np.array(self.lateness) if self.lateness else np.zeros(1)
+        for percentile in (50, 90, 99):
+            summary[f'late_p{percentile}'] = np.percentile(lateness, percentile)
+        summary['late_max'] = lateness.max()
+        return summary
+
+    def __str__(self):
+        summary = self.summary()
+        return (f'{self.name}: {summary["rate"]:.1f} Hz (target {self.rate} Hz) over {summary["loops"]} loops, '
+                f'late p50 {summary["late_p50"]:.2f} ms, p99 {summary["late_p99"]:.2f} ms, '
+                f'max {summary["late_max"]:.2f} ms, {self.overruns} overruns, {self.skipped} skipped')
@@ -0,0 +1,52 @@
+import numpy as np
+
+
+class AlphaBetaFilter:
+    '''
+    Estimates the position and velocity of a drone from its position
+    stream and predicts where it will be a little later. On every sample
+    the position predicted from the last estimate is corrected by `alpha`
+    times the error and the velocity by `beta` times the error per second.
+    Higher values follow changes faster, lower values smooth the noise.
+    Predictions go at most `max_extrapolation` seconds past the last
+    sample, so a drone that stops sending isn't followed off to infinity.
+    '''
+
+    def __init__(self, alpha=0.5, beta=0.1, max_extrapolation=None):
+        self.alpha = alpha
+        self.beta = beta
+        self.max_extrapolation = max_extrapolation
+        self.time = None
+        self.position = None
+        self.velocity = None
+
+    def update(self, timestamp, position):
+        '''Adds a sample, timestamp in s.'''
+        position = np.asarray(position, dtype=float)
+        if self.time is None:
+            self.time = timestamp
+            self.position = position
+            self.velocity = np.zeros_like(position)
+            return
+        dt = timestamp - self.time
+        if dt <= 0:
+            return
+        predicted = self.position + self.velocity * dt
+        error = position - predicted
+        self.position = predicted + self.alpha * error
+        self.velocity = self.velocity + self.beta * error / dt
+        self.time = timestamp
+
+    def predict(self, timestamp):
+        '''The position at timestamp (s), or None before the first sample.'''
+        if self.time is None:
+            return None
+        horizon = timestamp - self.time
+        if self.max_extrapolation is not None:
+            horizon = min(horizon, self.max_extrapolation)
+        return self.position + self.velocity * horizon
+
+    def reset(self):
+        self.time = None
+        self.position = None
+        self.velocity = None
@@ -0,0 +1,135 @@
+import multiprocessing
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import cflib.crtp
+from cflib.crazyflie import Crazyflie
+from cflib.crazyflie.syncCrazyflie import SyncCrazyflie
+
+# Set in each worker process before the phases run
+shared = None
+
+
+class SharedState:
+    '''
+    A (drones x fields) float array in shared memory. Each drone writes its
+    own row and reads the rows of the others, without going through pipes.
+    '''
+
+    def __init__(self, uris, fields, name=None):
+        self.uris = list(uris)
+        self.shape = (len(self.uris), fields)
+        size = int(np.prod(self.shape)) * np.dtype(np.float64).itemsize
+        self.owner = name is None
+        self.memory = shared_memory.SharedMemory(name=name, create=self.owner, size=size)
+        self.array = np.ndarray(self.shape, dtype=np.float64, buffer=self.memory.buf)
+        if self.owner:
+            self.array[:] = 0
+
+    def index(self, uri):
+        return self.uris.index(uri)
+
+    def write(self, uri, values):
+        self.array[self.index(uri)] = values
+
+    def read(self, uri):
+        return self.array[self.index(uri)].copy()
+
+    def close(self):
+        del self.array
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+
+def _worker(uri, uris, fields, name, phases, barrier, results):
+    global shared
+    # Attach to the block of the parent instead of creating a new one
+    shared = SharedState(uris, fields, name)
+    cflib.crtp.init_drivers()
+    phase_results = []
+    durations = []
+    try:
+        with SyncCrazyflie(uri, cf=Crazyflie(rw_cache='./cache')) as scf:
+            for phase in phases:
+                barrier.wait()
+                start = time.perf_counter()
+                phase_results.append(phase(scf))
+                durations.append(time.perf_counter() - start)
+    except BaseException as e:
+        barrier.abort()
+        phase_results = e
+    finally:
+        shared.close()
+        results.put((uri, phase_results, durations))
+
+
+class ProcessSwarm:
+    '''
+    Alternative to Swarm.parallel_safe() that runs every drone in its own
+    worker process, with its own link and its own GIL. The phases are
+    module level functions taking the SyncCrazyflie, like the ones passed to
+    parallel_safe(), and all the drones start each phase together.
+
+    Inside the phases, process_swarm.shared is the SharedState used to
+    exchange data between the drones.
+
+    A Crazyradio can only be opened by one process, so every drone needs its
+    own radio (radio://0/..., radio://1/..., ...).
+    '''
+
+    def __init__(self, uris, fields=1):
+        self.uris = list(uris)
+        self.state = SharedState(self.uris, fields)
+        self.context = multiprocessing.get_context('spawn')
+        self.phases = []
+        self.phase_times = {}
+
+    def run(self, phases):
+        '''
+        Returns, for each uri, the list of values returned by the phases.
+        The time each drone spent in each phase is kept in `phase_times`.
+        '''
+        self.phases = phases
+        barrier = self.context.Barrier(len(self.uris))
+        results = self.context.Queue()
+        name = self.state.memory.name
+        fields = self.state.shape[1]
+        workers = [self.context.Process(target=_worker,
+                                        args=(uri, self.uris, fields, name, phases, barrier, results))
+                   for uri in self.uris]
+        for worker in workers:
+            worker.start()
+        phase_results = {}
+        while len(phase_results) < len(workers):
+            try:
+                uri, result, durations = results.get()
+                phase_results[uri] = result
+                self.phase_times[uri] = durations
+            except KeyboardInterrupt:
+                # The workers get the interrupt too, let them stop their drones
+                print('Waiting for the processes to stop...')
+        for worker in workers:
+            worker.join()
+
+        errors = [result for result in phase_results.values() if isinstance(result, BaseException)]
+        if errors:
+            raise Exception('One or more processes raised an exception when executing the phases') from errors[0]
+        return phase_results
+
+    def print_phase_times(self):
+        for i, phase in enumerate(self.phases):
+            times = [durations[i] for durations in self.phase_times.values() if i < len(durations)]
+            if times:
+                print(f'{getattr(phase, "__name__", str(phase)):<25} {max(times):.2f} s')
+
+    def close(self):
+        self.state.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
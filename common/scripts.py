@@ -0,0 +1,28 @@
+import importlib.util
+import os
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def load_script(path, name=None):
+    '''
+    Imports one of the scripts of the repository from its path relative to
+    the root, e.g. 'Leader-Follower_Drone-Drone/Leader-Follower_Drone-Drone.py'.
+    The folder names are not valid module names, so the scripts can't be
+    imported the usual way. Nothing connects since the scripts only do that
+    under __main__.
+
+    The folder of the script is added to the path, like when it is run from
+    its own folder, so it can import its neighbour modules.
+    '''
+    full_path = os.path.join(ROOT, path)
+    folder = os.path.dirname(os.path.abspath(full_path))
+    if folder not in sys.path:
+        sys.path.append(folder)
+    if name is None:
+        name = os.path.splitext(os.path.basename(path))[0].replace('-', '_')
+    spec = importlib.util.spec_from_file_location(name, full_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
@@ -0,0 +1,84 @@
+import math
+import time
+
+import numpy as np
+
+MODES = ('position', 'full_state')
+
+
+class SetpointStream:
+    '''
+    Streams world frame setpoints to one Crazyflie from a control loop,
+    instead of body frame velocities through the MotionCommander.
+
+    With mode='position' the position controller of the Crazyflie flies to
+    each setpoint. With mode='full_state' the velocity of the setpoint is
+    sent too, as a feedforward, so a moving setpoint is followed without
+    waiting for the position error to build up. Both command the absolute
+    `yaw` (deg, 0 by default): pass the current yaw of the drone so it
+    doesn't turn to align with the world frame first.
+
+    track() compares a logged position of the drone with the last setpoint
+    sent, and summary() gives the setpoint rate and the tracking error.
+    '''
+
+    def __init__(self, cf, mode='position', yaw=0.0, name=''):
+        if mode not in MODES:
+            raise ValueError(f'Unknown setpoint mode {mode!r}, expected one of {MODES}')
+        self.cf = cf
+        self.mode = mode
+        self.yaw = yaw
+        self.orientation = (0.0, 0.0, math.sin(math.radians(yaw) / 2), math.cos(math.radians(yaw) / 2))
+        self.name = name
+        self.setpoint = None
+        self.sent = 0
+        self.first_time = None
+        self.last_time = None
+        self.errors = []
+
+    def send(self, position, velocity=(0.0, 0.0, 0.0)):
+        '''Sends a setpoint, position in m and velocity in m/s in the world frame.'''
+        if self.mode == 'full_state':
+            self.cf.commander.send_full_state_setpoint(position, velocity, (0.0, 0.0, 0.0), self.orientation,
+                                                       0.0, 0.0, 0.0)
+        else:
+            self.cf.commander.send_position_setpoint(*position, self.yaw)
+        now = time.monotonic()
+        if self.first_time is None:
+            self.first_time = now
+        self.last_time = now
+        self.setpoint = tuple(position)
+        self.sent += 1
+
+    def track(self, position):
+        '''
+        Records and returns the distance between a logged position of the
+        drone (x-y or x-y-z) and the last setpoint sent.
+        '''
+        if self.setpoint is None:
+            return None
+        error = math.dist(position, self.setpoint[:len(position)])
+        self.errors.append(error)
+        return error
+
+    def stop(self):
+        '''Stops the stream, so the high level commander can take over again (to land).'''
+        self.cf.commander.send_notify_setpoint_stop()
+
+    @property
+    def rate(self):
+        if self.sent < 2 or self.last_time <= self.first_time:
+            return 0.0
+        return (self.sent - 1) / (self.last_time - self.first_time)
+
+    def summary(self):
+        '''Setpoints sent, their rate in Hz and the tracking error in m.'''
+        errors = np.array(self.errors) if self.errors else np.zeros(1)
+        return {'setpoints': self.sent, 'setpoint_rate': self.rate, 'error_mean': errors.mean(),
+                'error_p95': np.percentile(errors, 95), 'error_max': errors.max()}
+
+    def __str__(self):
+        summary = self.summary()
+        return (f'{self.name}: {summary["setpoints"]} {self.mode} setpoints at {summary["setpoint_rate"]:.1f} Hz, '
+                f'tracking error mean {100 * summary["error_mean"]:.1f} cm, '
+                f'p95 {100 * summary["error_p95"]:.1f} cm, max {100 * summary["error_max"]:.1f} cm')
@@ -0,0 +1,92 @@
+import threading
+import time
+
+MOTORS = ('motorPowerSet.m1', 'motorPowerSet.m2', 'motorPowerSet.m3', 'motorPowerSet.m4')
+ENABLE = 'motorPowerSet.enable'
+
+
+class MotorShutdown:
+    '''
+    Stops the motors of a whole swarm as fast as possible, e.g. on Ctrl + C:
+
+        shutdown = MotorShutdown([scf1, scf2])
+        shutdown.run()
+        print(shutdown)
+
+    The zero powers of all the drones are queued at once, then
+    motorPowerSet.enable = 0. cflib sends the parameter writes of each
+    Crazyflie from its own link thread, so the drones are written
+    concurrently and nothing waits for a fixed sleep. The writes of one
+    Crazyflie are sent in order, so its zero powers arrive before the
+    disable.
+
+    The time until every drone confirmed its zero powers (silent) and its
+    disable (disabled) is measured from the confirmations of a value of 0,
+    and compared to `target` seconds.
+    '''
+
+    def __init__(self, scfs, motors=MOTORS, timeout=1.0, target=0.2):
+        self.scfs = list(scfs)
+        self.motors = motors
+        self.timeout = timeout
+        self.target = target
+        self.silent = None
+        self.disabled = None
+        self.unconfirmed = []
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+
+    def run(self):
+        '''Returns True when every drone confirmed within timeout.'''
+        start = time.perf_counter()
+        pending = {(scf.cf.link_uri, name) for scf in self.scfs for name in (*self.motors, ENABLE)}
+        confirmed = {}
+
+        def callback(uri, param):
+            def updated(name, value):
+                # A power still queued before the zero write confirms first, so only a zero counts
+                with self._lock:
+                    if (uri, param) in pending and float(value) == 0:
+                        pending.discard((uri, param))
+                        confirmed[uri, param] = time.perf_counter() - start
+                        if not pending:
+                            self._done.set()
+            return updated
+
+        callbacks = []
+        for scf in self.scfs:
+            for name in (*self.motors, ENABLE):
+                group, param = name.split('.')
+                cb = callback(scf.cf.link_uri, name)
+                scf.cf.param.add_update_callback(group=group, name=param, cb=cb)
+                callbacks.append((scf, group, param, cb))
+        try:
+            for scf in self.scfs:
+                for name in self.motors:
+                    scf.cf.param.set_value(name, '0')
+            for scf in self.scfs:
+                scf.cf.param.set_value(ENABLE, '0')
+            self._done.wait(self.timeout)
+        finally:
+            for scf, group, param, cb in callbacks:
+                scf.cf.param.remove_update_callback(group=group, name=param, cb=cb)
+
+        with self._lock:
+            self.unconfirmed = sorted({uri for uri, _ in pending})
+            motor_times = [t for (_, name), t in confirmed.items() if name != ENABLE]
+            enable_times = [t for (_, name), t in confirmed.items() if name == ENABLE]
+            if not self.unconfirmed:
+                self.silent = max(motor_times, default=0.0)
+                self.disabled = max(enable_times, default=0.0)
+        return not self.unconfirmed
+
+    def summary(self):
+        return {'silent': self.silent, 'disabled': self.disabled, 'unconfirmed': self.unconfirmed}
+
+    def __str__(self):
+        if self.unconfirmed:
+            return (f'Motors stopped, but not confirmed within {1000 * self.timeout:.0f} ms by '
+                    f'{", ".join(self.unconfirmed)}')
+        status = 'within' if self.silent <= self.target else 'over'
+        return (f'{len(self.scfs)} drones silent after {1000 * self.silent:.0f} ms ({status} the '
+                f'{1000 * self.target:.0f} ms target), motorPowerSet disabled after {1000 * self.disabled:.0f} ms')
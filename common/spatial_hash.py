@@ -0,0 +1,158 @@
+import itertools
+import math
+import operator
+import threading
+
+import numpy as np
+
+DENSE_LIMIT = 40  # Up to this many drones no grid is kept and a query checks all the drones
+BATCH_LIMIT = 200  # Up to this many drones neighbour_sets() checks all the pairs with NumPy
+
+
+class SpatialHash:
+    '''
+    Positions of the drones of a swarm bucketed in a uniform grid of
+    `cell_size` cells. An update only moves a drone between two cells and a
+    neighbour query only looks at the cells around the query position, so
+    both stay close to constant time when the swarm grows, instead of
+    checking every pair of drones.
+
+    For a small swarm walking the cells costs more than checking every
+    drone, so up to `dense_limit` drones no grid is kept and a query checks
+    all the positions; the grid is built when the swarm grows past it.
+    neighbour_sets() answers for the whole swarm at once, with one NumPy
+    distance matrix up to `batch_limit` drones and the grid above.
+
+    The log callbacks update it from the cflib threads while the control
+    loops query it, so all the accesses hold a lock.
+    '''
+
+    def __init__(self, cell_size=1.0, dimensions=2, dense_limit=DENSE_LIMIT, batch_limit=BATCH_LIMIT):
+        self.cell_size = cell_size
+        self.dimensions = dimensions
+        self.dense_limit = dense_limit
+        self.batch_limit = batch_limit
+        self.sizes = (cell_size,) * dimensions
+        self.gridded = False  # The cells are only kept above dense_limit drones
+        self.cells = {}
+        self.positions = {}  # key -> (cell, or None without the grid, position)
+        self.offsets = {}
+        self.lock = threading.Lock()
+
+    def _cell(self, position):
+        return tuple(map(math.floor, map(operator.truediv, position, self.sizes)))
+
+    def _offsets(self, reach):
+        if reach not in self.offsets:
+            self.offsets[reach] = list(itertools.product(range(-reach, reach + 1), repeat=self.dimensions))
+        return self.offsets[reach]
+
+    def update(self, key, position):
+        '''Sets the position of a drone, only the first `dimensions` values are used.'''
+        position = tuple(position[:self.dimensions])
+        with self.lock:
+            previous = self.positions.get(key)
+            if previous is None and not self.gridded and len(self.positions) >= self.dense_limit:
+                self._build_grid()
+            if self.gridded:
+                cell = self._cell(position)
+                if previous is None or previous[0] != cell:
+                    if previous is not None and previous[0] is not None:
+                        self._discard(key, previous[0])
+                    self.cells.setdefault(cell, set()).add(key)
+                self.positions[key] = (cell, position)
+            else:
+                self.positions[key] = (None, position)
+
+    def _build_grid(self):
+        self.gridded = True
+        for key, (_, position) in self.positions.items():
+            cell = self._cell(position)
+            self.cells.setdefault(cell, set()).add(key)
+            self.positions[key] = (cell, position)
+
+    def _discard(self, key, cell):
+        members = self.cells[cell]
+        members.discard(key)
+        if not members:
+            del self.cells[cell]
+
+    def remove(self, key):
+        with self.lock:
+            previous = self.positions.pop(key, None)
+            if previous is not None and previous[0] is not None:
+                self._discard(key, previous[0])
+            if self.gridded and len(self.positions) <= self.dense_limit:
+                self.gridded = False
+                self.cells.clear()
+                self.positions = {key: (None, position) for key, (_, position) in self.positions.items()}
+
+    def position(self, key):
+        with self.lock:
+            return self.positions[key][1]
+
+    def neighbours(self, position, radius, exclude=()):
+        '''Returns [(key, distance, position)] of the drones within radius of position.'''
+        position = tuple(position[:self.dimensions])
+        found = []
+        with self.lock:
+            positions = self.positions
+            if not self.gridded:
+                for key, (_, other) in positions.items():
+                    if key in exclude:
+                        continue
+                    distance = math.dist(position, other)
+                    if distance <= radius:
+                        found.append((key, distance, other))
+                return found
+
+            center = self._cell(position)
+            reach = math.ceil(radius / self.cell_size)
+            for offset in self._offsets(reach):
+                members = self.cells.get(tuple(map(operator.add, center, offset)))
+                if not members:
+                    continue
+                for key in members:
+                    if key in exclude:
+                        continue
+                    other = positions[key][1]
+                    distance = math.dist(position, other)
+                    if distance <= radius:
+                        found.append((key, distance, other))
+        return found
+
+    def neighbour_sets(self, radius):
+        '''
+        Returns {key: set of the keys within radius} for every drone, e.g.
+        for a coordinator that handles the whole swarm in one tick.
+        '''
+        with self.lock:
+            keys = list(self.positions)
+            points = [position for _, position in self.positions.values()]
+        if len(keys) > self.batch_limit:
+            return {key: {other for other, _, _ in self.neighbours(position, radius, exclude=(key,))}
+                    for key, position in zip(keys, points)}
+        points = np.array(points).reshape(-1, self.dimensions)
+        difference = points[:, None, :] - points[None, :, :]
+        close = np.einsum('ijk,ijk->ij', difference, difference) <= radius * radius
+        np.fill_diagonal(close, False)
+        return {key: {keys[other] for other in np.flatnonzero(row)} for key, row in zip(keys, close)}
+
+    def separation(self, key, radius, max_velocity, exclude=()):
+        '''
+        Velocity pushing the drone `key` away from the drones within radius.
+        Each neighbour pushes linearly more the closer it is, from 0 at
+        radius to max_velocity at 0, and the sum is capped at max_velocity.
+        '''
+        position = self.position(key)
+        velocity = [0.0] * self.dimensions
+        for _, distance, other in self.neighbours(position, radius, exclude=set(exclude) | {key}):
+            if distance == 0:
+                continue
+            push = max_velocity * (1 - distance / radius) / distance
+            for i in range(self.dimensions):
+                velocity[i] += push * (position[i] - other[i])
+        magnitude = math.sqrt(sum(v * v for v in velocity))
+        if magnitude > max_velocity:
+            velocity = [v * max_velocity / magnitude for v in velocity]
+        return tuple(velocity)
@@ -0,0 +1,67 @@
+import threading
+import time
+
+
+def set_param(scf, name, value, timeout=1.0):
+    '''
+    Sets a parameter and returns once the Crazyflie has confirmed the new
+    value, instead of sleeping a fixed time. Returns False if no
+    confirmation came within timeout seconds.
+    '''
+    updated = threading.Event()
+    group, param = name.split('.')
+    callback = lambda name, value: updated.set()  # noqa: E731
+    scf.cf.param.add_update_callback(group=group, name=param, cb=callback)
+    try:
+        scf.cf.param.set_value(name, value)
+        return updated.wait(timeout)
+    finally:
+        scf.cf.param.remove_update_callback(group=group, name=param, cb=callback)
+
+
+def start_logging(log_conf, timeout=2.0):
+    '''
+    Starts a log config that was added to a Crazyflie and returns once its
+    first sample has been received. Returns False if none came within
+    timeout seconds.
+
+    The log TOC is downloaded before the link reports connected, so the log
+    configs can be started while the parameters are still downloading.
+    '''
+    received = threading.Event()
+    callback = lambda timestamp, data, logconf: received.set()  # noqa: E731
+    log_conf.data_received_cb.add_callback(callback)
+    try:
+        log_conf.start()
+        return received.wait(timeout)
+    finally:
+        log_conf.data_received_cb.remove_callback(callback)
+
+
+class PhaseTimer:
+    '''
+    Measures how long each phase of the startup of a swarm takes:
+
+        startup = PhaseTimer()
+        startup.run('parameters', swarm.parallel_safe, wait_for_param_download)
+        print(startup)
+    '''
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.times = {}
+
+    def run(self, name, func, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self.times[name] = time.perf_counter() - start
+
+    def total(self):
+        return time.perf_counter() - self.start
+
+    def __str__(self):
+        lines = [f'{name:<20} {duration:.2f} s' for name, duration in self.times.items()]
+        lines.append(f'{"total":<20} {self.total():.2f} s')
+        return '\n'.join(lines)
@@ -0,0 +1,286 @@
+import argparse
+import json
+import multiprocessing
+import sys
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+import cflib.crtp
+from cflib.crazyflie.log import LogConfig
+from cflib.crazyflie.swarm import CachedCfFactory
+from cflib.crazyflie.swarm import Swarm
+
+DEFAULT_NAME = 'cf_telemetry'
+DEFAULT_VARIABLES = ['stateEstimate.x', 'stateEstimate.y', 'stateEstimate.z', 'stateEstimate.yaw']
+
+
+def _attach(name):
+    '''
+    Attaches to an existing block without tracking it: otherwise the
+    resource tracker of a reader removes the block when the reader exits.
+    Before Python 3.13 there is no track=False, so the block is unregistered
+    right after attaching instead.
+    '''
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    memory = shared_memory.SharedMemory(name=name)
+    resource_tracker.unregister(memory._name, 'shared_memory')
+    return memory
+
+
+class TelemetryBuffer:
+    '''
+    The shared memory layout of the hub. For every drone it holds:
+    - seq: a sequence counter, odd while the hub is writing the drone,
+    - count: the number of samples received so far,
+    - latest: the last sample [timestamp, variables...],
+    - window: a ring buffer with the last `window` samples.
+
+    The layout itself (uris, variables, window) is stored as JSON in a
+    second block, so readers only need the name to attach. A read that
+    can't get a consistent sample within `timeout` seconds raises
+    TimeoutError.
+    '''
+
+    META_SIZE = 65536
+
+    def __init__(self, name, uris=None, variables=None, window=None, create=False, timeout=0.1):
+        self.name = name
+        self.timeout = timeout
+        self.owner = create
+        if create:
+            meta = json.dumps({'uris': list(uris), 'variables': list(variables), 'window': window}).encode()
+            self.meta = shared_memory.SharedMemory(name=name + '_meta', create=True, size=self.META_SIZE)
+            self.meta.buf[:8] = len(meta).to_bytes(8, 'little')
+            self.meta.buf[8:8 + len(meta)] = meta
+        else:
+            self.meta = _attach(name + '_meta')
+            length = int.from_bytes(self.meta.buf[:8], 'little')
+            layout = json.loads(bytes(self.meta.buf[8:8 + length]))
+            uris, variables, window = layout['uris'], layout['variables'], layout['window']
+
+        self.uris = uris
+        self.variables = variables
+        self.window_size = window
+        drones = len(uris)
+        fields = len(variables) + 1
+        sizes = [drones * 8, drones * 8, drones * fields * 8, drones * window * fields * 8]
+        if create:
+            self.data = shared_memory.SharedMemory(name=name + '_data', create=True, size=sum(sizes))
+        else:
+            self.data = _attach(name + '_data')
+        offsets = np.cumsum([0] + sizes)
+        buf = self.data.buf
+        self.seq = np.ndarray((drones,), np.uint64, buf, offsets[0])
+        self.count = np.ndarray((drones,), np.uint64, buf, offsets[1])
+        self.latest = np.ndarray((drones, fields), np.float64, buf, offsets[2])
+        self.window = np.ndarray((drones, window, fields), np.float64, buf, offsets[3])
+        if create:
+            self.seq[:] = 0
+            self.count[:] = 0
+            self.latest[:] = np.nan
+            self.window[:] = np.nan
+        else:
+            # Readers get read-only views
+            for array in (self.seq, self.count, self.latest, self.window):
+                array.flags.writeable = False
+
+    def index(self, uri):
+        return self.uris.index(uri)
+
+    def write(self, index, row):
+        '''Hub side: publishes one sample [timestamp, variables...] of a drone.'''
+        self.seq[index] += 1
+        self.latest[index] = row
+        self.window[index, self.count[index] % self.window_size] = row
+        self.count[index] += 1
+        self.seq[index] += 1
+
+    def _consistent(self, index, read):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            before = int(self.seq[index])
+            if before % 2 == 0:
+                value = read()
+                if int(self.seq[index]) == before:
+                    return before, value
+            if time.monotonic() > deadline:
+                # A hub that died in the middle of a write leaves seq odd forever
+                raise TimeoutError(f'{self.uris[index]} still being written after {self.timeout} s')
+            time.sleep(0)
+
+    def read_latest(self, uri):
+        '''Returns the sequence number and a copy of the latest sample of a drone.'''
+        index = self.index(uri)
+        return self._consistent(index, lambda: self.latest[index].copy())
+
+    def read_window(self, uri):
+        '''Returns the sequence number and a copy of the recent samples of a drone, oldest first.'''
+        index = self.index(uri)
+
+        def read():
+            count = int(self.count[index])
+            size = min(count, self.window_size)
+            order = np.arange(count - size, count) % self.window_size
+            return self.window[index, order]
+
+        return self._consistent(index, read)
+
+    def close(self):
+        del self.seq, self.count, self.latest, self.window
+        self.data.close()
+        self.meta.close()
+        if self.owner:
+            self.data.unlink()
+            self.meta.unlink()
+
+
+def _hub(name, uris, variables, period_in_ms, window, ready, stop):
+    buffer = TelemetryBuffer(name, uris, variables, window, create=True)
+
+    def start_logging(scf):
+        index = buffer.index(scf.cf.link_uri)
+        row = np.empty(len(variables) + 1)
+
+        def callback(timestamp, data, logconf):
+            row[0] = timestamp / 1000
+            for i, variable in enumerate(variables):
+                row[i + 1] = data[variable]
+            buffer.write(index, row)
+
+        log_conf = LogConfig(name='Telemetry', period_in_ms=period_in_ms)
+        for variable in variables:
+            log_conf.add_variable(variable, 'float')
+        scf.cf.log.add_config(log_conf)
+        log_conf.data_received_cb.add_callback(callback)
+        log_conf.start()
+
+    cflib.crtp.init_drivers()
+    try:
+        with Swarm(uris, factory=CachedCfFactory(rw_cache='./cache')) as swarm:
+            swarm.parallel_safe(start_logging)
+            ready.set()
+            stop.wait()
+    finally:
+        buffer.close()
+
+
+class TelemetryHub:
+    '''
+    A process that owns the radio links of the swarm and publishes the
+    state of every drone to shared memory. Any number of controllers,
+    dashboards or recorders can then attach with TelemetryBuffer(name) and
+    read copies of the same data without extra radio traffic, e.g.
+    monitor() and record() below.
+    '''
+
+    def __init__(self, uris, variables=DEFAULT_VARIABLES, period_in_ms=10, window=100, name=DEFAULT_NAME):
+        self.name = name
+        context = multiprocessing.get_context('spawn')
+        self.ready = context.Event()
+        self.stop_event = context.Event()
+        self.process = context.Process(target=_hub, args=(name, list(uris), list(variables), period_in_ms,
+                                                          window, self.ready, self.stop_event))
+
+    def start(self):
+        '''Returns once the links are open and the logging has started.'''
+        self.process.start()
+        while not self.ready.wait(0.1):
+            if not self.process.is_alive():
+                raise Exception('The telemetry hub could not connect to the swarm')
+
+    def stop(self):
+        self.stop_event.set()
+        self.process.join()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
+def monitor(name, rate=10):
+    '''Attaches to a running hub and prints the latest state of every drone.'''
+    buffer = TelemetryBuffer(name)
+    try:
+        while True:
+            for uri in buffer.uris:
+                seq, row = buffer.read_latest(uri)
+                values = ', '.join(f'{v}: {x:.3f}' for v, x in zip(buffer.variables, row[1:]))
+                print(f'{uri} [{seq // 2}] {values}')
+            print()
+            time.sleep(1 / rate)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        buffer.close()
+
+
+def record(name, uri, file_name, rate=10):
+    '''
+    Attaches to a running hub and records the x-y track of one drone until
+    Ctrl + C. The track is saved as the leader tracks of
+    Leader-Follower_Human-Drone.py, so Benchmarks/follower_sweep.py --track
+    can tune the follower against it.
+    '''
+    buffer = TelemetryBuffer(name)
+    if not {'stateEstimate.x', 'stateEstimate.y'} <= set(buffer.variables):
+        buffer.close()
+        raise ValueError(f'The hub "{name}" does not log stateEstimate.x and stateEstimate.y')
+    x = buffer.variables.index('stateEstimate.x') + 1
+    y = buffer.variables.index('stateEstimate.y') + 1
+    samples = []
+    recorded = 0
+    print(f'Recording {uri}, press Ctrl + C to stop')
+    try:
+        while True:
+            seq, window = buffer.read_window(uri)
+            new = seq // 2 - recorded
+            if new > len(window):
+                print(f'{new - len(window)} samples lost, the window of the hub is too short for the rate')
+            if new:
+                samples.append(window[-new:])
+                recorded = seq // 2
+            time.sleep(1 / rate)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        buffer.close()
+    if not samples:
+        print('No sample received')
+        return
+    track = np.concatenate(samples)
+    np.savez(file_name, t=track[:, 0], x=track[:, x], y=track[:, y])
+    print(f'{len(track)} samples saved to {file_name}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Shared memory telemetry hub for a Crazyflie swarm.')
+    parser.add_argument('uris', nargs='*', help='Start a hub for these drones')
+    parser.add_argument('--variables', nargs='+', default=DEFAULT_VARIABLES)
+    parser.add_argument('--period', type=int, default=10, help='Log period in ms')
+    parser.add_argument('--window', type=int, default=100, help='Samples kept per drone')
+    parser.add_argument('--name', default=DEFAULT_NAME)
+    parser.add_argument('--monitor', action='store_true', help='Attach to a running hub and print its data')
+    parser.add_argument('--record', nargs=2, metavar=('URI', 'FILE'),
+                        help='Attach to a running hub and save the x-y track of a drone to an .npz file')
+    args = parser.parse_args()
+
+    if args.monitor:
+        monitor(args.name)
+    elif args.record:
+        record(args.name, *args.record)
+    elif args.uris:
+        with TelemetryHub(args.uris, args.variables, args.period, args.window, args.name):
+            print(f'Publishing telemetry as "{args.name}", press Ctrl + C to stop')
+            try:
+                while True:
+                    time.sleep(1)
+            except KeyboardInterrupt:
+                pass
+    else:
+        parser.print_help()
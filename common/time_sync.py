@@ -0,0 +1,102 @@
+import math
+import time
+from collections import deque
+
+import numpy as np
+
+
+class ClockSync:
+    '''
+    Maps the log timestamps of one drone (ms since it booted) onto the host
+    clock (time.monotonic()). Every sample gives host time - drone time,
+    which is the clock offset plus the radio delay. The smallest value of
+    the recent samples is the one with the least delay, so it is used as
+    the offset: the minimum of the previous block of `window` samples and
+    of the current one, which only costs two comparisons per sample and
+    still follows a drifting clock.
+    '''
+
+    def __init__(self, window=200):
+        self.window = window
+        self.count = 0
+        self.offset = math.inf
+        self.block_offset = math.inf  # Minimum of the current block
+
+    def to_host(self, timestamp, received=None):
+        if received is None:
+            received = time.monotonic()
+        drone_time = timestamp / 1000
+        offset = received - drone_time
+        if offset < self.block_offset:
+            self.block_offset = offset
+            if offset < self.offset:
+                self.offset = offset
+        self.count += 1
+        if self.count == self.window:
+            # The previous block is forgotten, the current one becomes the previous one
+            self.offset = self.block_offset
+            self.block_offset = math.inf
+            self.count = 0
+        return drone_time + self.offset
+
+
+class SnapshotSync:
+    '''
+    Keeps the recent samples of every drone on the host clock and returns
+    the values of all the drones at one query time, interpolated between
+    samples, or extrapolated from the last two samples for at most
+    `max_extrapolation` seconds. Relative controllers can then compare the
+    drones at the same instant instead of whichever samples came last.
+    '''
+
+    def __init__(self, uris, history=8, max_extrapolation=0.05):
+        self.clocks = {uri: ClockSync() for uri in uris}
+        self.samples = {uri: deque(maxlen=history) for uri in uris}
+        self.max_extrapolation = max_extrapolation
+
+    def add(self, uri, timestamp, values):
+        '''Adds a sample from a log callback (timestamp in ms, drone clock).'''
+        self.samples[uri].append((self.clocks[uri].to_host(timestamp), values))
+
+    def add_host(self, uri, host_time, values):
+        '''Adds a sample that is already on the host clock.'''
+        self.samples[uri].append((host_time, values))
+
+    def latest_common_time(self):
+        '''The latest time for which every drone has data, so nothing is extrapolated.'''
+        newest = [samples[-1][0] for samples in self.samples.values() if samples]
+        if len(newest) < len(self.samples):
+            return None
+        return min(newest)
+
+    def value_at(self, uri, query_time):
+        samples = list(self.samples[uri])
+        if not samples:
+            return None
+        if len(samples) == 1 or query_time <= samples[0][0]:
+            return np.asarray(samples[0][1], dtype=float)
+
+        for (t0, v0), (t1, v1) in zip(samples[-2::-1], samples[::-1]):
+            if t0 <= query_time:
+                break
+        v0 = np.asarray(v0, dtype=float)
+        v1 = np.asarray(v1, dtype=float)
+        if t1 <= t0:
+            return v1
+        # Beyond the newest sample this extrapolates, up to max_extrapolation
+        query_time = min(query_time, t1 + self.max_extrapolation)
+        return v0 + (v1 - v0) * (query_time - t0) / (t1 - t0)
+
+    def snapshot(self, query_time=None):
+        '''
+        Returns {uri: values} at query_time, by default the latest common
+        time, or None while a drone has no data yet.
+        '''
+        if query_time is None:
+            query_time = self.latest_common_time()
+            if query_time is None:
+                return None
+        values = {uri: self.value_at(uri, query_time) for uri in self.samples}
+        if any(value is None for value in values.values()):
+            return None
+        return values